@@ -0,0 +1,210 @@
+"""
+Headless batch report generation.
+
+Converts many printout sets into reports in a process pool, without the GUI.
+Jobs are read from a JSON manifest:
+
+    {
+        "template": "Template.docx",
+        "jobs": [
+            {
+                "name": "Slab A",
+                "printout_folder": "exports/slab_a",
+                "output_folder": "reports/slab_a",
+                "project_title": "...", "report_title": "...", "doc_no": "...",
+                "project_no": "...", "author": "..."
+            },
+            {
+                "name": "Slab B",
+                "printouts": ["exports/slab_b/pr1.html", "exports/slab_b/pr2.html"],
+                "output_folder": "reports/slab_b",
+                "export": {"model": "models/slab_b.rf6", "printouts": 2}
+            }
+        ]
+    }
+
+"template" is optional and defaults to the bundled Template.docx. A job either
+lists its printouts, or names a folder whose pr<N>.html files are used in
+order. A job with an "export" entry first exports its printouts from RFEM into
+the output folder; only those jobs import RFEM, and at most --exports of them
+talk to RFEM at the same time. The lock is only held while a model is opened
+and a printout exported, so the conversion of one job runs while the next
+job exports. With FSRG_FAKE_RFEM set, they export from the
+local fake RFEM service instead (see fake_rfem.py).
+
+Usage:
+    python batch.py manifest.json [--jobs 4] [--exports 1] [--summary summary.json]
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager, freeze_support
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import traceback
+
+METADATA_FIELDS = ('project_title', 'report_title', 'doc_no', 'project_no', 'author')
+
+
+def printout_paths(job: Dict) -> List[str]:
+    """
+    The HTML printouts of a job, in report order.
+
+    Args:
+        job (Dict): The job entry of the manifest.
+
+    Returns:
+        List[str]: The printout paths.
+    """
+    if 'printouts' in job:
+        return list(job['printouts'])
+    folder = job['printout_folder']
+    numbered = []
+    for name in os.listdir(folder):
+        match = re.fullmatch(r'pr(\d+)\.html', name)
+        if match:
+            numbered.append((int(match.group(1)), os.path.join(folder, name)))
+    return [path for _, path in sorted(numbered)]
+
+
+def _open_model(model: str):
+    from rfem_adapter import init_model
+    rfem = init_model()
+    if model.lower().endswith('.rf6'):
+        return rfem.openFile(model)
+    return rfem.Model(False, model)
+
+
+def _locked_exporter(export_lock):
+    """The RFEM export, holding the shared export lock only for the export call itself."""
+    from gui.rep_gen import rfem_export
+
+    def export(index, path, model=None):
+        with export_lock:
+            return rfem_export(index, path, model=model)
+    return export
+
+
+def run_job(job: Dict, template: Optional[str], export_lock=None, image_workers: Optional[int] = None) -> Dict:
+    """
+    Generate the report of one manifest job. Runs in a worker process.
+
+    Args:
+        job (Dict): The job entry of the manifest.
+        template (Optional[str]): The report template, the bundled one if None.
+        export_lock: Shared semaphore limiting concurrent RFEM exports.
+        image_workers (Optional[int]): Processes the job prepares its images with, one per CPU if None.
+
+    Returns:
+        Dict: The job name, status, output path or error, and its timings in seconds.
+    """
+    from gui.rep_gen import RepGen
+    from image_prep import ImagePrepOptions
+
+    name = job.get('name', job.get('output_folder'))
+    result = {'name': name, 'status': 'ok', 'output': None, 'error': None, 'export_seconds': 0.0}
+    start = time.perf_counter()
+    try:
+        output_folder = job['output_folder']
+        os.makedirs(output_folder, exist_ok=True)
+        metadata = [job.get(field, '') for field in METADATA_FIELDS]
+        export = job.get('export')
+        image_options = ImagePrepOptions(workers=image_workers)
+        if export:
+            export_start = time.perf_counter()
+            with export_lock:
+                model = _open_model(export['model'])
+            rep_gen = RepGen(*metadata, export['printouts'], model, exporter=_locked_exporter(export_lock),
+                             image_options=image_options)
+            result['output'] = rep_gen.generate_rfem_report_as_html(output_folder, template)
+            result['export_seconds'] = sum(latency[1] + latency[2] for latency in rep_gen.export_latencies)
+            result['convert_seconds'] = time.perf_counter() - export_start - result['export_seconds']
+        else:
+            paths = printout_paths(job)
+            rep_gen = RepGen(*metadata, len(paths), None, image_options=image_options)
+            convert_start = time.perf_counter()
+            result['output'] = rep_gen.generate_report_from_printouts(paths, output_folder, template)
+            result['convert_seconds'] = time.perf_counter() - convert_start
+    except Exception as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(manifest: Dict, jobs: int = None, exports: int = 1) -> List[Dict]:
+    """
+    Run all jobs of a manifest in a process pool.
+
+    The CPUs are shared out between the jobs that run at the same time, so that the
+    image preparation of every job, which uses a process pool of its own, does not
+    start one process per CPU in each job.
+
+    Args:
+        manifest (Dict): The parsed manifest.
+        jobs (int): Number of jobs run at the same time, one per CPU if None.
+        exports (int): Number of jobs that may export from RFEM at the same time.
+
+    Returns:
+        List[Dict]: The result of every job, in manifest order.
+    """
+    template = manifest.get('template')
+    job_list = manifest['jobs']
+    manager = Manager() if any('export' in job for job in job_list) else None
+    export_lock = manager.BoundedSemaphore(exports) if manager else None
+    results = [None] * len(job_list)
+    cpus = os.cpu_count() or 1
+    image_workers = max(1, cpus // max(1, min(jobs or cpus, len(job_list))))
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(run_job, job, template, export_lock, image_workers): i
+                       for i, job in enumerate(job_list)}
+            for future in as_completed(futures):
+                results[futures[future]] = result = future.result()
+                print(f"[{result['status']}] {result['name']} in {result['seconds']:.1f} s", flush=True)
+    finally:
+        if manager:
+            manager.shutdown()
+    return results
+
+
+def print_summary(results: List[Dict], wall_seconds: float):
+    width = max([len(str(result['name'])) for result in results] + [3])
+    print()
+    print(f"{'job':<{width}}  {'status':<7} {'export s':>9} {'convert s':>10} {'total s':>8}")
+    for result in results:
+        print(f"{str(result['name']):<{width}}  {result['status']:<7} {result['export_seconds']:>9.1f} "
+              f"{result.get('convert_seconds', 0.0):>10.1f} {result['seconds']:>8.1f}")
+    job_seconds = sum(result['seconds'] for result in results)
+    failed = sum(result['status'] != 'ok' for result in results)
+    print(f"{len(results)} jobs, {failed} failed, {wall_seconds:.1f} s wall clock, {job_seconds:.1f} s job time")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('manifest', help="JSON manifest of the jobs")
+    parser.add_argument('--jobs', type=int, default=None, help="jobs run at the same time (default: one per CPU)")
+    parser.add_argument('--exports', type=int, default=1, help="jobs exporting from RFEM at the same time")
+    parser.add_argument('--summary', help="write the per-job results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest, 'r', encoding='utf-8') as file:
+        manifest = json.load(file)
+
+    start = time.perf_counter()
+    results = run_batch(manifest, args.jobs, args.exports)
+    wall_seconds = time.perf_counter() - start
+    print_summary(results, wall_seconds)
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as file:
+            json.dump({'wall_seconds': wall_seconds, 'jobs': results}, file, indent=2)
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == "__main__":
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Load test the end-to-end pipeline against the fake RFEM service.
+
+Runs a batch of export jobs, one per model, through batch.py with FSRG_FAKE_RFEM
+set: every job connects to a model, exports its printouts from the fake service
+with the configured latency and failures, waits for each export to complete,
+converts the printouts and writes the report and its run profile. The job results
+and the run profiles are then summarized: throughput, job time percentiles,
+export latencies, failures by cause and the totals of tables, rows and images.
+
+Usage:
+    python benchmarks/load_test.py [--models 8] [--printouts 3] [--scale small]
+        [--jobs 4] [--exports 2] [--latency 0.2] [--jitter 0.1] [--write-seconds 0.1]
+        [--failure-rate 0.05] [--output results.json]
+"""
+from dataclasses import asdict
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from batch import run_batch
+from benchmarks.pipeline import SCALES
+from fake_rfem import FAKE_RFEM_ENVIRONMENT, FakeRFEM, FakeRFEMOptions, options_json
+from instrumentation import profile_path
+
+
+def manifest_for(models: int, printouts: int, work_folder: str) -> dict:
+    """A batch manifest with one export job per fake model."""
+    return {'jobs': [{
+        'name': f"Model {number}",
+        'output_folder': os.path.join(work_folder, 'reports', f"model_{number}"),
+        'export': {'model': f"Model {number}", 'printouts': printouts},
+        'project_title': f"Load Test {number}", 'report_title': 'Load Test', 'doc_no': '0000-BHE-00-00-00-0-0000',
+        'project_no': '0000', 'author': 'Load Test',
+    } for number in range(1, models + 1)]}
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(results: list, wall_seconds: float, printouts: int) -> dict:
+    """Combine the batch results and the run profiles of the finished reports."""
+    ok = [result for result in results if result['status'] == 'ok']
+    errors = {}
+    for result in results:
+        if result['status'] != 'ok':
+            cause = result['error'].split(':', 1)[0]
+            errors[cause] = errors.get(cause, 0) + 1
+    counters, export_seconds, wait_seconds = {}, [], []
+    for result in ok:
+        try:
+            with open(profile_path(result['output']), 'r', encoding='utf-8') as file:
+                profile = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for name, value in profile['counters'].items():
+            counters[name] = counters.get(name, 0) + value
+        for latency in profile['values'].get('export latencies', []):
+            export_seconds.append(latency['export_seconds'])
+            wait_seconds.append(latency['wait_seconds'])
+    job_seconds = [result['seconds'] for result in ok]
+    return {
+        'jobs': len(results),
+        'failed': len(results) - len(ok),
+        'errors': errors,
+        'wall_seconds': wall_seconds,
+        'printouts_per_minute': 60 * len(ok) * printouts / wall_seconds if wall_seconds else 0.0,
+        'job_seconds': {'median': statistics.median(job_seconds) if job_seconds else 0.0,
+                        'p95': _percentile(job_seconds, 0.95), 'max': max(job_seconds, default=0.0)},
+        'export_seconds': {'median': statistics.median(export_seconds) if export_seconds else 0.0,
+                           'p95': _percentile(export_seconds, 0.95)},
+        'wait_seconds': {'median': statistics.median(wait_seconds) if wait_seconds else 0.0,
+                         'p95': _percentile(wait_seconds, 0.95)},
+        'counters': counters,
+    }
+
+
+def print_summary(summary: dict):
+    print()
+    print(f"{summary['jobs']} jobs, {summary['failed']} failed in {summary['wall_seconds']:.1f} s "
+          f"({summary['printouts_per_minute']:.1f} printouts per minute)")
+    for cause, count in summary['errors'].items():
+        print(f"  {count}x {cause}")
+    print(f"job time      median {summary['job_seconds']['median']:.2f} s, p95 {summary['job_seconds']['p95']:.2f} s, "
+          f"max {summary['job_seconds']['max']:.2f} s")
+    print(f"export call   median {summary['export_seconds']['median']:.2f} s, "
+          f"p95 {summary['export_seconds']['p95']:.2f} s")
+    print(f"export wait   median {summary['wait_seconds']['median']:.2f} s, "
+          f"p95 {summary['wait_seconds']['p95']:.2f} s")
+    counters = summary['counters']
+    print(f"written       {counters.get('tables', 0)} tables, {counters.get('rows', 0)} rows, "
+          f"{counters.get('images', 0)} images, {counters.get('bytes written', 0) / (1024 * 1024):.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', type=int, default=8, help="models, one export job each")
+    parser.add_argument('--printouts', type=int, default=3, help="printouts exported per model")
+    parser.add_argument('--scale', choices=list(SCALES), default='small', help="size of the synthetic printouts")
+    parser.add_argument('--jobs', type=int, default=None, help="jobs run at the same time (default: one per CPU)")
+    parser.add_argument('--exports', type=int, default=2, help="jobs exporting at the same time")
+    parser.add_argument('--latency', type=float, default=0.2, help="seconds an export call blocks")
+    parser.add_argument('--jitter', type=float, default=0.1, help="random extra latency in seconds")
+    parser.add_argument('--write-seconds', type=float, default=0.1,
+                        help="seconds a printout is still written after the export call returned")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probability that an export fails")
+    parser.add_argument('--failure-modes', nargs='+', default=['error'], choices=['error', 'false', 'stall'],
+                        help="how exports fail; 'stall' waits for the export watch timeout")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'fsrg_load_test'),
+                        help="folder for the printout cache and the reports")
+    parser.add_argument('--output', help="write the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    spec = asdict(SCALES[args.scale])
+    spec['image_size'] = list(spec['image_size'])
+    options = FakeRFEMOptions(
+        models=[f"Model {number}" for number in range(1, args.models + 1)], printout=spec,
+        cache_folder=os.path.join(args.work, 'printouts'), export_latency=args.latency,
+        latency_jitter=args.jitter, write_seconds=args.write_seconds, failure_rate=args.failure_rate,
+        failure_modes=args.failure_modes, seed=args.seed)
+    # The batch worker processes inherit the environment and create their own fake service
+    os.environ[FAKE_RFEM_ENVIRONMENT] = options_json(options)
+    shutil.rmtree(os.path.join(args.work, 'reports'), ignore_errors=True)
+    print(f"Preparing {args.models * args.printouts} synthetic printouts ({args.scale})")
+    FakeRFEM(options).prepare_printouts(args.printouts)
+
+    start = time.perf_counter()
+    results = run_batch(manifest_for(args.models, args.printouts, args.work), args.jobs, args.exports)
+    summary = summarize(results, time.perf_counter() - start, args.printouts)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'options': asdict(options), 'summary': summary, 'jobs': results}, file, indent=2)
+    # Failures are expected when they are injected
+    return 1 if summary['failed'] and not args.failure_rate else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""
+Benchmark the conversion pipeline on synthetic printouts at several scales.
+
+Every scale runs in its own child process, which times the stages separately:
+
+    parse     read the printout and build the heading index
+    tables    convert all tables
+    images    prepare, caption and insert all plots
+    replace   replace the metadata placeholders in the finished report
+    save      write the .docx
+
+and records the peak resident set size of the process after each stage. Results
+are compared with the stored baselines (benchmarks/baselines.json); a stage that
+is more than --tolerance slower, or uses more memory, is reported as a
+regression. Baselines are machine specific: record them again with --record on
+the machine the comparison runs on.
+
+Usage:
+    python benchmarks/pipeline.py [--scales small medium large] [--repeat 3]
+        [--record] [--tolerance 0.25] [--output results.json]
+"""
+from dataclasses import asdict
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.streaming_memory import peak_memory_mb
+from benchmarks.synthetic_printout import PrintoutSpec, write_printout
+
+STAGES = ('parse', 'tables', 'images', 'replace', 'save')
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+SCALES = {
+    'small': PrintoutSpec(chapters=2, sections=3, tables=1, rows=50, columns=8, images=4),
+    'medium': PrintoutSpec(chapters=4, sections=5, tables=1, rows=200, columns=10, images=12),
+    'large': PrintoutSpec(chapters=6, sections=6, tables=2, rows=400, columns=12, images=24),
+}
+
+PLACEHOLDERS = {
+    'Projekttitel': 'Benchmark Project',
+    'Berichttitel': 'Benchmark Report',
+    'XXXX-BHE-XX-XX-XX-X-XXXX': '0000-BHE-00-00-00-0-0000',
+    'Projektnummer': '0000',
+    '[Author]': 'Benchmark',
+}
+
+
+def printout_for(scale: str, work_folder: str) -> str:
+    """Return the printout of a scale, generating it on first use."""
+    folder = os.path.join(work_folder, scale)
+    html_path = os.path.join(folder, 'pr1.html')
+    spec_path = os.path.join(folder, 'spec.json')
+    spec = asdict(SCALES[scale])
+    spec['image_size'] = list(spec['image_size'])
+    if os.path.exists(html_path) and os.path.exists(spec_path):
+        with open(spec_path, 'r', encoding='utf-8') as file:
+            if json.load(file) == spec:
+                return html_path
+    os.makedirs(folder, exist_ok=True)
+    write_printout(html_path, SCALES[scale])
+    with open(spec_path, 'w', encoding='utf-8') as file:
+        json.dump(spec, file)
+    return html_path
+
+
+def run_child(template: str, html_path: str) -> dict:
+    """Run the pipeline once and return the seconds and peak MB after each stage."""
+    from html2word import HTMLToWordConverter
+    from replacement import DocumentWordReplacer
+    from template_cache import remove_trailing_section
+    from docx import Document
+
+    seconds, peak_mb = {}, {}
+
+    def stage(name, start):
+        seconds[name] = time.perf_counter() - start
+        peak_mb[name] = peak_memory_mb()
+
+    doc = Document(template)
+    remove_trailing_section(doc)
+
+    start = time.perf_counter()
+    converter = HTMLToWordConverter(doc, html_path)
+    stage('parse', start)
+
+    start = time.perf_counter()
+    converter.process_html_file()
+    stage('tables', start)
+
+    start = time.perf_counter()
+    converter.extract_image_files()
+    converter.prepare_images()
+    converter.extract_captions()
+    converter.add_images_to_word_document()
+    stage('images', start)
+
+    start = time.perf_counter()
+    replacer = DocumentWordReplacer()
+    for old, new in PLACEHOLDERS.items():
+        replacer.add_replacement(old, new)
+    replacer.replace_in_document(doc)
+    stage('replace', start)
+
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        output = os.path.join(folder, 'report.docx')
+        doc.save(output)
+        stage('save', start)
+        size_mb = os.path.getsize(output) / (1024 * 1024)
+
+    return {'seconds': seconds, 'peak_mb': peak_mb, 'rows': converter.progress.rows,
+            'images': converter.progress.images, 'docx_mb': size_mb}
+
+
+def measure(scale: str, template: str, work_folder: str, repeat: int) -> dict:
+    """
+    Run a scale repeat times, each in a fresh child process.
+
+    Returns:
+        dict: The fastest time and the highest peak memory of every stage.
+    """
+    html_path = printout_for(scale, work_folder)
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', template, html_path],
+            capture_output=True, text=True, check=True, cwd=ROOT)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+    return {
+        'html_mb': os.path.getsize(html_path) / (1024 * 1024),
+        'rows': runs[0]['rows'],
+        'images': runs[0]['images'],
+        'docx_mb': runs[0]['docx_mb'],
+        'seconds': {name: min(run['seconds'][name] for run in runs) for name in STAGES},
+        'peak_mb': {name: max(run['peak_mb'][name] for run in runs) for name in STAGES},
+    }
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list:
+    """
+    Returns:
+        list: A message for every stage that is slower, or needs more memory, than its
+        baseline by more than the tolerance.
+    """
+    regressions = []
+    for scale, result in results.items():
+        baseline = baselines.get('scales', {}).get(scale)
+        if not baseline:
+            continue
+        for name in STAGES:
+            for metric, unit in (('seconds', 's'), ('peak_mb', 'MB')):
+                old, new = baseline[metric][name], result[metric][name]
+                if old and new > old * (1 + tolerance):
+                    regressions.append(f"{scale} {name}: {new:.2f} {unit}, baseline {old:.2f} {unit} "
+                                       f"({new / old - 1:+.0%})")
+    return regressions
+
+
+def print_results(results: dict, baselines: dict):
+    print(f"{'scale':<8} {'stage':<8} {'time s':>8} {'baseline':>9} {'change':>7} {'peak MB':>8} {'baseline':>9}")
+    for scale, result in results.items():
+        baseline = baselines.get('scales', {}).get(scale)
+        for name in STAGES:
+            seconds, peak = result['seconds'][name], result['peak_mb'][name]
+            if baseline:
+                old_seconds, old_peak = baseline['seconds'][name], baseline['peak_mb'][name]
+                change = f"{seconds / old_seconds - 1:+.0%}" if old_seconds else ''
+                print(f"{scale:<8} {name:<8} {seconds:>8.3f} {old_seconds:>9.3f} {change:>7} "
+                      f"{peak:>8.1f} {old_peak:>9.1f}")
+            else:
+                print(f"{scale:<8} {name:<8} {seconds:>8.3f} {'-':>9} {'':>7} {peak:>8.1f} {'-':>9}")
+        total = sum(result['seconds'].values())
+        print(f"{scale:<8} {'total':<8} {total:>8.3f}   ({result['html_mb']:.1f} MB HTML, {result['rows']} rows, "
+              f"{result['images']} images, {result['docx_mb']:.1f} MB docx)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=list(SCALES))
+    parser.add_argument('--repeat', type=int, default=3, help="runs per scale, the fastest counts")
+    parser.add_argument('--template', default=os.path.join(ROOT, 'Template.docx'))
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'fsrg_benchmarks'),
+                        help="folder for the generated printouts")
+    parser.add_argument('--record', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a regression")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    parser.add_argument('--child', nargs=2, metavar=('TEMPLATE', 'HTML'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return 0
+
+    results = {scale: measure(scale, args.template, args.work, args.repeat) for scale in args.scales}
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES, 'r', encoding='utf-8') as file:
+            baselines = json.load(file)
+    print_results(results, baselines)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.record:
+        recorded = {**baselines, 'machine': f"{platform.system()} {platform.machine()}, Python {platform.python_version()}",
+                    'scales': {**baselines.get('scales', {}), **results}}
+        with open(BASELINES, 'w', encoding='utf-8') as file:
+            json.dump(recorded, file, indent=2)
+        print(f"Baselines written to {BASELINES}")
+        return 0
+
+    regressions = compare(results, baselines, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
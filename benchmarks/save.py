@@ -0,0 +1,135 @@
+"""
+Benchmark writing the finished report to disk with different save options.
+
+The report of a synthetic printout is built once, then saved repeatedly with
+
+    python-docx   Document.save, the way reports were written before
+    default       save_document with the default SaveOptions
+    level1        fastest deflate
+    level9        smallest deflate
+    deflate-media PNGs and other compressed media deflated again, as python-docx does
+    stored        nothing compressed (SaveOptions.intermediate, used for cached templates)
+    threads       deflate on one thread per CPU, in 1 MB pieces
+
+Every mode runs --repeat times and the fastest run counts. Each saved file is
+opened again with python-docx and checked to hold the same parts as the
+python-docx save. The parallel mode can only be faster on a machine with more
+than one CPU.
+
+Usage:
+    python benchmarks/save.py [--scale large] [--repeat 5] [--output save.json]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.pipeline import SCALES, printout_for
+
+MODES = {
+    'default': {},
+    'level1': {'compresslevel': 1},
+    'level9': {'compresslevel': 9},
+    'deflate-media': {'store_media': False},
+    'stored': {'compresslevel': 0},
+    'threads': {'threads': 0},
+}
+
+
+def build_report(template: str, html_path: str):
+    """Convert a printout, tables and images, into a report that is not saved yet."""
+    from html2word import HTMLToWordConverter
+    from template_cache import remove_trailing_section
+    from docx import Document
+
+    doc = Document(template)
+    remove_trailing_section(doc)
+    converter = HTMLToWordConverter(doc, html_path)
+    converter.process_html_file()
+    converter.extract_image_files()
+    converter.prepare_images()
+    converter.extract_captions()
+    converter.add_images_to_word_document()
+    return doc
+
+
+def package_parts(path: str) -> dict:
+    """The uncompressed content of every part of a saved package."""
+    with zipfile.ZipFile(path) as package:
+        return {name: package.read(name) for name in package.namelist()}
+
+
+def time_save(save, path: str, repeat: int) -> float:
+    """The fastest of repeat saves to path, in seconds."""
+    fastest = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        save(path)
+        seconds = time.perf_counter() - start
+        fastest = seconds if fastest is None else min(fastest, seconds)
+    return fastest
+
+
+def measure(doc, repeat: int, folder: str) -> dict:
+    from docx import Document
+    from docx_package import SaveOptions, save_document
+
+    reference = os.path.join(folder, 'python-docx.docx')
+    results = {'python-docx': {'seconds': time_save(doc.save, reference, repeat),
+                               'mb': os.path.getsize(reference) / (1024 * 1024), 'same_parts': True}}
+    expected = package_parts(reference)
+
+    for name, settings in MODES.items():
+        options = SaveOptions(**settings)
+        path = os.path.join(folder, f'{name}.docx')
+        seconds = time_save(lambda target: save_document(doc, target, options), path, repeat)
+        Document(path)
+        results[name] = {'seconds': seconds, 'mb': os.path.getsize(path) / (1024 * 1024),
+                         'same_parts': package_parts(path) == expected}
+
+    stream = io.BytesIO()
+    save_document(doc, stream)
+    stream.seek(0)
+    Document(stream)
+    return results
+
+
+def print_results(results: dict):
+    reference = results['python-docx']['seconds']
+    print(f"{'mode':<14} {'time s':>8} {'speedup':>8} {'MB':>7} {'parts':>6}")
+    for name, result in results.items():
+        print(f"{name:<14} {result['seconds']:>8.3f} {reference / result['seconds']:>7.2f}x "
+              f"{result['mb']:>7.2f} {'same' if result['same_parts'] else 'DIFF':>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=list(SCALES), default='large')
+    parser.add_argument('--repeat', type=int, default=5, help="saves per mode, the fastest counts")
+    parser.add_argument('--template', default=os.path.join(ROOT, 'Template.docx'))
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'fsrg_benchmarks'),
+                        help="folder for the generated printouts")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    doc = build_report(args.template, printout_for(args.scale, args.work))
+    with tempfile.TemporaryDirectory() as folder:
+        results = measure(doc, args.repeat, folder)
+    print(f"{args.scale} report, {os.cpu_count()} CPU(s)")
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'scale': args.scale, 'cpus': os.cpu_count(), 'modes': results}, file, indent=2)
+    return 0 if all(result['same_parts'] for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,183 @@
+"""
+Measure the cold start of the GUI entry point and break it down by import.
+
+Every target is imported in a fresh interpreter with -X importtime:
+
+    entry       the imports of gui.py, everything loaded before the start window
+    report      gui.rep_gen, loaded lazily for the first report (or by the warm-up)
+    rfem        the RFEM API, loaded lazily when a model is opened
+
+For each target the total import time, the packages that take longest (self
+time summed per top-level package) and the slowest individual imports are
+printed, and the entry point is checked for packages that should only be loaded
+lazily (python-docx, lxml, BeautifulSoup, Pillow, RFEM). With --window, the time
+until the start window is shown is measured as well, on the offscreen Qt
+platform. Results are compared with the baselines in benchmarks/baselines.json
+like the pipeline benchmark; --record stores new ones.
+
+Usage:
+    python benchmarks/startup.py [--repeat 5] [--top 15] [--window] [--record]
+        [--tolerance 0.25] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+TARGETS = {
+    'entry': "import runpy; runpy.run_path('gui.py', run_name='fsrg_entry')",
+    'report': "import gui.rep_gen",
+    'rfem': "from rfem_adapter import init_model; init_model()",
+}
+
+_WINDOW = """
+import time
+start = time.perf_counter()
+import runpy
+entry = runpy.run_path('gui.py', run_name='fsrg_entry')
+app = entry['QApplication']([])
+window = entry['InitialWindow']()
+window.show()
+app.processEvents()
+print(time.perf_counter() - start)
+"""
+
+# Loaded lazily, so the entry point must not import them
+LAZY_PACKAGES = ('docx', 'lxml', 'bs4', 'PIL', 'RFEM')
+
+_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def parse_importtime(stderr: str) -> list:
+    """
+    Returns:
+        list: (module, self seconds, cumulative seconds, nesting depth) of every import.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, int(own) / 1e6, int(cumulative) / 1e6, len(indent) // 2))
+    return imports
+
+
+def measure_imports(code: str) -> dict:
+    """Import a target in a fresh interpreter and break its import time down."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True,
+                            text=True, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    imports = parse_importtime(result.stderr)
+    packages = {}
+    for module, own, _, _ in imports:
+        package = module.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + own
+    return {
+        # Top-level imports, including the interpreter's own startup imports
+        'seconds': sum(cumulative for _, _, cumulative, depth in imports if depth == 0),
+        'modules': len(imports),
+        'lazy_imported': [package for package in LAZY_PACKAGES if package in packages],
+        'packages': dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)),
+        'slowest': sorted(([module, cumulative] for module, _, cumulative, _ in imports),
+                          key=lambda item: item[1], reverse=True),
+    }
+
+
+def measure_window() -> dict:
+    result = subprocess.run([sys.executable, '-c', _WINDOW], cwd=ROOT, capture_output=True, text=True,
+                            env={**os.environ, 'QT_QPA_PLATFORM': 'offscreen'})
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'}
+    return {'seconds': float(result.stdout.strip().splitlines()[-1])}
+
+
+def measure(repeat: int, window: bool) -> dict:
+    """Measure every target repeat times; the fastest run counts."""
+    results = {}
+    for name, code in TARGETS.items():
+        runs = [measure_imports(code) for _ in range(repeat)]
+        ok = [run for run in runs if 'error' not in run]
+        results[name] = min(ok, key=lambda run: run['seconds']) if ok else runs[0]
+    if window:
+        runs = [measure_window() for _ in range(repeat)]
+        ok = [run for run in runs if 'error' not in run]
+        results['window'] = min(ok, key=lambda run: run['seconds']) if ok else runs[0]
+    return results
+
+
+def print_results(results: dict, baselines: dict, top: int):
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"{name}: could not be measured ({result['error']})")
+            continue
+        baseline = baselines.get(name, {}).get('seconds')
+        change = f", baseline {baseline:.3f} s ({result['seconds'] / baseline - 1:+.0%})" if baseline else ''
+        modules = f", {result['modules']} modules" if 'modules' in result else ''
+        print(f"{name}: {result['seconds']:.3f} s{modules}{change}")
+        if name == 'entry' and result['lazy_imported']:
+            print(f"  imported before the start window: {', '.join(result['lazy_imported'])}")
+        if 'packages' in result:
+            print("  by package (self time):")
+            for package, seconds in list(result['packages'].items())[:top]:
+                print(f"    {package:<30} {seconds * 1000:>8.1f} ms")
+            print("  slowest imports (cumulative):")
+            for module, seconds in result['slowest'][:top]:
+                print(f"    {module:<30} {seconds * 1000:>8.1f} ms")
+
+
+def compare(results: dict, baselines: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        old = baselines.get(name, {}).get('seconds')
+        new = result.get('seconds')
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{name}: {new:.3f} s, baseline {old:.3f} s ({new / old - 1:+.0%})")
+    if results.get('entry', {}).get('lazy_imported'):
+        regressions.append(f"entry imports {', '.join(results['entry']['lazy_imported'])} before the start window")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help="runs per target, the fastest counts")
+    parser.add_argument('--top', type=int, default=15, help="packages and imports listed per target")
+    parser.add_argument('--window', action='store_true', help="also time the start window (needs PyQt5)")
+    parser.add_argument('--record', action='store_true', help="store the results as the new baselines")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before a regression")
+    parser.add_argument('--output', help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    results = measure(args.repeat, args.window)
+    baselines = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES, 'r', encoding='utf-8') as file:
+            baselines = json.load(file)
+    print_results(results, baselines.get('startup', {}), args.top)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    if args.record:
+        baselines['startup'] = {name: {'seconds': result['seconds']} for name, result in results.items()
+                                if 'seconds' in result}
+        baselines['startup_machine'] = f"{platform.system()} {platform.machine()}, Python {platform.python_version()}"
+        with open(BASELINES, 'w', encoding='utf-8') as file:
+            json.dump(baselines, file, indent=2)
+        print(f"Baselines written to {BASELINES}")
+        return 0
+
+    regressions = compare(results, baselines.get('startup', {}), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
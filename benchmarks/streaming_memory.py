@@ -0,0 +1,123 @@
+"""
+Compare peak memory of the tree-based and the streaming HTML ingestion.
+
+Each mode runs in its own child process so that the peak resident set size
+of one run does not hide the other. A run converts the tables and images of the
+printout and saves the report, so the peak includes writing the report file, where
+the streaming mode puts the tables it spilled to disk back in.
+
+Printouts are given as paths, or generated with --synthetic in the sizes listed in
+SIZES (about 3, 6, 12 and 30 MB), which are kept in --work for later runs.
+
+Usage:
+    python benchmarks/streaming_memory.py Template.docx pr1.html [pr2.html ...]
+    python benchmarks/streaming_memory.py Template.docx --synthetic [3mb 30mb ...]
+"""
+from dataclasses import asdict
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_printout import PrintoutSpec, write_printout
+
+# 36 sections of one 24-column table each, with 6 plots; the size grows with the rows
+SIZES = {
+    '3mb': PrintoutSpec(chapters=6, sections=6, rows=210, columns=24, images=6),
+    '6mb': PrintoutSpec(chapters=6, sections=6, rows=420, columns=24, images=6),
+    '12mb': PrintoutSpec(chapters=6, sections=6, rows=840, columns=24, images=6),
+    '30mb': PrintoutSpec(chapters=6, sections=6, rows=2100, columns=24, images=6),
+}
+
+
+def peak_memory_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+
+
+def synthetic_printout(size: str, work_folder: str) -> str:
+    """Return the synthetic printout of a size, generating it on first use."""
+    folder = os.path.join(work_folder, f'streaming_{size}')
+    html_path = os.path.join(folder, 'pr1.html')
+    spec_path = os.path.join(folder, 'spec.json')
+    spec = asdict(SIZES[size])
+    spec['image_size'] = list(spec['image_size'])
+    if os.path.exists(html_path) and os.path.exists(spec_path):
+        with open(spec_path, 'r', encoding='utf-8') as file:
+            if json.load(file) == spec:
+                return html_path
+    os.makedirs(folder, exist_ok=True)
+    write_printout(html_path, SIZES[size])
+    with open(spec_path, 'w', encoding='utf-8') as file:
+        json.dump(spec, file)
+    return html_path
+
+
+def run_child(mode: str, template: str, html_path: str):
+    from html2word import HTMLToWordConverter
+
+    start = time.perf_counter()
+    converter = HTMLToWordConverter(template, html_path, streaming=(mode == 'streaming'))
+    converter._delete_last_page_in_template()
+    converter.process_html_file()
+    converter.extract_image_files()
+    converter.extract_captions()
+    converter.add_images_to_word_document()
+    with tempfile.TemporaryDirectory() as folder:
+        converter.save(os.path.join(folder, 'report.docx'))
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed:.3f} {peak_memory_mb():.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('template')
+    parser.add_argument('html', nargs='*')
+    parser.add_argument('--synthetic', nargs='*', choices=list(SIZES),
+                        help="generate printouts of these sizes, all sizes if none are given")
+    parser.add_argument('--work', default=os.path.join(tempfile.gettempdir(), 'fsrg_benchmarks'),
+                        help="folder for the generated printouts")
+    parser.add_argument('--child', choices=['tree', 'streaming'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.template, args.html[0])
+        return
+
+    html_paths = list(args.html)
+    if args.synthetic is not None:
+        html_paths += [synthetic_printout(size, args.work) for size in args.synthetic or SIZES]
+    if not html_paths:
+        parser.error("give printouts or --synthetic")
+
+    print(f"{'printout':<30} {'size MB':>8} {'mode':>10} {'time s':>8} {'peak MB':>8}")
+    for html_path in html_paths:
+        size_mb = os.path.getsize(html_path) / (1024 * 1024)
+        name = os.path.relpath(html_path, args.work) if html_path.startswith(args.work) else os.path.basename(html_path)
+        for mode in ('tree', 'streaming'):
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), args.template, html_path, '--child', mode],
+                capture_output=True, text=True)
+            if result.returncode != 0:
+                error = result.stderr.strip().splitlines()[-1] if result.stderr.strip() else 'failed'
+                print(f"{name:<30} {size_mb:>8.1f} {mode:>10} failed: {error}")
+                continue
+            elapsed, peak = result.stdout.split()[-2:]
+            print(f"{name:<30} {size_mb:>8.1f} {mode:>10} {elapsed:>8} {peak:>8}")
+
+
+if __name__ == "__main__":
+    main()
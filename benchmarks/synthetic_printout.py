@@ -0,0 +1,142 @@
+"""
+Generate synthetic RFEM-like HTML printouts for benchmarks.
+
+A printout has h1 chapters with numbered h2 sections. Every section holds result
+tables with header rows spanning several columns, coloured label cells and
+numeric values, and the first sections are followed by plots. The plots are
+written as PNGs to the <name>_data folder, the way RFEM exports them.
+
+Usage:
+    python benchmarks/synthetic_printout.py out/pr1.html [--chapters 4] [--sections 5]
+        [--tables 1] [--rows 200] [--columns 10] [--images 12] [--seed 0]
+"""
+from dataclasses import dataclass
+from html import escape
+import argparse
+import os
+import random
+
+# Colours RFEM uses to mark label cells and header rows
+_COLOURS = ('#D9E1F2', '#FFF2CC', '#E2EFDA', 'rgb(242, 242, 242)')
+_CHAPTERS = ('Basic Objects', 'Types for Nodes', 'Types for Lines', 'Load Cases and Combinations',
+             'Static Analysis Results', 'Design Checks')
+_SECTIONS = ('Materials', 'Sections', 'Nodes', 'Lines', 'Members', 'Surfaces', 'Nodal Supports',
+             'Line Supports', 'Internal Forces', 'Deformations', 'Support Reactions', 'Stresses')
+
+
+@dataclass
+class PrintoutSpec:
+    """
+    The shape of a synthetic printout.
+
+    Attributes:
+        chapters (int): Number of h1 chapters.
+        sections (int): Number of h2 sections per chapter.
+        tables (int): Number of tables per section.
+        rows (int): Number of data rows per table.
+        columns (int): Number of grid columns per table.
+        images (int): Number of plots, one after each of the first sections.
+        image_size (tuple): Width and height of the plots in pixels.
+        colspan_every (int): Every n-th data row has a label cell spanning two columns.
+        colour_every (int): Every n-th data row has a coloured label cell.
+        seed (int): Seed of the random values, so that printouts are reproducible.
+    """
+    chapters: int = 4
+    sections: int = 5
+    tables: int = 1
+    rows: int = 200
+    columns: int = 10
+    images: int = 12
+    image_size: tuple = (1600, 1000)
+    colspan_every: int = 7
+    colour_every: int = 3
+    seed: int = 0
+
+
+def _table(spec: PrintoutSpec, rng: random.Random, title: str) -> str:
+    columns = max(spec.columns, 3)
+    lines = ['<table class="result">',
+             f'<tr><th colspan="2">{escape(title)}</th>'
+             f'<th colspan="{columns - 2}" style="background-color: {_COLOURS[0]};">Values</th></tr>',
+             '<tr><th>No.</th><th>Description</th>'
+             + ''.join(f'<th>Value {c}<br/>[kN]</th>' for c in range(1, columns - 1)) + '</tr>']
+    for row in range(1, spec.rows + 1):
+        style = f' style="background-color: {rng.choice(_COLOURS)};"' if row % spec.colour_every == 0 else ''
+        values = ''.join(f'<td>{rng.uniform(-1000, 1000):.3f}</td>' for _ in range(columns - 2))
+        if row % spec.colspan_every == 0:
+            lines.append(f'<tr><td colspan="2"{style}>Sum {row} &amp; total</td>{values}</tr>')
+        else:
+            blank = '<td></td>' if row % 11 == 0 else f'<td>{row}</td>'
+            lines.append(f'<tr>{blank}<td{style}>Member {row}</td>{values}</tr>')
+    lines.append('</table>')
+    return '\n'.join(lines)
+
+
+def _plot(path: str, spec: PrintoutSpec, rng: random.Random):
+    """Draw a line plot on a white background, which compresses like an RFEM graphic."""
+    from PIL import Image, ImageDraw
+
+    width, height = spec.image_size
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for x in range(0, width, 100):
+        draw.line([(x, 0), (x, height)], fill=(220, 220, 220))
+    for _ in range(6):
+        colour = tuple(rng.randrange(0, 200) for _ in range(3))
+        points = [(x, height / 2 + rng.uniform(-height / 3, height / 3)) for x in range(0, width + 1, 40)]
+        draw.line(points, fill=colour, width=3)
+    image.save(path, optimize=False)
+
+
+def write_printout(html_path: str, spec: PrintoutSpec) -> str:
+    """
+    Write a synthetic printout and its plots.
+
+    Args:
+        html_path (str): Where the HTML is written, the plots go to <name>_data next to it.
+        spec (PrintoutSpec): The shape of the printout.
+
+    Returns:
+        str: html_path.
+    """
+    rng = random.Random(spec.seed)
+    folder = os.path.dirname(os.path.abspath(html_path))
+    name = os.path.splitext(os.path.basename(html_path))[0]
+    data_folder = os.path.join(folder, f"{name}_data")
+    os.makedirs(data_folder, exist_ok=True)
+
+    parts = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Printout Report</title></head><body>']
+    image = 0
+    for chapter in range(1, spec.chapters + 1):
+        parts.append(f'<h1>{chapter} {_CHAPTERS[(chapter - 1) % len(_CHAPTERS)]}</h1>')
+        for section in range(1, spec.sections + 1):
+            heading = _SECTIONS[(chapter * spec.sections + section) % len(_SECTIONS)]
+            parts.append(f'<h2>{chapter}.{section} {heading} Statische Analyse</h2>')
+            for table in range(spec.tables):
+                parts.append(_table(spec, rng, f'{heading} {table + 1}'))
+            if image < spec.images:
+                filename = f'img{image}.png'
+                _plot(os.path.join(data_folder, filename), spec, rng)
+                parts.append(f'<p><img src="{name}_data/{filename}" alt="Graphic"></p>')
+                image += 1
+    parts.append('</body></html>')
+    with open(html_path, 'w', encoding='utf-8') as file:
+        file.write('\n'.join(parts))
+    return html_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('html', help="path of the printout to write")
+    defaults = PrintoutSpec()
+    for field in ('chapters', 'sections', 'tables', 'rows', 'columns', 'images', 'seed'):
+        parser.add_argument(f'--{field}', type=int, default=getattr(defaults, field))
+    args = parser.parse_args()
+    spec = PrintoutSpec(args.chapters, args.sections, args.tables, args.rows, args.columns, args.images,
+                        seed=args.seed)
+    write_printout(args.html, spec)
+    print(f"Wrote {args.html} ({os.path.getsize(args.html) / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from typing import Iterator, List, Optional
+from docx.document import Document as DocxDocument
+from docx.oxml.ns import qn
+from lxml import etree
+import re
+import tempfile
+import weakref
+
+# Left in the body where spilled elements belong; the number is the index of the segment
+_MARKER = re.compile(rb'<!--fsrg-spill:(\d+)-->')
+_DECLARATION = re.compile(rb' xmlns(?::([\w.-]+))?="([^"]*)"')
+_READ_SIZE = 1 << 20
+
+# The spill of each document part that has one
+_spills: 'weakref.WeakKeyDictionary[object, BodySpill]' = weakref.WeakKeyDictionary()
+
+
+class BodySpill:
+    """
+    Body content of a report moved out of memory into a temporary file.
+
+    python-docx keeps the whole report as one lxml tree, which for results-heavy
+    printouts needs far more memory than the printout itself. Sections that will not
+    be changed again, such as the tables written in streaming mode, are serialized
+    to the file and removed from the tree. A comment marks where they belong, and
+    docx_package.save_document splices them back in when the report is written, so
+    the report is only complete once it is saved that way. Document.save would leave
+    the spilled content out.
+
+    Consecutive spills share one marker and one segment of the file. The highest
+    bookmark and drawing ids spilled are kept, so that new ids do not collide with them.
+
+    Elements are serialized where they are and emptied before they are removed: lxml
+    fixes up the namespaces of every node moved or removed with its children, which
+    takes time quadratic in the size of a table.
+    """
+
+    def __init__(self, nsmap: dict):
+        """
+        Initialize an empty spill.
+
+        Args:
+            nsmap (dict): The namespaces declared on the root of the document part.
+                          Spilled elements are written without declaring them again.
+        """
+        self._declared = {(prefix or '').encode('utf-8'): uri.encode('utf-8') for prefix, uri in nsmap.items()}
+        self._file = tempfile.TemporaryFile(prefix='fsrg_body_')
+        self._size = 0
+        # Offset and length in the file of the content of each marker
+        self._segments: List[List[int]] = []
+        self._marker = None
+        self.max_bookmark_id = 0
+        self.max_shape_id = 0
+
+    @classmethod
+    def of(cls, doc: DocxDocument, create: bool = False) -> Optional['BodySpill']:
+        """
+        The spill of a document.
+
+        Args:
+            doc (DocxDocument): The document.
+            create (bool): Start a spill if the document has none yet.
+
+        Returns:
+            Optional[BodySpill]: The spill, or None if nothing has been spilled and create is False.
+        """
+        spill = _spills.get(doc.part)
+        if spill is None and create:
+            spill = _spills[doc.part] = cls(doc.element.nsmap)
+        return spill
+
+    @property
+    def bytes(self) -> int:
+        """The size of the spilled XML."""
+        return self._size
+
+    def spill(self, elements: list):
+        """
+        Move consecutive body elements to the file, leaving a marker where they were.
+
+        Args:
+            elements (list): Body elements in document order, none of which is changed again.
+        """
+        if not elements:
+            return
+        if self._marker is None or elements[0].getprevious() is not self._marker:
+            self._marker = etree.Comment(f'fsrg-spill:{len(self._segments)}')
+            elements[0].addprevious(self._marker)
+            self._segments.append([self._size, 0])
+        self._file.seek(self._size)
+        for element in elements:
+            for start in element.iter(qn('w:bookmarkStart')):
+                self.max_bookmark_id = max(self.max_bookmark_id, _int(start.get(qn('w:id'))))
+            for doc_pr in element.iter(qn('wp:docPr')):
+                self.max_shape_id = max(self.max_shape_id, _int(doc_pr.get('id')))
+            xml = self._without_declared(etree.tostring(element, encoding='UTF-8', xml_declaration=False))
+            self._file.write(xml)
+            self._size += len(xml)
+            self._segments[-1][1] += len(xml)
+            element.clear()
+            element.getparent().remove(element)
+
+    def _without_declared(self, xml: bytes) -> bytes:
+        """
+        Drop the namespace declarations lxml repeats on the start tag of a serialized
+        element that the root of the document part makes already.
+        """
+        end = xml.index(b'>')
+        start_tag = _DECLARATION.sub(
+            lambda match: b'' if self._declared.get(match.group(1) or b'') == match.group(2) else match.group(0),
+            xml[:end])
+        return start_tag + xml[end:]
+
+    def splice(self, blob: bytes) -> 'SplicedXml':
+        """The serialized document part blob with the spilled content put back in."""
+        return SplicedXml(blob, self)
+
+    def _read(self, segment: int) -> Iterator[bytes]:
+        offset, length = self._segments[segment]
+        while length > 0:
+            self._file.seek(offset)
+            chunk = self._file.read(min(length, _READ_SIZE))
+            offset += len(chunk)
+            length -= len(chunk)
+            yield chunk
+
+
+class SplicedXml:
+    """
+    The XML of a document part with its spilled content, read in pieces so that it
+    is never held in memory as a whole.
+    """
+
+    def __init__(self, blob: bytes, spill: BodySpill):
+        self._blob = blob
+        self._spill = spill
+        self._markers = list(_MARKER.finditer(blob))
+
+    def __len__(self) -> int:
+        return len(self._blob) + sum(self._spill._segments[int(marker.group(1))][1] - len(marker.group(0))
+                                     for marker in self._markers)
+
+    def __iter__(self) -> Iterator[bytes]:
+        position = 0
+        for marker in self._markers:
+            yield self._blob[position:marker.start()]
+            yield from self._spill._read(int(marker.group(1)))
+            position = marker.end()
+        yield self._blob[position:]
+
+
+def _int(value: Optional[str]) -> int:
+    return int(value) if value and value.lstrip('-').isdigit() else 0
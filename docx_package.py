@@ -0,0 +1,347 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Dict, List, Optional, Tuple, Union
+from docx.document import Document as DocxDocument
+from body_spill import BodySpill, SplicedXml
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+
+try:
+    from docx.opc.pkgwriter import PackageWriter
+except ImportError:
+    PackageWriter = None
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_SIGNATURE = b'PK\x03\x04'
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_CENTRAL_SIGNATURE = b'PK\x01\x02'
+_END_RECORD = struct.Struct('<4s4H2LH')
+_END_SIGNATURE = b'PK\x05\x06'
+
+_UTF8_FLAG = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+# Media formats that are compressed already; deflating them again costs time and saves nothing
+_COMPRESSED_MEDIA = ('.png', '.jpg', '.jpeg', '.jpe', '.jfif', '.gif', '.wdp', '.emz', '.wmz',
+                     '.mp3', '.mp4', '.m4a', '.zip', '.docx', '.xlsx', '.pptx')
+
+# Members are compressed in pieces of this size when threads are used
+_CHUNK_SIZE = 1 << 20
+
+# The private methods of python-docx that serialize the package members, as of python-docx 1.2
+_PACKAGE_WRITER_METHODS = ('_write_content_types_stream', '_write_pkg_rels', '_write_parts')
+
+
+@dataclass
+class SaveOptions:
+    """
+    How a document package is compressed when it is written.
+
+    The defaults match the compression of python-docx's own save, except that media
+    which is compressed already is stored instead of being deflated again.
+
+    Attributes:
+        compresslevel (int): zlib level for the XML and other parts, 0 stores everything
+                             uncompressed, which suits files that are read back soon after.
+        store_media (bool): Store PNG, JPEG and other compressed media as they are.
+        threads (int): Compress on this many threads, 0 for one per CPU. With more than one,
+                       large parts are deflated in 1 MB pieces in parallel, as pigz does,
+                       which makes the file slightly larger.
+    """
+    compresslevel: int = 6
+    store_media: bool = True
+    threads: int = 1
+
+    @classmethod
+    def intermediate(cls) -> 'SaveOptions':
+        """Options for a package that is only read back by this program: nothing is compressed."""
+        return cls(compresslevel=0)
+
+    def method(self, name: str) -> int:
+        """The zip compression method of a member."""
+        if not self.compresslevel or (self.store_media and name.lower().endswith(_COMPRESSED_MEDIA)):
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+
+def _dos_date_time(date_time: Tuple[int, int, int, int, int, int]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = max(year - 1980, 0) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | second // 2
+    return dos_date, dos_time
+
+
+def deflate(data: bytes, level: int) -> bytes:
+    """
+    Compress data as a raw deflate stream, as stored in a zip member.
+
+    Args:
+        data (bytes): The uncompressed member.
+        level (int): zlib compression level, 0-9.
+
+    Returns:
+        bytes: The compressed member.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _deflate_piece(data: memoryview, level: int, last: bool) -> bytes:
+    # A sync flush ends the piece on a byte boundary without marking the final block,
+    # so the pieces of a member can be concatenated into one deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _submit_deflate(data: bytes, level: int, executor: ThreadPoolExecutor) -> list:
+    """
+    Start compressing data as a raw deflate stream, in independent pieces on the executor's threads.
+
+    zlib releases the GIL while it compresses, so the pieces are compressed at the same
+    time. Every piece starts without the history of the one before, so the result is a
+    little larger than that of deflate.
+
+    Returns:
+        list: The futures of the compressed pieces, to be joined in order.
+    """
+    view = memoryview(data)
+    starts = range(0, len(data), _CHUNK_SIZE) or range(1)
+    return [executor.submit(_deflate_piece, view[start:start + _CHUNK_SIZE], level, start == starts[-1])
+            for start in starts]
+
+
+def _exceeds_zip32(members: int, total_size: int, largest: int) -> bool:
+    return members >= 0xFFFF or total_size >= _ZIP32_LIMIT or largest >= _ZIP32_LIMIT
+
+
+def _compress_pieces(data: SplicedXml, method: int, level: int) -> Tuple[int, Union[bytes, SplicedXml]]:
+    """
+    The CRC and the payload of a member that is read in pieces.
+
+    A stored member is returned as it is, to be read again when it is written.
+    """
+    crc = 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if method == zipfile.ZIP_DEFLATED else None
+    compressed = []
+    for piece in data:
+        crc = zlib.crc32(piece, crc)
+        if compressor is not None:
+            compressed.append(compressor.compress(piece))
+    if compressor is None:
+        return crc, data
+    compressed.append(compressor.flush())
+    return crc, b''.join(compressed)
+
+
+def _write_member(output, info: zipfile.ZipInfo, method: int, crc: int, payload: Union[bytes, SplicedXml],
+                  size: int) -> tuple:
+    """
+    Write the local header and the payload of a member, returning its central directory entry.
+    A payload that is not bytes is written piece by piece.
+    """
+    name = info.filename.encode('utf-8')
+    flags = _UTF8_FLAG if not info.filename.isascii() else 0
+    dos_date, dos_time = _dos_date_time(info.date_time)
+    offset = output.tell()
+    output.write(_LOCAL_HEADER.pack(_LOCAL_SIGNATURE, 20, 0, flags, method, dos_time, dos_date,
+                                    crc, len(payload), size, len(name), 0))
+    output.write(name)
+    if isinstance(payload, bytes):
+        output.write(payload)
+    else:
+        for piece in payload:
+            output.write(piece)
+    return name, flags, method, dos_time, dos_date, crc, len(payload), size, info.external_attr, offset
+
+
+def _write_central_directory(output, central: list):
+    start = output.tell()
+    for name, flags, method, dos_time, dos_date, crc, compressed, size, external_attr, offset in central:
+        output.write(_CENTRAL_HEADER.pack(_CENTRAL_SIGNATURE, 20, 0, 20, 0, flags, method, dos_time, dos_date,
+                                          crc, compressed, size, len(name), 0, 0, 0, 0,
+                                          external_attr, offset))
+        output.write(name)
+    size = output.tell() - start
+    output.write(_END_RECORD.pack(_END_SIGNATURE, 0, 0, len(central), len(central), size, start, 0))
+
+
+class PackageRewriter:
+    """
+    Write a copy of a zip package (e.g. a .docx) with some members replaced.
+
+    Members that are not replaced are copied as their raw compressed bytes,
+    without being inflated and deflated again, so embedded media costs no more
+    than a file copy. Replaced members are deflated at the configured level,
+    or stored when the level is 0.
+    """
+
+    def __init__(self, source_path: str, compresslevel: int = 6):
+        """
+        Initialize the rewriter.
+
+        Args:
+            source_path (str): The path of the package to copy from.
+            compresslevel (int): zlib level for replaced members, 0 stores them uncompressed.
+        """
+        self.source_path = source_path
+        self.compresslevel = compresslevel
+
+    def write(self, output_path: str, replaced: Dict[str, bytes]):
+        """
+        Write the package to output_path with the given members replaced.
+
+        Args:
+            output_path (str): Where to write the new package.
+            replaced (Dict[str, bytes]): New uncompressed content by member name.
+        """
+        with zipfile.ZipFile(self.source_path, 'r') as zin:
+            infos = zin.infolist()
+            if self._needs_zip64(infos, replaced):
+                self._write_with_zipfile(zin, output_path, replaced)
+                return
+            with open(self.source_path, 'rb') as source, open(output_path, 'wb') as output:
+                central = []
+                for info in infos:
+                    if info.filename in replaced:
+                        entry = self._write_replaced(output, info, replaced[info.filename])
+                    else:
+                        entry = self._copy_raw(source, output, info)
+                    central.append(entry)
+                _write_central_directory(output, central)
+
+    @staticmethod
+    def _needs_zip64(infos: List[zipfile.ZipInfo], replaced: Dict[str, bytes]) -> bool:
+        total = sum(info.compress_size for info in infos) + sum(len(data) for data in replaced.values())
+        return _exceeds_zip32(len(infos), total, max((info.file_size for info in infos), default=0))
+
+    def _write_with_zipfile(self, zin: zipfile.ZipFile, output_path: str, replaced: Dict[str, bytes]):
+        """Fallback for packages that need zip64: recompress everything with zipfile."""
+        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=self.compresslevel) as zout:
+            for info in zin.infolist():
+                zout.writestr(info, replaced.get(info.filename) or zin.read(info.filename))
+
+    def _write_replaced(self, output, info: zipfile.ZipInfo, data: bytes) -> tuple:
+        if self.compresslevel:
+            method, payload = zipfile.ZIP_DEFLATED, deflate(data, self.compresslevel)
+        else:
+            method, payload = zipfile.ZIP_STORED, data
+        return _write_member(output, info, method, zlib.crc32(data), payload, len(data))
+
+    def _copy_raw(self, source, output, info: zipfile.ZipInfo) -> tuple:
+        source.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(source.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local file header for {info.filename}")
+        source.seek(header[10] + header[11], 1)  # file name and extra field
+        payload = source.read(info.compress_size)
+        return _write_member(output, info, info.compress_type, info.CRC, payload, info.file_size)
+
+
+def _package_members(doc: DocxDocument) -> List[Tuple[str, Union[bytes, SplicedXml]]]:
+    """
+    The members of a document package, serialized the way python-docx saves them.
+    The main document part is read in pieces if part of its body has been spilled.
+
+    The members are taken from the PackageWriter of python-docx, whose methods for
+    this are private. If a python-docx version does not have them, the document is
+    saved into memory with doc.save and the members are read back from there.
+    """
+
+    class Collector:
+        def __init__(self):
+            self.members: List[Tuple[str, bytes]] = []
+
+        def write(self, pack_uri, blob: bytes):
+            self.members.append((pack_uri.membername, blob))
+
+    if all(hasattr(PackageWriter, name) for name in _PACKAGE_WRITER_METHODS):
+        package = doc.part.package
+        parts = list(package.parts)
+        for part in parts:
+            part.before_marshal()
+        collector = Collector()
+        PackageWriter._write_content_types_stream(collector, parts)
+        PackageWriter._write_pkg_rels(collector, package.rels)
+        PackageWriter._write_parts(collector, parts)
+        members = collector.members
+    else:
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        with zipfile.ZipFile(buffer) as saved:
+            members = [(info.filename, saved.read(info)) for info in saved.infolist()]
+    spill = BodySpill.of(doc)
+    if spill is None:
+        return members
+    document = doc.part.partname.membername
+    return [(name, spill.splice(blob) if name == document else blob) for name, blob in members]
+
+
+def save_document(doc: DocxDocument, target: Union[str, IO[bytes]], options: Optional[SaveOptions] = None):
+    """
+    Write a document like doc.save, with the compression chosen by options.
+
+    Body content spilled to disk (see body_spill.BodySpill) is put back in while the
+    main document part is written, without reading it into memory as a whole.
+
+    Args:
+        doc (DocxDocument): The document to write.
+        target (Union[str, IO[bytes]]): A path or a writable binary stream.
+        options (Optional[SaveOptions]): How the members are compressed, defaults if None.
+    """
+    options = options or SaveOptions()
+    members = _package_members(doc)
+    date_time = time.localtime(time.time())[:6]
+    if _exceeds_zip32(len(members), sum(len(blob) for _, blob in members), max(len(blob) for _, blob in members)):
+        with zipfile.ZipFile(target, 'w', compresslevel=options.compresslevel or None) as zout:
+            for name, blob in members:
+                if isinstance(blob, bytes):
+                    zout.writestr(zipfile.ZipInfo(name, date_time), blob, options.method(name),
+                                  options.compresslevel or None)
+                    continue
+                zout.compression = options.method(name)
+                with zout.open(name, 'w', force_zip64=True) as member:
+                    for piece in blob:
+                        member.write(piece)
+        return
+
+    methods = [options.method(name) for name, _ in members]
+    level = options.compresslevel
+    threads = options.threads or os.cpu_count() or 1
+    compressed: Dict[int, Tuple[int, Union[bytes, SplicedXml]]] = {}
+    if threads > 1:
+        with ThreadPoolExecutor(threads) as executor:
+            # Submit every piece of every member before waiting for any of them
+            crcs = {index: executor.submit(zlib.crc32, blob)
+                    for index, (_, blob) in enumerate(members) if isinstance(blob, bytes)}
+            pieces = {index: _submit_deflate(members[index][1], level, executor)
+                      for index in crcs if methods[index] == zipfile.ZIP_DEFLATED}
+            # Members read in pieces are compressed on this thread in the meantime
+            for index, (_, blob) in enumerate(members):
+                if index not in crcs:
+                    compressed[index] = _compress_pieces(blob, methods[index], level)
+            for index, crc in crcs.items():
+                payload = b''.join(piece.result() for piece in pieces[index]) if index in pieces else members[index][1]
+                compressed[index] = crc.result(), payload
+    else:
+        for index, ((_, blob), method) in enumerate(zip(members, methods)):
+            if not isinstance(blob, bytes):
+                compressed[index] = _compress_pieces(blob, method, level)
+            else:
+                compressed[index] = zlib.crc32(blob), deflate(blob, level) if method == zipfile.ZIP_DEFLATED else blob
+
+    output = open(target, 'wb') if isinstance(target, str) else target
+    try:
+        central = []
+        for index, ((name, blob), method) in enumerate(zip(members, methods)):
+            crc, payload = compressed[index]
+            info = zipfile.ZipInfo(name, date_time)
+            info.external_attr = 0o600 << 16
+            central.append(_write_member(output, info, method, crc, payload, len(blob)))
+        _write_central_directory(output, central)
+    finally:
+        if output is not target:
+            output.close()
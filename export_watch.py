@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+from typing import Iterable, Optional, Tuple
+import os
+import threading
+import time
+from report_job import ReportCancelled
+
+# Bytes read from the end of the printout when looking for its closing tag
+_TAIL_BYTES = 4096
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog is optional, polling is used without it
+    FileSystemEventHandler = object
+    Observer = None
+
+
+@dataclass
+class ExportWatchOptions:
+    """
+    Settings for detecting that an RFEM HTML export has finished.
+
+    Attributes:
+        timeout (float): Seconds to wait before giving up.
+        settle (float): Seconds the printout and its image folder must stay unchanged.
+        unterminated_settle (float): Seconds a printout that does not end with </html> must
+                                     stay unchanged before it is accepted anyway.
+        min_poll (float): First polling interval in seconds.
+        max_poll (float): Longest polling interval in seconds.
+    """
+    timeout: float = 600.0
+    settle: float = 0.5
+    unterminated_settle: float = 30.0
+    min_poll: float = 0.05
+    max_poll: float = 1.0
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """Wakes the waiting thread whenever something changes in the export folder."""
+
+    def __init__(self, changed: threading.Event):
+        super().__init__()
+        self.changed = changed
+
+    def on_any_event(self, event):
+        self.changed.set()
+
+
+class ExportCompletionWatcher:
+    """
+    Wait until an exported printout and its _data image folder are completely written.
+
+    The export is complete once the HTML file exists, is not empty, neither the
+    file nor the image folder has changed for the settle time and the file can be
+    opened and ends with its closing </html> tag. RFEM pauses between pages, so a
+    quiet file alone does not mean it is finished; a printout that never gets its
+    closing tag is only accepted after the longer unterminated settle time. With watchdog
+    installed the watcher sleeps until the file system reports a change; otherwise
+    it polls, starting with a short interval that grows while nothing changes.
+    """
+
+    def __init__(self, options: Optional[ExportWatchOptions] = None):
+        """
+        Initialize the watcher.
+
+        Args:
+            options (Optional[ExportWatchOptions]): The timing settings, defaults if None.
+        """
+        self.options = options or ExportWatchOptions()
+
+    @staticmethod
+    def _snapshot(html_path: str) -> Optional[Tuple]:
+        """
+        Size and modification time of the printout and of every file in its image folder.
+        """
+        try:
+            stat = os.stat(html_path)
+        except FileNotFoundError:
+            return None
+        data_folder = f"{os.path.splitext(html_path)[0]}_data"
+        images = []
+        if os.path.isdir(data_folder):
+            with os.scandir(data_folder) as entries:
+                for entry in entries:
+                    try:
+                        entry_stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    images.append((entry.name, entry_stat.st_size, entry_stat.st_mtime_ns))
+        return stat.st_size, stat.st_mtime_ns, tuple(sorted(images))
+
+    @staticmethod
+    def _is_terminated(html_path: str) -> bool:
+        """
+        Whether the printout can be opened and ends with its closing </html> tag.
+        """
+        try:
+            with open(html_path, 'rb') as file:
+                size = file.seek(0, os.SEEK_END)
+                file.seek(max(size - _TAIL_BYTES, 0))
+                tail = file.read()
+        except OSError:  # Still locked by RFEM or removed again
+            return False
+        # Dropping NUL bytes also finds the tag in UTF-16 printouts
+        return tail.replace(b'\x00', b'').rstrip().lower().endswith(b'</html>')
+
+    def wait(self, html_path: str, export_result=None, stop: Iterable[threading.Event] = ()) -> float:
+        """
+        Block until the export of html_path is complete.
+
+        Args:
+            html_path (str): The path of the exported printout.
+            export_result: The return value of the export call. False means the export
+                           failed; a path returned by the export is watched instead of html_path.
+            stop (Iterable[threading.Event]): Events that abandon the wait once one of them is
+                                              set, such as the cancellation flag of the run.
+                                              They are checked on every poll.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            RuntimeError: If the export call reported a failure.
+            TimeoutError: If the export did not complete within the timeout.
+            ReportCancelled: If one of the stop events was set.
+        """
+        if export_result is False:
+            raise RuntimeError(f"RFEM reported a failed export for {html_path}")
+        if isinstance(export_result, str) and export_result:
+            html_path = export_result
+
+        options = self.options
+        stop = tuple(stop)
+        start = time.perf_counter()
+        changed = threading.Event()
+        observer = self._start_observer(html_path, changed)
+        try:
+            previous = None
+            stable_since = None
+            poll = options.min_poll
+            while True:
+                if any(event.is_set() for event in stop):
+                    raise ReportCancelled()
+                now = time.perf_counter()
+                snapshot = self._snapshot(html_path)
+                unchanged = snapshot is not None and snapshot == previous
+                if unchanged and snapshot[0] > 0 and now - stable_since >= options.settle:
+                    if (self._is_terminated(html_path)
+                            or now - stable_since >= options.unterminated_settle):
+                        return now - start
+                if not unchanged:
+                    stable_since = now
+                    if snapshot is not None:
+                        poll = options.min_poll
+                previous = snapshot
+                if now - start > options.timeout:
+                    raise TimeoutError(f"Export of {html_path} did not complete within {options.timeout:g} s")
+                if observer is not None:
+                    # A change wakes us immediately; otherwise re-check once the settle time is up
+                    changed.wait(options.settle if snapshot is not None else options.max_poll)
+                    changed.clear()
+                elif unchanged:
+                    time.sleep(max(stable_since + options.settle - now, poll))
+                    poll = min(poll * 2, options.max_poll)
+                else:
+                    time.sleep(poll)
+                    poll = min(poll * 2, options.max_poll)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+    @staticmethod
+    def _start_observer(html_path: str, changed: threading.Event):
+        if Observer is None:
+            return None
+        folder = os.path.dirname(os.path.abspath(html_path))
+        try:
+            observer = Observer()
+            observer.schedule(_ChangeHandler(changed), folder, recursive=True)
+            observer.start()
+        except OSError:
+            return None
+        return observer
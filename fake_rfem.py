@@ -0,0 +1,330 @@
+"""
+A local stand-in for the RFEM web service, for running the pipeline without RFEM.
+
+FakeRFEM implements the calls the generator makes: Client(url).service.get_model_list(),
+Model(...) / openFile(path) with clientModel.service.close_connection(), and
+PrintoutReport.exportToHTML(index, path, model=...). Exports serve canned printouts
+from a folder, or synthetic ones (benchmarks/synthetic_printout.py) generated once
+per model and printout. Like RFEM, an export call returns before the printout is
+completely on disk, and latency and failures can be injected.
+
+It is selected through rfem_adapter by setting FSRG_FAKE_RFEM to "1" for the
+default settings, to a JSON object of FakeRFEMOptions fields, or to the path of a
+JSON file holding one, e.g.
+
+    FSRG_FAKE_RFEM='{"models": ["Slab A", "Slab B"], "export_latency": 0.5, "failure_rate": 0.1}'
+"""
+from dataclasses import asdict, dataclass, field
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+FAKE_RFEM_ENVIRONMENT = 'FSRG_FAKE_RFEM'
+
+
+class FakeRFEMError(ConnectionError):
+    """An injected failure of the fake RFEM service."""
+
+
+@dataclass
+class FakeRFEMOptions:
+    """
+    Settings of the fake RFEM service.
+
+    Attributes:
+        models (List[str]): The names of the models open in RFEM.
+        printout_folder (Optional[str]): A folder of canned pr<N>.html printouts with their
+                                         _data folders; printout N is served from it,
+                                         cycling if there are fewer. Synthetic printouts
+                                         are generated if None.
+        printout (Dict): PrintoutSpec fields of the synthetic printouts.
+        cache_folder (Optional[str]): Where synthetic printouts are kept between exports,
+                                      a folder in the temporary directory if None.
+        connect_latency (float): Seconds every service call takes.
+        export_latency (float): Seconds an export call blocks.
+        latency_jitter (float): Up to this many seconds are added to every latency at random.
+        write_seconds (float): Seconds the printout keeps being written after the export
+                               call has returned.
+        failure_rate (float): Probability that an export fails.
+        fail_printouts (List[int]): Printout numbers whose export always fails.
+        failure_modes (List[str]): How an export fails, picked at random: 'error' raises
+                                   FakeRFEMError, 'false' returns False, 'stall' returns
+                                   True but never writes the printout.
+        seed (int): Seed of the injected latencies and failures.
+    """
+    models: List[str] = field(default_factory=lambda: ['Model 1'])
+    printout_folder: Optional[str] = None
+    printout: Dict = field(default_factory=lambda: {'chapters': 2, 'sections': 3, 'rows': 50, 'images': 4,
+                                                    'image_size': [800, 500]})
+    cache_folder: Optional[str] = None
+    connect_latency: float = 0.0
+    export_latency: float = 0.2
+    latency_jitter: float = 0.0
+    write_seconds: float = 0.1
+    failure_rate: float = 0.0
+    fail_printouts: List[int] = field(default_factory=list)
+    failure_modes: List[str] = field(default_factory=lambda: ['error'])
+    seed: int = 0
+
+
+class FakeModelList:
+    """The answer of get_model_list, which lists the model names in .name like the SOAP type."""
+
+    def __init__(self, names: List[str]):
+        self.name = list(names)
+
+
+class FakeRFEMService:
+    """The SOAP service of the fake RFEM, as reached through Client(...).service."""
+
+    def __init__(self, rfem: 'FakeRFEM', model: Optional[str] = None):
+        self._rfem = rfem
+        self._model = model
+
+    def get_model_list(self) -> FakeModelList:
+        self._rfem._call('get_model_list')
+        return FakeModelList(self._rfem.model_names())
+
+    def close_connection(self):
+        self._rfem._call('close_connection')
+
+
+class FakeModel:
+    """
+    A connection to one model of the fake RFEM, with the attributes of RFEM.initModel.Model
+    the generator uses.
+    """
+
+    def __init__(self, rfem: 'FakeRFEM', name: str):
+        self.name = name
+        self.clientModel = SimpleNamespace(service=FakeRFEMService(rfem, name))
+
+
+class FakeRFEM:
+    """
+    The fake RFEM service. Its Client, Model, openFile and PrintoutReport attributes
+    stand in for those of RFEM.initModel and RFEM.Reports.printoutReport. All methods
+    are thread-safe, and every call is counted in self.calls.
+    """
+
+    def __init__(self, options: Optional[FakeRFEMOptions] = None):
+        """
+        Initialize the service.
+
+        Args:
+            options (Optional[FakeRFEMOptions]): The settings, defaults if None.
+        """
+        self.options = options or FakeRFEMOptions()
+        self.calls: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+        self._models = list(self.options.models)
+        self._randoms: Dict[Optional[str], random.Random] = {}
+        self._lock = threading.Lock()
+        self._writers: List[threading.Thread] = []
+        self.PrintoutReport = SimpleNamespace(exportToHTML=self.export_to_html)
+
+    @classmethod
+    def from_environment(cls) -> Optional['FakeRFEM']:
+        """
+        The fake service configured by FSRG_FAKE_RFEM, or None if it is not set.
+
+        The service is created once per process and value, so its counters cover the run.
+        """
+        value = os.environ.get(FAKE_RFEM_ENVIRONMENT, '').strip()
+        if not value or value.lower() in ('0', 'false', 'no'):
+            return None
+        with _instances_lock:
+            if value not in _instances:
+                _instances[value] = cls(_options_from(value))
+            return _instances[value]
+
+    # RFEM.initModel
+
+    def Client(self, url: str = 'http://localhost:8081/wsdl') -> SimpleNamespace:
+        self._call('connect')
+        return SimpleNamespace(service=FakeRFEMService(self))
+
+    def Model(self, new_model: bool = True, model_name: str = 'TestModel', *args, **kwargs) -> FakeModel:
+        name = str(model_name)
+        # A single model is passed on as the str() of the whole model list
+        if name.startswith('[') and name.endswith(']'):
+            name = name.strip("[]'\"").split("', '")[0]
+        with self._lock:
+            if name not in self._models:
+                if not new_model:
+                    raise FakeRFEMError(f"No model named {name} is open in RFEM")
+                self._models.append(name)
+        self._call('model')
+        return FakeModel(self, name)
+
+    def openFile(self, path: str) -> FakeModel:
+        return self.Model(True, os.path.splitext(os.path.basename(path))[0])
+
+    def model_names(self) -> List[str]:
+        with self._lock:
+            return list(self._models)
+
+    # RFEM.Reports.printoutReport
+
+    def export_to_html(self, index: int, path: str, model: Optional[FakeModel] = None):
+        """
+        Export printout report number index of a model to path, like PrintoutReport.exportToHTML.
+
+        The call blocks for the export latency and returns True, while the printout is
+        written in the background over write_seconds.
+
+        Raises:
+            FakeRFEMError: For an injected 'error' failure.
+        """
+        model_name = model.name if model is not None else self.model_names()[0]
+        self._call('export', self.options.export_latency, model_name)
+        failure = self._failure(index, model_name)
+        if failure == 'error':
+            raise FakeRFEMError(f"Injected failure exporting printout {index} of {model_name}")
+        if failure == 'false':
+            return False
+        if failure == 'stall':
+            return True
+        source = self._printout(model_name, index)
+        writer = threading.Thread(target=self._write_printout, args=(source, path), daemon=True,
+                                  name=f"fake-rfem-export-{index}")
+        writer.start()
+        with self._lock:
+            self._writers = [thread for thread in self._writers if thread.is_alive()] + [writer]
+        return True
+
+    def wait_for_exports(self, timeout: Optional[float] = None):
+        """Block until every printout exported so far has been written."""
+        with self._lock:
+            writers = list(self._writers)
+        for writer in writers:
+            writer.join(timeout)
+
+    def prepare_printouts(self, printouts: int, models: Optional[List[str]] = None):
+        """
+        Generate the synthetic printouts ahead of the exports, so their generation time
+        does not count as export latency.
+
+        Args:
+            printouts (int): The number of printouts per model.
+            models (Optional[List[str]]): The models, all open models if None.
+        """
+        if self.options.printout_folder:
+            return
+        for model_name in models or self.model_names():
+            for index in range(1, printouts + 1):
+                _synthetic_printout(self.options, model_name, index)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'calls': dict(self.calls), 'failures': dict(self.failures), 'models': list(self._models)}
+
+    def _random(self, model_name: Optional[str]) -> random.Random:
+        """
+        The random numbers of a model. Seeded by the model name, so every model sees the same
+        latencies and failures in every run, whichever process exports it.
+        """
+        if model_name not in self._randoms:
+            self._randoms[model_name] = random.Random(f"{self.options.seed}:{model_name}")
+        return self._randoms[model_name]
+
+    def _call(self, name: str, latency: float = None, model_name: Optional[str] = None):
+        options = self.options
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+            delay = (options.connect_latency if latency is None else latency)
+            if delay or options.latency_jitter:
+                delay += self._random(model_name).uniform(0, options.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _failure(self, index: int, model_name: str) -> Optional[str]:
+        options = self.options
+        with self._lock:
+            rng = self._random(model_name)
+            if index in options.fail_printouts or rng.random() < options.failure_rate:
+                mode = rng.choice(options.failure_modes or ['error'])
+                self.failures[mode] = self.failures.get(mode, 0) + 1
+                return mode
+        return None
+
+    def _printout(self, model_name: str, index: int) -> str:
+        """The printout served for a model and printout number."""
+        options = self.options
+        if options.printout_folder:
+            canned = sorted((int(match.group(1)), match.group(0)) for match in
+                            (re.fullmatch(r'pr(\d+)\.html', name) for name in os.listdir(options.printout_folder))
+                            if match)
+            if not canned:
+                raise FakeRFEMError(f"No printouts in {options.printout_folder}")
+            return os.path.join(options.printout_folder, canned[(index - 1) % len(canned)][1])
+        return _synthetic_printout(options, model_name, index)
+
+    def _write_printout(self, source: str, path: str):
+        """Copy a printout to the export path the way RFEM writes it: images first, then the HTML in chunks."""
+        source_data = f"{os.path.splitext(source)[0]}_data"
+        target_data = f"{os.path.splitext(path)[0]}_data"
+        with open(source, 'r', encoding='utf-8') as file:
+            html = file.read()
+        # The printout refers to its images through the name of its _data folder
+        html = html.replace(f"{os.path.basename(source_data)}/", f"{os.path.basename(target_data)}/")
+        if os.path.isdir(source_data):
+            shutil.copytree(source_data, target_data, dirs_exist_ok=True)
+        chunks = 4 if self.options.write_seconds > 0 else 1
+        size = len(html) // chunks + 1
+        with open(path, 'w', encoding='utf-8') as file:
+            for start in range(0, len(html), size):
+                file.write(html[start:start + size])
+                file.flush()
+                if self.options.write_seconds > 0:
+                    time.sleep(self.options.write_seconds / chunks)
+
+
+_instances: Dict[str, FakeRFEM] = {}
+_instances_lock = threading.Lock()
+
+
+def _options_from(value: str) -> FakeRFEMOptions:
+    if value.lower() in ('1', 'true', 'yes'):
+        return FakeRFEMOptions()
+    if value.startswith('{'):
+        return FakeRFEMOptions(**json.loads(value))
+    with open(value, 'r', encoding='utf-8') as file:
+        return FakeRFEMOptions(**json.load(file))
+
+
+def _synthetic_printout(options: FakeRFEMOptions, model_name: str, index: int) -> str:
+    """Generate the synthetic printout of a model once, and return its path."""
+    from benchmarks.synthetic_printout import PrintoutSpec, write_printout
+
+    spec = dict(options.printout)
+    if 'image_size' in spec:
+        spec['image_size'] = tuple(spec['image_size'])
+    key = hashlib.sha256(json.dumps([model_name, index, options.seed, options.printout],
+                                    sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    folder = os.path.join(options.cache_folder or os.path.join(tempfile.gettempdir(), 'fsrg_fake_rfem'), key)
+    html_path = os.path.join(folder, 'printout.html')
+    if not os.path.exists(html_path):
+        # Generated next to the cache entry and renamed, so concurrent processes never see half of it
+        temp_folder = f"{folder}.{os.getpid()}.{threading.get_ident()}.tmp"
+        # Every model and printout gets its own values, so their tables differ
+        spec['seed'] = spec.get('seed', 0) + int(key[:8], 16)
+        write_printout(os.path.join(temp_folder, 'printout.html'), PrintoutSpec(**spec))
+        try:
+            os.replace(temp_folder, folder)
+        except OSError:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+    return html_path
+
+
+def options_json(options: FakeRFEMOptions) -> str:
+    """The FSRG_FAKE_RFEM value that selects a fake service with these options."""
+    return json.dumps(asdict(options))
@@ -1,11 +1,20 @@
+import time
+
+_START = time.perf_counter()
+
 from PyQt5.QtWidgets import QApplication, QDialog
 from PyQt5.QtGui import QFont, QIcon
 from PyQt5.QtCore import QDate
 
 from gui.main_window import MainWindow
 from gui.initial_window import InitialWindow
+from gui.warmup import start_warmup
 
+import logging
 import sys
+from multiprocessing import freeze_support
+
+logger = logging.getLogger('fsrg')
 
 def main():
     """
@@ -20,11 +29,19 @@ def main():
     app.setWindowIcon(QIcon('fsrg.ico'))
         
     initial_window = InitialWindow()
+    initial_window.show()
+    app.processEvents()
+    logger.debug("Start window shown %.2f s after startup", time.perf_counter() - _START)
+
+    # The report generator and RFEM are imported lazily; load them while the checklist is open
+    start_warmup()
     if initial_window.exec_() == QDialog.Accepted:
         window = MainWindow()
         window.show()
         app.exec_()
 
 if __name__ == "__main__":
+    # Needed for the image preparation process pool in the PyInstaller executable
+    freeze_support()
     main()
 
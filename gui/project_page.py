@@ -1,7 +1,7 @@
-from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QWidget, QLabel, QLineEdit, QGridLayout, QGroupBox, QHBoxLayout, QFileDialog, QDialog, QRadioButton, QButtonGroup, QApplication, QComboBox
-from PyQt5.QtCore import pyqtSignal
-from gui.rep_gen import RepGen as RG
-from RFEM.initModel import Client, Model, openFile
+from PyQt5.QtWidgets import QPushButton, QVBoxLayout, QWidget, QLabel, QLineEdit, QGridLayout, QGroupBox, QHBoxLayout, QFileDialog, QDialog, QRadioButton, QButtonGroup, QApplication, QComboBox, QMessageBox, QProgressDialog
+from PyQt5.QtCore import pyqtSignal, Qt
+from gui.report_worker import start_report_worker
+from rfem_adapter import init_model
 
 
 class ModelSelectionDialog(QDialog):
@@ -112,6 +112,17 @@ class ProjectPage(QWidget):
         layout.addWidget(self.update_button, layout.rowCount(), 0)
 
     def generate_rfem_report(self):
+        self._start_report(update=False)
+
+    def update_existing_report(self):
+        """
+        Update the report in the FSRG folder, rewriting only the tables and images that changed.
+        """
+        self._start_report(update=True)
+
+    def _start_report(self, update):
+        # Imported here, python-docx and the converter are not needed until the first report
+        from gui.rep_gen import RepGen as RG
         rg = RG(
             self.project_title.text(),
             self.report_title.text(),
@@ -121,11 +132,59 @@ class ProjectPage(QWidget):
             self.printout_reports.currentText(),
             self.model
         )
-        rg.generate_rfem_report_as_html()
+        self.save_button.setEnabled(False)
+        self.update_button.setEnabled(False)
 
-    def update_existing_report(self):
-        # Implement the logic for updating an existing report
-        pass
+        self.report_update = update
+        action = "update" if update else "generation"
+        self.progress_dialog = QProgressDialog(f"Starting report {action}...", "Cancel", 0, 0, self)
+        self.progress_dialog.setWindowTitle("Updating Report" if update else "Generating Report")
+        self.progress_dialog.setWindowModality(Qt.WindowModal)
+        self.progress_dialog.setMinimumDuration(0)
+        self.progress_dialog.setAutoClose(False)
+        self.progress_dialog.setAutoReset(False)
+
+        self.progress_dialog.show()
+        self.report_thread, self.report_worker = start_report_worker(
+            rg, self, update, on_progress=self.show_report_progress, on_finished=self.report_finished,
+            on_cancelled=self.report_cancelled, on_failed=self.report_failed,
+            cancel_signal=self.progress_dialog.canceled)
+
+    def show_report_progress(self, event):
+        printout = f" (printout {event.printout})" if event.printout else ""
+        self.progress_dialog.setLabelText(
+            f"Stage: {event.stage}{printout}\n"
+            f"{event.rows} rows, {event.rows_per_second:.0f} rows/s\n"
+            f"{event.images} images, {event.images_per_second:.1f} images/s\n"
+            f"Elapsed: {event.elapsed:.0f} s"
+        )
+
+    def _report_done(self):
+        self.progress_dialog.canceled.disconnect()
+        self.progress_dialog.close()
+        self.save_button.setEnabled(True)
+        self.update_button.setEnabled(True)
+        self.report_thread = self.report_worker = None
+
+    def report_finished(self, path):
+        self._report_done()
+        msg = QMessageBox()
+        msg.setIcon(QMessageBox.Information)
+        action = "updated" if self.report_update else "generated"
+        msg.setText(f"Report successfully {action}.\nPlease check the folder named FSRG on your Desktop.")
+        msg.setWindowTitle(f"Report {action.capitalize()}!")
+        msg.setStandardButtons(QMessageBox.Ok)
+        msg.exec_()
+
+    def report_cancelled(self):
+        self._report_done()
+        action = "update" if self.report_update else "generation"
+        QMessageBox.information(self, "Report Cancelled", f"Report {action} was cancelled.")
+
+    def report_failed(self, error):
+        self._report_done()
+        action = "update" if self.report_update else "generation"
+        QMessageBox.critical(self, "Report Failed", f"Report {action} failed:\n{error}")
 
     def upload_rfem_model(self):
         # Open a file dialog and let the user select a .rf6 file
@@ -134,20 +193,21 @@ class ProjectPage(QWidget):
         if rfem_fp:
             self.save_button.setEnabled(True)
             self.update_button.setEnabled(True)
-            self.model = openFile(rfem_fp)
+            self.model = init_model().openFile(rfem_fp)
         else:
             return None
 
     def use_active_model(self):
-        client = Client('http://localhost:8081/wsdl')
+        rfem = init_model()
+        client = rfem.Client('http://localhost:8081/wsdl')
         model_list = client.service.get_model_list().name
         if len(model_list) > 1 :
             dialog = ModelSelectionDialog(model_list)
             if dialog.exec_() == QDialog.Accepted:
                 selected_model = dialog.get_selected_model()
-                self.model = Model(False,str(selected_model))
+                self.model = rfem.Model(False,str(selected_model))
         else:
-            self.model = Model(False,str(model_list))
+            self.model = rfem.Model(False,str(model_list))
         self.save_button.setEnabled(True)
         self.update_button.setEnabled(True)
 
@@ -1,16 +1,74 @@
 from file_manager import FileManager as fm
-from RFEM.Reports.printoutReport import PrintoutReport
 from html2word import HTMLToWordConverter
-from replacement import DocumentWordReplacer
-from PyQt5.QtWidgets import QMessageBox
+from template_cache import load_template
+from report_sections import ReportManifest, bookmark_range, sidecar_path
+from table_cache import TableFragmentCache
+from table_builder import TableLayoutOptions
+from image_layout import ImageLayoutOptions
+from image_prep import ImagePrepOptions
+from docx_package import SaveOptions, save_document
+from docx import Document
+from contextlib import contextmanager
+from export_watch import ExportCompletionWatcher
+from report_job import ProgressTracker, ReportCancelled
+from instrumentation import RunProfile, profile_path
 import os
+import queue
+import shutil
+import threading
 import time
 import sys
 import tempfile
 
+# Sentinel put on the export queue once every printout has been exported
+_EXPORTS_DONE = object()
+
+
+def rfem_export(index, path, model=None):
+    """
+    Export a printout report of the RFEM model to HTML.
+
+    RFEM is only imported here, so converting existing printouts does not need it.
+    With FSRG_FAKE_RFEM set, the printout is exported by the fake RFEM service.
+    """
+    from rfem_adapter import printout_report
+    return printout_report().exportToHTML(index, path, model=model)
+
 class RepGen:
 
-    def __init__(self, project_title, report_title, doc_no, project_no, author, printout_reports, model):
+    def __init__(self, project_title, report_title, doc_no, project_no, author, printout_reports, model,
+                 exporter=None, queue_size=2, watch_options=None, progress=None, table_cache=None,
+                 profile=None, table_options=None, image_layout=None, save_options=None, image_options=None):
+        """
+        Initialize the report generator.
+
+        Args:
+            exporter: Callable with the signature of PrintoutReport.exportToHTML(index, path, model=...).
+                      Defaults to the RFEM export; a stub can be passed to run without RFEM.
+            queue_size (int): Number of exported printouts that may wait for conversion
+                              before the export worker pauses.
+            watch_options (ExportWatchOptions): Timeout and timing of the export completion detection.
+            progress (ProgressTracker): Receives stage, row and image progress and carries
+                                        the cancellation flag of the run.
+            table_cache (TableFragmentCache): Converted tables reused across runs. Defaults to
+                                              the shared cache in the temporary directory;
+                                              TableFragmentCache(max_bytes=0) disables it.
+            profile (RunProfile): Collects the timings and counts of each run, written next to
+                                  the report as <report>.profile.json. Defaults to a profile with
+                                  the captures listed in the FSRG_PROFILE environment variable
+                                  (memory, cprofile).
+            table_options (TableLayoutOptions): How large result tables are written in chunks,
+                                                split into continuation tables and shortened to
+                                                a row budget. Defaults to chunked writing, with
+                                                tables of more than 2000 rows split.
+            image_layout (ImageLayoutOptions): Images per landscape page and captions.
+            save_options (SaveOptions): How the report file is compressed. Defaults to the
+                                        deflate level of python-docx, with the media stored
+                                        as they are.
+            image_options (ImagePrepOptions): How the plots are resized and recompressed before
+                                              they are embedded. Defaults to one worker process
+                                              per CPU.
+        """
         self.project_title = project_title
         self.report_title = report_title
         self.doc_no = doc_no
@@ -18,9 +76,39 @@ class RepGen:
         self.author = author
         self.printout_reports = printout_reports
         self.model = model
+        self.exporter = exporter or rfem_export
+        self.queue_size = queue_size
+        self.export_watcher = ExportCompletionWatcher(watch_options)
+        # (printout number, export call seconds, completion wait seconds) per printout
+        self.export_latencies = []
+        self.progress = progress or ProgressTracker()
+        self.table_cache = table_cache or TableFragmentCache()
+        self.profile = profile or RunProfile.from_environment()
+        self.table_options = table_options or TableLayoutOptions()
+        self.image_layout = image_layout or ImageLayoutOptions()
+        self.save_options = save_options or SaveOptions()
+        self.image_options = image_options or ImagePrepOptions()
+        # The fingerprinted sections of the report being built, saved next to it
+        self.sections = []
+        self._template = None
 
-    def generate_rfem_report_as_html(self):
-        folder_path = fm.create_folder_desktop("FSRG")
+    def generate_rfem_report_as_html(self, folder_path=None, word_path=None):
+        """
+        Export all printouts, convert them into one report and stamp the project metadata.
+
+        This runs for a long time and should be called off the GUI thread (see ReportJob).
+        If the run is cancelled through self.progress, the partly written report and
+        the exported printouts are removed and ReportCancelled is raised. The connection to the RFEM model is
+        closed whether the run succeeds, fails or is cancelled.
+
+        Args:
+            folder_path (str): The folder for the printouts and the report, FSRG on the Desktop if None.
+            word_path (str): The report template, the bundled Template.docx if None.
+
+        Returns:
+            str: The path to the finished report.
+        """
+        folder_path = folder_path or fm.create_folder_desktop("FSRG")
         report_count = int(self.printout_reports)  # Set the expected number of reports here
 
         report_paths = [
@@ -28,60 +116,426 @@ class RepGen:
             for i in range(report_count)
         ]
 
-        temp_files = [
-            os.path.join(folder_path, f"report_op{i+1}.docx")
-            for i in range(report_count)
-        ]
+        word_path = word_path or fm.resource_path("Template.docx")
+        self.print_debug_info(word_path)
+
+        report_path = os.path.join(folder_path, "Report_output.docx")
+        try:
+            with self._profiled(report_path):
+                doc = self.build_report(word_path, report_paths)
+                return self.finish_report(doc, folder_path)
+        except ReportCancelled:
+            self.remove_temporaries(report_path, report_paths)
+            raise
+        finally:
+            self.model.clientModel.service.close_connection()
+
+    def generate_report_from_printouts(self, report_paths, folder_path, word_path=None):
+        """
+        Convert already exported printouts into one report, without RFEM.
+
+        Args:
+            report_paths (List[str]): The HTML printouts, in report order.
+            folder_path (str): The folder the report is written to, created if it does not exist.
+            word_path (str): The report template, the bundled Template.docx if None.
+
+        Returns:
+            str: The path to the finished report.
+        """
+        word_path = word_path or fm.resource_path("Template.docx")
+        # Unlike in the RFEM runs, no export has created the folder
+        os.makedirs(folder_path, exist_ok=True)
+        report_path = os.path.join(folder_path, "Report_output.docx")
+        try:
+            with self._profiled(report_path):
+                doc = self.convert_printouts(word_path, report_paths)
+                return self.finish_report(doc, folder_path)
+        except ReportCancelled:
+            self.remove_temporaries(report_path)
+            raise
+
+    @staticmethod
+    def remove_temporaries(report_path, printouts=()):
+        """
+        Delete what an interrupted run leaves behind: the partly written report
+        (see save_report) and the printouts exported for the run.
+
+        Args:
+            report_path (str): Where the report is written.
+            printouts (List[str]): The HTML printouts exported for the run; each is
+                                   removed together with its _data image folder.
+        """
+        fm.delete_file(report_path + '.tmp')
+        for html_path in printouts:
+            fm.delete_file(html_path)
+            shutil.rmtree(f"{os.path.splitext(html_path)[0]}_data", ignore_errors=True)
 
-        word_path = fm.resource_path("Template.docx")
+    def update_rfem_report(self, report_path=None, word_path=None):
+        """
+        Export all printouts again and rewrite only the sections of an existing report
+        whose content has changed.
+
+        The report is regenerated in full if it has no section fingerprints yet, or if
+        the template, the project metadata or the set of tables and images has changed.
+        If the run is cancelled, the existing report is kept as it was.
+
+        Args:
+            report_path (str): The report to update, Report_output.docx in FSRG on the Desktop if None.
+                               The printouts are exported to its folder.
+            word_path (str): The report template, the bundled Template.docx if None.
+
+        Returns:
+            str: The path to the updated report.
+        """
+        report_path = report_path or os.path.join(fm.create_folder_desktop("FSRG"), "Report_output.docx")
+        folder_path = os.path.dirname(report_path)
+        report_paths = [
+            os.path.join(folder_path, f"pr{i+1}.html")
+            for i in range(int(self.printout_reports))
+        ]
+        word_path = word_path or fm.resource_path("Template.docx")
         self.print_debug_info(word_path)
 
-        for i in range(report_count):
-            PrintoutReport.exportToHTML(i+1, report_paths[i], model=self.model)
-            self.wait_for_file_size_stabilization(report_paths[i])
-            if i == 0:
-                report = HTMLToWordConverter(word_path, report_paths[i])
-            else:
-                report = HTMLToWordConverter(temp_files[i-1], report_paths[i])
+        try:
+            with self._profiled(report_path), self._exporting(report_paths) as printouts:
+                return self.update_report(word_path, report_path, printouts)
+        except ReportCancelled:
+            self.remove_temporaries(report_path, report_paths)
+            raise
+        finally:
+            self.model.clientModel.service.close_connection()
+
+    def update_report(self, word_path, report_path, printouts):
+        """
+        Bring an existing report up to date with the given printouts.
+
+        Every table and image section of the printouts is fingerprinted and compared
+        with the fingerprints saved next to the report. Only the sections that differ
+        are converted again and replaced in place, between the hidden bookmarks that
+        enclose them; the rest of the report, including any manual edits outside those
+        sections, is kept as it is.
+
+        The printouts are fingerprinted one at a time and released again; only those with
+        changed sections are parsed a second time to replace them, so at most one parsed
+        printout is held in memory. Whether the report was updated or regenerated is
+        recorded in the run profile.
+
+        Args:
+            word_path (str): The path to the report template.
+            report_path (str): The report to update.
+            printouts (Iterable[str]): The printout paths, in order.
+
+        Returns:
+            str: The path to the updated report.
+        """
+        previous = ReportManifest.load(sidecar_path(report_path)) if os.path.exists(report_path) else None
+        if previous is None:
+            self.profile.set('update', 'regenerated: no section fingerprints')
+            return self.save_report(self.convert_printouts(word_path, printouts), report_path)
+
+        self.progress.stage('parse')
+        with self.profile.timer('open report'):
+            doc = Document(report_path)
+        with self.profile.timer('template'):
+            self._template = load_template(word_path)
+        current = ReportManifest(self._template.digest, self.metadata())
+        previous_sections = {section.key: section for section in previous.sections}
+        # Only the changed sections are kept, by key; their printouts are parsed again to replace them
+        exported, changed = [], []
+        for printout, html_path in enumerate(printouts, 1):
+            exported.append(html_path)
+            self.progress.stage('parse', printout)
+            with self.profile.timer('fingerprint'):
+                # The parsed printout is released once its sections are fingerprinted
+                sections = [section for section, _ in self._section_converter(doc, html_path, printout)
+                            .section_sources()]
+            self.profile.count('printouts')
+            pending = {}
+            for section in sections:
+                current.sections.append(section)
+                previous_section = previous_sections.get(section.key)
+                if previous_section:
+                    section.width = previous_section.width
+                if not previous_section or previous_section.digest != section.digest:
+                    pending[section.key] = section
+            if pending:
+                changed.append((printout, html_path, pending))
+
+        changed_sections = [section for _, _, pending in changed for section in pending.values()]
+        self.profile.set('sections', len(current.sections))
+        self.profile.set('sections changed', len(changed_sections))
+        if not current.same_layout(previous) or any(bookmark_range(doc, section.bookmark) is None
+                                                    for section in changed_sections):
+            self.profile.set('update', 'regenerated: layout changed')
+            return self.save_report(self.convert_printouts(word_path, exported), report_path)
+
+        self.profile.set('update', 'sections replaced')
+        if not changed_sections:
+            current.save(sidecar_path(report_path))
+            return report_path
+        for printout, html_path, pending in changed:
+            self.progress.stage('parse', printout)
+            with self.profile.timer('fingerprint'):
+                report = self._section_converter(doc, html_path, printout)
+                # The sections of the first pass carry the widths of the tables they replace
+                sources = [(pending[section.key], source) for section, source in report.section_sources()
+                           if section.key in pending]
+            self.progress.stage('tables', printout)
+            with self.profile.timer('tables'):
+                for section, source in sources:
+                    if section.kind == 'table':
+                        report.replace_section(section, source)
+            images = [(section, source) for section, source in sources if section.kind == 'image']
+            if images:
+                self.progress.stage('images', printout)
+                report.prepare_images(self.image_options, filenames=[source.filename for _, source in images])
+                try:
+                    with self.profile.timer('images'):
+                        for section, source in images:
+                            report.replace_section(section, source)
+                finally:
+                    report.remove_prepared_images()
+        self.sections = current.sections
+        return self.save_report(doc, report_path)
+
+    def _section_converter(self, doc, html_path, printout):
+        """A converter of one printout into the report, ready for section_sources."""
+        report = HTMLToWordConverter(doc, html_path, progress=self.progress, printout=printout,
+                                     profile=self.profile, table_options=self.table_options,
+                                     image_layout=self.image_layout)
+        report.extract_image_files()
+        report.extract_captions()
+        return report
+
+    def build_report(self, word_path, report_paths):
+        """
+        Export and convert all printouts into one report Document.
+
+        RFEM exports run ahead on a worker thread while the printouts already
+        exported are converted on the calling thread, with a bounded queue in
+        between. The report is kept open in memory and not written to disk.
+
+        Args:
+            word_path (str): The path to the report template.
+            report_paths (List[str]): The paths the printouts are exported to, in order.
+
+        Returns:
+            Document: The assembled report.
+        """
+        with self._exporting(report_paths) as printouts:
+            return self.convert_printouts(word_path, printouts)
+
+    def convert_printouts(self, word_path, printouts):
+        """
+        Start a new report from the template and convert the printouts into it.
+
+        Args:
+            word_path (str): The path to the report template.
+            printouts (Iterable[str]): The printout paths, in order.
+
+        Returns:
+            Document: The assembled report.
+        """
+        doc = self.new_report(word_path)
+        for printout, html_path in enumerate(printouts, 1):
+            doc = self.convert_printout(doc, html_path, printout)
+        print(self.table_cache.summary())
+        return doc
+
+    @contextmanager
+    def _profiled(self, report_path):
+        """
+        Profile a run, and write the run profile next to the report once it has succeeded.
+
+        Args:
+            report_path (str): The report the run writes.
+        """
+        self.profile.start()
+        try:
+            yield
+        finally:
+            self.profile.stop()
+        self.profile.set('export latencies', [
+            {'printout': printout, 'export_seconds': export, 'wait_seconds': wait}
+            for printout, export, wait in self.export_latencies])
+        try:
+            self.profile.write(profile_path(report_path))
+        except OSError as e:
+            print(f"Could not write the run profile: {e}")
+        print(self.profile.summary())
+
+    @contextmanager
+    def _exporting(self, report_paths):
+        """
+        Export the printouts on a worker thread while the caller consumes them.
+
+        Yields:
+            Iterator[str]: Each printout path once it has been exported. An export
+            error is raised from the iterator.
+        """
+        exported = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._export_printouts, args=(report_paths, exported, stop),
+                                  name="rfem-export", daemon=True)
+        worker.start()
+
+        def printouts():
+            while True:
+                item = exported.get()
+                if item is _EXPORTS_DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+
+        try:
+            yield printouts()
+        finally:
+            stop.set()
+            worker.join()
+
+    def _export_printouts(self, report_paths, exported, stop):
+        """
+        Export the printouts one after another and hand each one to the converter.
+
+        Runs on the export worker thread. An export error is passed on through the
+        queue so that it is raised on the converting thread.
+
+        Args:
+            report_paths (List[str]): The paths the printouts are exported to, in order.
+            exported (queue.Queue): Receives each exported path, then _EXPORTS_DONE or the error.
+            stop (threading.Event): Set by the converting thread to stop exporting. Like the
+                                    cancellation of the run, it also ends the wait for an
+                                    export that is still being written.
+        """
+        def put(item):
+            while not stop.is_set():
+                try:
+                    exported.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        try:
+            for i, report_path in enumerate(report_paths):
+                if stop.is_set():
+                    return
+                self.progress.stage('export', i+1)
+                start = time.perf_counter()
+                with self.profile.timer('export'):
+                    result = self.exporter(i+1, report_path, model=self.model)
+                export_time = time.perf_counter() - start
+                with self.profile.timer('export wait'):
+                    wait_time = self.export_watcher.wait(report_path, result,
+                                                         stop=(stop, self.progress.cancel_event))
+                self.export_latencies.append((i+1, export_time, wait_time))
+                print(f"Printout {i+1} exported in {export_time:.2f} s, complete after a further {wait_time:.2f} s")
+                if not put(report_path):
+                    return
+            put(_EXPORTS_DONE)
+        except Exception as e:
+            put(e)
+
+    def metadata(self):
+        """
+        The value of every metadata placeholder of the report template.
+
+        Returns:
+            Dict[str, str]: The replacement of each placeholder.
+        """
+        return {
+            'Projekttitel': self.project_title,
+            'Berichttitel': self.report_title,
+            'XXXX-BHE-XX-XX-XX-X-XXXX': self.doc_no,
+            'Projektnummer': self.project_no,
+            '[Author]': self.author,
+        }
+
+    def new_report(self, word_path):
+        """
+        Start a report from the compiled template with the project metadata stamped in.
+
+        The template is compiled once and cached by its hash, so this is an in-memory
+        copy with the metadata substituted at the known placeholder locations.
+
+        Args:
+            word_path (str): The path to the report template.
+
+        Returns:
+            Document: The new report, with the trailing template section removed.
+        """
+        self.progress.stage('replace')
+        with self.profile.timer('template'):
+            self._template = load_template(word_path)
+            self.sections = []
+            return self._template.new_document(self.metadata())
+
+    def convert_printout(self, doc, html_path, printout=None):
+        """
+        Append the tables and images of one printout to the report.
+
+        Args:
+            doc: The open report Document.
+            html_path (str): The path to the exported HTML printout.
+            printout (int): The printout number, for progress reporting.
+
+        Returns:
+            Document: The report Document with the printout appended.
+        """
+        with self.profile.timer('printout'):
+            self.progress.stage('parse', printout)
+            report = HTMLToWordConverter(doc, html_path, progress=self.progress, printout=printout or 1,
+                                         table_cache=self.table_cache, profile=self.profile,
+                                         table_options=self.table_options, image_layout=self.image_layout)
             report._delete_last_page_in_template()
+            self.progress.stage('tables', printout)
             report.process_html_file()
+            self.progress.stage('images', printout)
             report.extract_image_files()
+            report.prepare_images(self.image_options)
             report.extract_captions()
             report.add_images_to_word_document()
-            report.save(temp_files[i])
-
-            if i > 0:
-                os.remove(temp_files[i-1])
-
-        replacer = DocumentWordReplacer(temp_files[-1])
-        replacer.add_replacement('Projekttitel', self.project_title)
-        replacer.add_replacement('Berichttitel', self.report_title)
-        replacer.add_replacement('XXXX-BHE-XX-XX-XX-X-XXXX', self.doc_no)
-        replacer.add_replacement('Projektnummer', self.project_no)
-        replacer.add_replacement('[Author]', self.author)
-        modified_file_path = replacer.replace_words(folder_path)
-        os.remove(temp_files[-1])
-
-        msg = QMessageBox()
-        msg.setIcon(QMessageBox.Information)
-        msg.setText("Report successfully generated.\nPlease check the folder named FSRG on your Desktop.")
-        msg.setWindowTitle("Report Generated!")
-        msg.setStandardButtons(QMessageBox.Ok)
-        msg.exec_()
-        self.model.clientModel.service.close_connection()
-        return modified_file_path
-
-    def wait_for_file_size_stabilization(self, file_path):
-        previous_size = -1
-        while True:
-            if os.path.exists(file_path):
-                current_size = os.path.getsize(file_path)
-                if current_size > 0 and current_size == previous_size:
-                    break
-                previous_size = current_size
-            else:
-                print(f"File not found: {file_path}")
-            time.sleep(1)
+        self.profile.count('printouts')
+        self.sections.extend(report.sections)
+        return report.doc
+
+    def finish_report(self, doc, folder_path):
+        """
+        Write the assembled report once.
+
+        Args:
+            doc: The assembled report Document.
+            folder_path (str): The folder the report is written to.
+
+        Returns:
+            str: The path to the finished report.
+        """
+        return self.save_report(doc, os.path.join(folder_path, "Report_output.docx"))
+
+    def save_report(self, doc, report_path):
+        """
+        Write the report, and the fingerprints of its sections next to it for later updates.
+
+        The report is written to a temporary file first, so an existing report is only
+        replaced once the new one is complete.
+
+        Args:
+            doc: The report Document.
+            report_path (str): Where the report is written.
+
+        Returns:
+            str: The path to the report.
+        """
+        self.progress.stage('save')
+        temp_path = report_path + '.tmp'
+        with self.profile.timer('save'):
+            save_document(doc, temp_path, self.save_options)
+            os.replace(temp_path, report_path)
+        self.profile.count('bytes written', os.path.getsize(report_path))
+        template_digest = self._template.digest if self._template else None
+        ReportManifest(template_digest, self.metadata(), self.sections).save(sidecar_path(report_path))
+        return report_path
 
     def print_debug_info(self, word_path):
         print("-------- Debug Information --------")
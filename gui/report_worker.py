@@ -0,0 +1,94 @@
+from PyQt5.QtCore import QObject, QThread, pyqtSignal
+
+from report_job import ReportJob, ProgressEvent
+
+
+class ReportWorker(QObject):
+    """
+    Runs a ReportJob inside a QThread and forwards its progress as Qt signals.
+
+    Signals are delivered to slots on the GUI thread through queued connections,
+    so the window stays responsive while the report is generated.
+    """
+    progress = pyqtSignal(object)  # ProgressEvent
+    finished = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    failed = pyqtSignal(str)
+
+    def __init__(self, rep_gen, update=False):
+        """
+        Initialize the worker.
+
+        Args:
+            rep_gen (RepGen): The configured report generator.
+            update (bool): If True, the existing report is updated instead of generated anew.
+        """
+        super().__init__()
+        self.job = ReportJob(rep_gen, on_progress=self._on_progress, update=update)
+
+    def _on_progress(self, event: ProgressEvent):
+        self.progress.emit(event)
+
+    def run(self):
+        try:
+            path = self.job.run()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if path is None:
+            self.cancelled.emit()
+        else:
+            self.finished.emit(path)
+
+    def cancel(self):
+        """
+        Request cancellation; the job stops at its next progress report.
+
+        Call it directly, it is thread-safe. Connected to a signal of the GUI thread it
+        would be queued to the worker's thread, whose event loop is blocked until the
+        job has finished.
+        """
+        self.job.cancel()
+
+
+def start_report_worker(rep_gen, parent=None, update=False, on_progress=None, on_finished=None,
+                        on_cancelled=None, on_failed=None, cancel_signal=None):
+    """
+    Create a ReportWorker on its own QThread, connect its signals and start it.
+
+    The slots are connected before the thread starts, so that a run failing right
+    away, e.g. on a missing template, still reaches them. The thread quits and both
+    objects are deleted once the worker has finished, been cancelled or failed.
+    Keep a reference to the returned objects until then.
+
+    Args:
+        rep_gen (RepGen): The configured report generator.
+        parent (QObject): Parent of the thread.
+        update (bool): If True, the existing report is updated instead of generated anew.
+        on_progress: Slot receiving each ProgressEvent.
+        on_finished: Slot receiving the path to the finished report.
+        on_cancelled: Slot called once the run has been cancelled.
+        on_failed: Slot receiving the error message of a failed run.
+        cancel_signal: Signal, e.g. QProgressDialog.canceled, that cancels the run. It is
+                       connected to the thread-safe cancel of the job, which runs at once
+                       on the thread that emits it.
+
+    Returns:
+        Tuple[QThread, ReportWorker]: The running thread and its worker.
+    """
+    thread = QThread(parent)
+    worker = ReportWorker(rep_gen, update)
+    worker.moveToThread(thread)
+    thread.started.connect(worker.run)
+    for signal, slot in ((worker.progress, on_progress), (worker.finished, on_finished),
+                         (worker.cancelled, on_cancelled), (worker.failed, on_failed)):
+        if slot is not None:
+            signal.connect(slot)
+    if cancel_signal is not None:
+        cancel_signal.connect(worker.job.cancel)
+    for signal in (worker.finished, worker.cancelled, worker.failed):
+        signal.connect(thread.quit)
+    thread.finished.connect(worker.deleteLater)
+    thread.finished.connect(thread.deleteLater)
+    thread.start()
+    return thread, worker
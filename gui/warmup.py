@@ -0,0 +1,53 @@
+from typing import Dict
+import threading
+import time
+
+# Seconds each group of modules took to import in the background, once done
+import_seconds: Dict[str, float] = {}
+warmed_up = threading.Event()
+
+
+def _import_report_generator():
+    # python-docx, lxml, BeautifulSoup and Pillow, through the converter
+    import gui.rep_gen  # noqa: F401
+
+
+def _import_rfem():
+    from rfem_adapter import init_model
+    init_model()
+
+
+# In the order they are needed: a report needs the generator, RFEM is already needed to open a model
+_WARMUP_IMPORTS = (('report generator', _import_report_generator), ('RFEM', _import_rfem))
+
+
+def _warm_up():
+    try:
+        for name, load in _WARMUP_IMPORTS:
+            start = time.perf_counter()
+            try:
+                load()
+            except Exception as e:
+                # Imported again when needed, where the error is shown to the user
+                print(f"Could not preload the {name} modules: {e}")
+                continue
+            import_seconds[name] = time.perf_counter() - start
+    finally:
+        warmed_up.set()
+
+
+def start_warmup() -> threading.Thread:
+    """
+    Import the heavy modules of the report generator on a background thread.
+
+    The window only imports them when a model is opened or a report is started; this
+    loads them ahead while the user works through the start checklist, so that they
+    are usually ready by then. An import started later on the GUI thread waits for the
+    background import of the same module instead of repeating it.
+
+    Returns:
+        threading.Thread: The started daemon thread.
+    """
+    thread = threading.Thread(target=_warm_up, name="import-warmup", daemon=True)
+    thread.start()
+    return thread
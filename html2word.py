@@ -1,17 +1,33 @@
-from dataclasses import dataclass
-from typing import List, Optional
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from docx import Document
-from docx.shared import Inches
-from docx.oxml import OxmlElement
-from docx.oxml.ns import qn
+from docx.document import Document as DocxDocument
+from docx.shared import Length
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, qn
+from lxml import etree
 from bs4 import BeautifulSoup
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.section import WD_ORIENTATION
+import copy
 import os
-import re
-from PIL import Image
-import io
+import shutil
+import tempfile
 from info import TableInfo, ImageInfo
+from html_index import HTMLDocumentIndex, TableQuery
+from html_table import (NormalizedTable, cells_from_lxml, cells_from_soup, header_rows_from_lxml,
+                        header_rows_from_soup, normalize_table, rows_from_lxml, stream_normalized_table)
+from html_stream import StreamingPrintoutReader, StreamedTable
+from table_builder import TableLayoutOptions, TableWriteResult, write_table
+from docx_package import SaveOptions, save_document
+from body_spill import BodySpill
+from table_cache import CachedTable, TableFragmentCache, TableSourceLocator
+from shading import set_cell_fill
+from image_prep import ImagePrepOptions, ImagePrepReport, prepare_images
+from image_layout import ImageLayout, ImageLayoutOptions
+from report_job import ProgressTracker
+from instrumentation import RunProfile
+from template_cache import remove_trailing_section
+from report_sections import (ReportSection, TableDigest, image_digest, next_bookmark_id, add_bookmark_start,
+                             add_bookmark_end, bookmark_range, replace_range, drop_unused_relationships)
 
 class HTMLToWordConverter:
     """
@@ -21,118 +37,231 @@ class HTMLToWordConverter:
     convert them to Word tables, and save them in a Word document.
     """
 
-    def __init__(self, doc_path: str, html_path: str):
+    def __init__(self, doc_path: Union[str, DocxDocument], html_path: str, streaming: bool = False,
+                 progress: Optional[ProgressTracker] = None, printout: int = 1,
+                 table_cache: Optional[TableFragmentCache] = None, profile: Optional[RunProfile] = None,
+                 table_options: Optional[TableLayoutOptions] = None,
+                 image_layout: Optional[ImageLayoutOptions] = None):
         """
         Initialize the converter with an existing Word document.
         
         Args:
-            doc_path (str): The path to the existing Word document.
+            doc_path (Union[str, DocxDocument]): The path to the existing Word document, or an already
+                                                 open Document to keep appending printouts to.
+            html_path (str): The path to the HTML printout.
+            streaming (bool): If True, the printout is never loaded as a whole. Tables and
+                              images are read one at a time, and every table is spilled
+                              from the report to a temporary file once written (see
+                              body_spill.BodySpill), so that memory is bounded by the
+                              largest table rather than by the size of the printout. The
+                              report must then be written with save (or
+                              docx_package.save_document), which puts the tables back in.
+            progress (Optional[ProgressTracker]): Receives the number of rows and images written
+                                                  and carries the cancellation flag of the run.
+            printout (int): The number of the printout in the report, used to name its sections.
+            table_cache (Optional[TableFragmentCache]): Converted tables from earlier runs. Tables
+                                                        found there are inserted without being
+                                                        converted again. Not used in streaming mode.
+            profile (Optional[RunProfile]): Receives the stage timings and the counts of tables,
+                                            rows, cells and images written.
+            table_options (Optional[TableLayoutOptions]): How large tables are written in chunks,
+                                                          split and shortened, defaults if None.
+            image_layout (Optional[ImageLayoutOptions]): How many images are placed per page
+                                                         and whether they are captioned,
+                                                         defaults if None.
         """
-        self.doc = Document(doc_path)
+        self.doc = doc_path if isinstance(doc_path, DocxDocument) else Document(doc_path)
         self.html_path = html_path
         self.data_folder = f"{os.path.splitext(html_path)[0]}_data"
         self.image_files: List[str] = []
         self.images: List[ImageInfo] = []
-        with open(html_path, 'r', encoding='utf-8') as file:
-            self.soup = BeautifulSoup(file, 'html.parser')
+        self.image_paths: Dict[str, str] = {}
+        self._prepared_folder: Optional[str] = None
+        self.streaming = streaming
+        self.progress = progress or ProgressTracker()
+        self.profile = profile or RunProfile()
+        self._table_style: Optional[str] = None
+        self.table_options = table_options or TableLayoutOptions()
+        self.image_layout = ImageLayout(self.doc, image_layout)
+        self.soup = None
+        self.index = None
+        self._streamed_images: Optional[List[ImageInfo]] = None
+        self.printout = printout
+        # Every table and image written is enclosed in a hidden bookmark and fingerprinted,
+        # so that an existing report can later be updated section by section
+        self.sections: List[ReportSection] = []
+        self._section_counts = {'table': 0, 'image': 0}
+        self._bookmark_id: Optional[int] = None
+        self.table_cache = table_cache
+        self._table_sources: Optional[TableSourceLocator] = None
+        if not streaming:
+            with self.profile.timer('parse'):
+                with open(html_path, 'r', encoding='utf-8') as file:
+                    html_text = file.read()
+                self.soup = BeautifulSoup(html_text, 'html.parser')
+                self.index = HTMLDocumentIndex.build(self.soup)
+                if table_cache is not None:
+                    self._table_sources = TableSourceLocator(html_text)
+            self.profile.count('html bytes', os.path.getsize(html_path))
 
     def extract_image_files(self) -> None:
+        if not os.path.isdir(self.data_folder):
+            self.image_files = []
+            return
         self.image_files = [f for f in os.listdir(self.data_folder) if f.endswith('.png')]
 
+    def prepare_images(self, options: Optional[ImagePrepOptions] = None,
+                       filenames: Optional[List[str]] = None) -> ImagePrepReport:
+        """
+        Downsample and re-encode the printout images before they are embedded.
+
+        The prepared copies are written to a temporary folder, used by
+        add_images_to_word_document and removed once the images have been added.
+
+        Args:
+            options (Optional[ImagePrepOptions]): The preparation settings, defaults if None.
+            filenames (Optional[List[str]]): The images to prepare, all image files if None.
+
+        Returns:
+            ImagePrepReport: The size and time saved per image.
+        """
+        self._prepared_folder = tempfile.mkdtemp(prefix='fsrg_images_')
+        sources = [os.path.join(self.data_folder, f) for f in (self.image_files if filenames is None else filenames)]
+        with self.profile.timer('prepare images'):
+            report = prepare_images(sources, self._prepared_folder, options)
+        self.profile.count('image bytes exported', report.original_bytes)
+        self.image_paths = report.paths()
+        print(report.summary())
+        return report
+
     def extract_all_tables(self):
         """
         Extract all tables from the HTML file and add them to the Word document.
         """
-        tables = self.soup.find_all('table')
-        for i, table in enumerate(tables):
-            # Find the nearest preceding heading
-            heading = table.find_previous(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-
-            title = re.sub(r'^\d+(\.\d+)*\s*', '', heading.get_text(strip=True))
-            
-            # Create a new BeautifulSoup object with just this table
-            table_html = str(table)
-            self.create_word_table_from_html(table_html, title)
-            
+        for indexed_table in self.index.tables:
+            table = indexed_table.element
+            self._create_word_table(table, indexed_table.title, self._table_source(table))
+
             # Add some space after each table
             self.doc.add_paragraph()
 
     def extract_captions(self) -> None:
-        with open(self.html_path, 'r', encoding='utf-8') as file:
-            soup = BeautifulSoup(file, 'html.parser')
-            img_tags = soup.find_all('img')
-            for img in img_tags:
-                src = img.get('src')
-                if src:
-                    file_name = os.path.basename(src)
-                    h2 = img.find_previous('h2')
-                    if h2:
-                        # Remove the leading numbers and dots
-                        caption = re.sub(r'^[\d.]+ ', '', h2.text.strip())
-                        # Remove "Statische Analyse" from the end of the caption
-                        caption = re.sub(r'\s*Statische Analyse\s*$', '', caption)
-                        self.images.append(ImageInfo(file_name, caption))
+        if self.streaming:
+            if self._streamed_images is None:
+                self._stream_html_file(tables=False)
+            self.images.extend(self._streamed_images)
+            return
+        for image in self.index.images:
+            if image.caption is not None:
+                self.images.append(ImageInfo(image.filename, image.caption))
+
+    def _stream_html_file(self, tables: bool = True, table_info_list: Optional[List[TableInfo]] = None):
+        """
+        Read the printout incrementally, writing each table as soon as it has been parsed
+        and spilling it from the report once written.
+
+        Image captions are collected on the way so that the printout only has to be read once.
+        With a table_info_list, each entry is matched against the tables in document order
+        and its first match is written, or every match of a wildcard or regex entry. A table
+        is written once, for the first entry it matches.
+
+        Args:
+            tables (bool): If False, only the image captions are collected.
+            table_info_list (Optional[List[TableInfo]]): The tables to extract, or None for all tables.
+        """
+        self._streamed_images = []
+        spill = BodySpill.of(self.doc, create=True) if tables else None
+        pending = [TableQuery.compile(table_info) for table_info in table_info_list] if table_info_list else None
+        unmatched = list(pending or ())
+        for section in StreamingPrintoutReader(self.html_path):
+            if not isinstance(section, StreamedTable):
+                if section.caption is not None:
+                    self._streamed_images.append(ImageInfo(section.filename, section.caption))
+            elif not tables:
+                continue
+            elif pending is None:
+                elements = self._add_table(self._lxml_table(section.element), section.title)
+                spill.spill(elements + [self.doc.add_paragraph()._p])
+            else:
+                for query in pending:
+                    if query.matches(section.h1, section.h2):
+                        if not query.all_matches:
+                            pending.remove(query)
+                        if query in unmatched:
+                            unmatched.remove(query)
+                        spill.spill(self._add_table(self._lxml_table(section.element), query.title(section.title)))
+                        break
+        for query in unmatched:
+            print(f"No table found for heading: {query.info.heading_text}")
 
     def add_images_to_word_document(self) -> None:
         """
-        Add images and captions to an existing Word document.
+        Add images and captions to an existing Word document, all in one landscape section.
         """   
-        for image in self.images:
-            if image.filename in self.image_files:
-                # Add page break before new content
-                self.doc.add_page_break()
-                new_section = self.doc.add_section()
-
-                # Set properties for the new section
-                new_section.orientation = WD_ORIENTATION.LANDSCAPE
-                new_section.page_width = Inches(11)  # Standard letter size
-                new_section.page_height = Inches(8.5)
-                new_section.left_margin = Inches(1)
-                new_section.right_margin = Inches(1)
-                
-                img_path = os.path.join(self.data_folder, image.filename)
-                
-                # Add rotated image
-                
-                self.doc.add_picture(img_path, width=Inches(9))
-                last_paragraph = self.doc.paragraphs[-1] 
-                last_paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
-                # Add caption
-                p = self.doc.add_paragraph()
-                p.alignment = 1  # Center alignment
-                p.add_run(image.caption).italic = True
-
-        # Add final portrait section
-        final_section = self.doc.add_section()
-        final_section.orientation = WD_ORIENTATION.PORTRAIT
-        final_section.page_width = Inches(8.5)  # Standard letter size
-        final_section.page_height = Inches(11)
-        final_section.left_margin = Inches(1)
-        final_section.right_margin = Inches(1)
+        try:
+            with self.profile.timer('images'):
+                images = self._placed_images()
+                if images:
+                    self.image_layout.begin()
+                for position, image in enumerate(images):
+                    self._add_image(image, position)
+                    self.progress.add_images()
+                # Return to portrait for whatever follows
+                self.image_layout.end()
+        finally:
+            self.remove_prepared_images()
+
+    def _placed_images(self) -> List[ImageInfo]:
+        """The captioned images whose file was exported, in the order they are added to the report."""
+        return [image for image in self.images if image.filename in self.image_files]
+
+    def _add_image(self, image: ImageInfo, position: int, key: Optional[str] = None) -> list:
+        """
+        Add an image and its caption at the end of the document as one report section.
+
+        Args:
+            image (ImageInfo): The image and its caption.
+            position (int): The position of the image among those of the printout, from 0.
+            key (Optional[str]): The section key, the next image key of the printout if None.
+
+        Returns:
+            list: The body elements written.
+        """
+        source_path = os.path.join(self.data_folder, image.filename)
+        img_path = self.image_paths.get(image.filename) or source_path
+        self.profile.count('images')
+        self.profile.count('image bytes', os.path.getsize(img_path))
+
+        digest = image_digest(source_path, image.caption, self.image_layout.options.layout())
+        return self._add_section('image', image.caption, digest,
+                                 lambda: self.image_layout.place(img_path, image.caption, position), key)
+
+    def remove_prepared_images(self):
+        """Delete the images written by prepare_images."""
+        if self._prepared_folder:
+            shutil.rmtree(self._prepared_folder, ignore_errors=True)
+            self._prepared_folder = None
 
     @staticmethod
-    def extract_table_after_heading(soup: BeautifulSoup, main_title: str, heading_text: str) -> str:
-        # Find the exact match for the main title (h1)
-        main_heading = soup.find('h1', string=lambda text: text and main_title in text)
-        if main_heading:
-            # Find the next h2 that contains the heading_text
-            heading = main_heading.find_next('h2', string=lambda text: text and heading_text in text)
-            if heading:
-                # Check if the next h2 is a subheading
-                next_h2 = heading.find_next('h2')
-                if next_h2:
-                    # Extract all content between the current h2 and the next h2
-                    content = []
-                    for sibling in heading.next_siblings:
-                        if sibling == next_h2:
-                            break
-                        content.append(str(sibling))
-                    content_str = ''.join(content)
-                    # Find the first table in this content
-                    soup_content = BeautifulSoup(content_str, 'html.parser')
-                    target_table = soup_content.find('table')
-                    if target_table:
-                        return str(target_table)
+    def extract_table_after_heading(soup: BeautifulSoup, main_title: str, heading_text: str) -> Optional[str]:
+        """
+        Return the HTML of the first table below the h2 containing heading_text
+        that follows the h1 containing main_title.
+
+        The soup is indexed for the call (see HTMLDocumentIndex.find_table); to look up
+        several tables of a printout, index it once and use find_table instead.
+
+        Args:
+            soup (BeautifulSoup): The parsed HTML printout.
+            main_title (str): Text contained in the main (h1) heading.
+            heading_text (str): Text contained in the h2 heading below the main heading.
+
+        Returns:
+            Optional[str]: The table HTML, or None if no table was found.
+        """
+        indexed_table = HTMLDocumentIndex.build(soup).find_table(main_title, heading_text)
+        if indexed_table:
+            return str(indexed_table.element)
         return None
 
     @staticmethod
@@ -145,10 +274,7 @@ class HTMLToWordConverter:
             color_hex (str): The hex color code to apply as background.
         """
         if color_hex:
-            cell_xml = cell._element
-            shading = OxmlElement('w:shd')
-            shading.set(qn('w:fill'), color_hex)
-            cell_xml.get_or_add_tcPr().append(shading)
+            set_cell_fill(cell._element, color_hex)
 
     def create_word_table_from_html(self, html_content: str, title: str):
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -156,140 +282,252 @@ class HTMLToWordConverter:
         if not table:
             print(f"No table found for title: {title}")
             return
-        self.doc.add_heading(title, level=1)
-        headers = table.find_all('tr')[0].find_all(['th', 'td'])
-        max_columns = sum(int(th.get('colspan', 1)) for th in headers)
-        rows = table.find_all('tr')
-        num_rows = len(rows)
-        word_table = self.doc.add_table(rows=num_rows, cols=max_columns)
-        word_table.style = 'Table Grid'
-        self._fill_table_content(word_table, rows, max_columns)
-        self._remove_empty_columns(word_table)
-        self._remove_empty_rows(word_table)
-        self._apply_row_colors(word_table)
-
-    def _fill_table_content(self, word_table, rows, max_columns):
-        """
-        Fill the Word table with content from the HTML table.
-        
-        Args:
-            word_table: The Word table to fill.
-            rows: The rows from the HTML table.
-            max_columns (int): The maximum number of columns in the table.
-        """
-        for row_idx, row in enumerate(rows):
-            cells = row.find_all(['th', 'td'])
-            col_idx = 0
-            while cells and col_idx < max_columns:
-                cell = cells.pop(0)
-                colspan = int(cell.get('colspan', 1))
-                cell_text = cell.get_text(strip=True)
-                cell_style = cell.get('style', '')
-                cell_color = None
-                if 'background-color:' in cell_style:
-                    color_hex = cell_style.split('background-color:')[1].split(';')[0].strip()
-                    if color_hex.startswith('#'):
-                        cell_color = color_hex[1:]
-                self._fill_cell_content(word_table, row_idx, col_idx, cell_text, cell_color)
-                col_idx += colspan
-
-    def _fill_cell_content(self, word_table, row: int, col: int, content: str, color_hex: str):
-        """
-        Fill the content and background color of a cell in the Word table.
-        
-        Args:
-            word_table: The Word table containing the cell.
-            row (int): The row index of the cell.
-            col (int): The column index of the cell.
-            content (str): The text content to fill in the cell.
-            color_hex (str): The hex color code for the cell background.
-        """
-        word_cell = word_table.cell(row, col)
-        word_cell.text = content
-        if color_hex:
-            self.apply_cell_formatting(word_cell, color_hex)
+        self._create_word_table(table, title, html_content)
 
-    def _remove_empty_columns(self, word_table):
+    def _table_source(self, table) -> Optional[str]:
+        """The HTML source of a table of the printout, if tables are cached."""
+        return self._table_sources.source(table) if self._table_sources else None
+
+    def _create_word_table(self, table, title: str, source: Optional[str] = None):
         """
-        Remove empty columns from the Word table.
-        
+        Add a heading and a Word table built from a parsed HTML table.
+
+        With a table cache and the source of the table, a table converted before with the
+        same settings is inserted from the cache, and a new one is stored there.
+
         Args:
-            word_table: The Word table to process.
+            table: The parsed <table> element.
+            title (str): The heading placed above the table.
+            source (Optional[str]): The HTML source of the table, the cache key.
         """
-        columns_to_remove = [i for i in range(len(word_table.columns)) if self._is_column_empty(word_table, i)]
-        for col_idx in reversed(columns_to_remove):
-            for row in word_table.rows:
-                cell = row.cells[col_idx]
-                cell._element.getparent().remove(cell._element)
+        if self.table_cache is None or source is None:
+            self._add_table(self._soup_table(table), title)
+            return
+        width = int(self.doc._block_width)
+        key = self.table_cache.key(source, title, self._table_style_id(), width, self.table_options)
+        cached = self.table_cache.get(key)
+        self.profile.count('table cache hits' if cached is not None else 'table cache misses')
+        if cached is not None:
+            self._add_section('table', title, cached.digest, lambda: self._insert_cached_table(title, cached),
+                              None, width)
+            return
+        normalized = self._soup_table(table)
+        elements = self._add_table(normalized, title, width=width)
+        # Everything between the bookmark start, the heading and the bookmark end
+        content = elements[2:-1] if normalized.source_rows else []
+        xml = None
+        if any(element.tag == qn('w:tbl') for element in content):
+            wrapper = parse_xml(f'<w:body {nsdecls("w")}/>')
+            wrapper.extend(copy.deepcopy(element) for element in content)
+            xml = etree.tostring(wrapper)
+        rows = sum(len(element.tr_lst) for element in content if element.tag == qn('w:tbl'))
+        self.table_cache.put(key, CachedTable(self.sections[-1].digest, rows, normalized.source_rows > 0, xml))
 
-    @staticmethod
-    def _is_column_empty(word_table, col_idx: int) -> bool:
+    def _insert_cached_table(self, title: str, cached: CachedTable):
+        """Append the heading and the elements of a table section taken from the table cache."""
+        if not cached.heading:
+            print(f"No rows found for table: {title}")
+            return
+        self.doc.add_heading(title, level=1)
+        if cached.xml is None:
+            print(f"Only empty cells found for table: {title}")
+            return
+        body = self.doc.element.body
+        elements = list(parse_xml(cached.xml))
+        for element in elements:
+            body.insert_element_before(element, 'w:sectPr')
+        tables = [element for element in elements if element.tag == qn('w:tbl')]
+        self.progress.add_rows(cached.rows)
+        self._count_table(TableWriteResult(cached.rows, 0, len(tables),
+                                           sum(len(tbl.xpath('./w:tr/w:tc')) for tbl in tables)))
+
+    def _soup_table(self, table) -> NormalizedTable:
         """
-        Check if a column is entirely empty.
-        
-        Args:
-            word_table: The Word table to check.
-            col_idx (int): The index of the column to check.
-        
-        Returns:
-            bool: True if the column is empty, False otherwise.
+        Normalize a parsed HTML table. A table with more rows than fit in one chunk is
+        streamed: its rows are read from the parsed tree while they are written.
         """
-        return all(row.cells[col_idx].text.strip() == '' for row in word_table.rows)
+        trs = table.find_all('tr')
+        header_rows = header_rows_from_soup(table)
+        if len(trs) <= self.table_options.chunk_rows:
+            return normalize_table([cells_from_soup(tr) for tr in trs], header_rows)
+        return stream_normalized_table(lambda: (cells_from_soup(tr) for tr in trs), header_rows)
 
-    def _remove_empty_rows(self, word_table):
+    def _lxml_table(self, element) -> NormalizedTable:
+        """Normalize an lxml HTML table, streaming it like _soup_table."""
+        header_rows = header_rows_from_lxml(element)
+        if sum(1 for _ in element.iter('tr')) <= self.table_options.chunk_rows:
+            return normalize_table(rows_from_lxml(element), header_rows)
+        return stream_normalized_table(lambda: (cells_from_lxml(tr) for tr in element.iter('tr')), header_rows)
+
+    def _add_table(self, table: NormalizedTable, title: str, key: Optional[str] = None,
+                   width: Optional[int] = None) -> list:
         """
-        Remove empty rows from the Word table.
-        
+        Add a heading and the Word tables holding a normalized HTML table.
+
+        The rows are written a chunk at a time and fingerprinted on the way, so a streamed
+        table is never held in memory as a whole.
+
         Args:
-            word_table: The Word table to process.
+            table (NormalizedTable): The normalized table.
+            title (str): The heading placed above the table.
+            key (Optional[str]): The section key, the next table key of the printout if None.
+            width (Optional[int]): The table width in EMU, the width of the last section if None.
+
+        Returns:
+            list: The body elements written.
         """
-        rows_to_remove = [row for row in word_table.rows if self._is_row_empty(row)]
-        for row in rows_to_remove:
-            tbl = word_table._tbl
-            tbl.remove(row._tr)
+        width = width or self.doc._block_width
+        layout = self.table_options.layout(table.header_rows, table.row_count)
+        digest = TableDigest(title)
 
-    @staticmethod
-    def _is_row_empty(row) -> bool:
+        def write():
+            if not table.source_rows:
+                print(f"No rows found for table: {title}")
+                return
+            self.doc.add_heading(title, level=1)
+            if not table.row_count:
+                print(f"Only empty cells found for table: {title}")
+                return
+            self._count_table(write_table(self.doc.element.body, digest.rows(table.rows), table.columns,
+                                          self._table_style_id(), Length(width), table.header_rows,
+                                          table.row_count, self.table_options, title, self.progress.add_rows))
+
+        return self._add_section('table', title, lambda: digest.hexdigest(layout, table.source_rows > 0), write,
+                                 key, int(width))
+
+    def _table_digest(self, table: NormalizedTable, title: str) -> str:
+        """The fingerprint _add_table gives a table, without writing it."""
+        layout = self.table_options.layout(table.header_rows, table.row_count)
+        limit = table.header_rows + self.table_options.row_budget if 'row_budget' in layout else None
+        digest = TableDigest(title)
+        for row in islice(table.rows, limit):
+            digest.update(row)
+        return digest.hexdigest(layout, table.source_rows > 0)
+
+    def _count_table(self, result: TableWriteResult):
+        self.profile.count('tables', result.tables)
+        self.profile.count('rows', result.rows)
+        self.profile.count('cells', result.cells)
+        if result.omitted:
+            self.profile.count('rows omitted', result.omitted)
+
+    def _add_section(self, kind: str, title: str, digest: Union[str, Callable[[], str]], write: Callable[[], None],
+                     key: Optional[str] = None, width: Optional[int] = None) -> list:
         """
-        Check if a row is entirely empty.
-        
+        Write a table or image section at the end of the document, enclosed in a hidden
+        bookmark, and record its fingerprint in self.sections.
+
         Args:
-            row: The row to check.
-        
+            kind (str): 'table' or 'image'.
+            title (str): The table heading or image caption.
+            digest (Union[str, Callable[[], str]]): The fingerprint of the section content, or a
+                                                    function returning it once the section
+                                                    has been written.
+            write (Callable[[], None]): Appends the content of the section to the document.
+            key (Optional[str]): The section key, the next key of this kind if None.
+            width (Optional[int]): The width in EMU a table was laid out for.
+
         Returns:
-            bool: True if the row is empty, False otherwise.
+            list: The body elements written, bookmark start and end included.
         """
-        return all(cell.text.strip() == '' for cell in row.cells)
+        if key is None:
+            self._section_counts[kind] += 1
+            key = f"{self.printout}.{kind[0]}{self._section_counts[kind]}"
+        section = ReportSection(key, kind, title, digest if isinstance(digest, str) else '', width)
+        if self._bookmark_id is None:
+            self._bookmark_id = next_bookmark_id(self.doc)
+        bookmark_id = self._bookmark_id
+        self._bookmark_id += 1
 
-    def _delete_last_page_in_template(self):
-        for element in reversed(self.doc.element.body):
-            if element.tag.endswith('sectPr'):
-                self.doc.element.body.remove(element)
+        start = add_bookmark_start(self.doc, section.bookmark, bookmark_id)
+        write()
+        end = add_bookmark_end(self.doc, bookmark_id)
+        if not isinstance(digest, str):
+            section.digest = digest()
+        self.sections.append(section)
+
+        elements = [start]
+        for element in start.itersiblings():
+            elements.append(element)
+            if element is end:
                 break
+        return elements
 
-    def _apply_row_colors(self, word_table):
+    def section_sources(self, table_info_list: Optional[List[TableInfo]] = None) -> List[Tuple[ReportSection, object]]:
         """
-        Apply the background color of the second cell to the remaining cells of each row.
-        
+        Fingerprint the table and image sections of the printout without writing them.
+
+        The sections and keys are the ones process_html_file and add_images_to_word_document
+        write, so they can be compared with those of an existing report. Call
+        extract_image_files and extract_captions first. Not available in streaming mode.
+
+        Args:
+            table_info_list (Optional[List[TableInfo]]): The selected tables, as for process_html_file.
+
+        Returns:
+            List[Tuple[ReportSection, object]]: Each section with its source, the parsed HTML
+            table or the ImageInfo of an image, to pass to replace_section.
+        """
+        if self.streaming:
+            raise ValueError("Sections can only be fingerprinted when the printout is parsed as a whole.")
+        sources = []
+        for number, (title, table) in enumerate(self._selected_tables(table_info_list), 1):
+            digest = self._table_digest(self._soup_table(table), title)
+            sources.append((ReportSection(f"{self.printout}.t{number}", 'table', title, digest), table))
+        for number, image in enumerate(self._placed_images(), 1):
+            digest = image_digest(os.path.join(self.data_folder, image.filename), image.caption,
+                                  self.image_layout.options.layout())
+            sources.append((ReportSection(f"{self.printout}.i{number}", 'image', image.caption, digest), image))
+        return sources
+
+    def replace_section(self, section: ReportSection, source) -> bool:
+        """
+        Rewrite one section of an existing report in place.
+
+        The new content is written at the end of the document and then moved between
+        the bookmarks of the old section, which is removed together with images that
+        are no longer used.
+
         Args:
-            word_table: The Word table to process.
+            section (ReportSection): The section, as returned by section_sources, with the
+                                     width of the table it replaces.
+            source: Its source, as returned by section_sources.
+
+        Returns:
+            bool: False if the section was not found in the report.
         """
-        for row in word_table.rows:
-            if len(row.cells) > 1:
-                second_cell_color = row.cells[1]._element.xpath('.//w:shd/@w:fill')
-                if second_cell_color:
-                    second_cell_color = second_cell_color[0]
-                    for cell in row.cells[2:]:
-                        self.apply_cell_formatting(cell, second_cell_color)
+        old = bookmark_range(self.doc, section.bookmark)
+        if old is None:
+            return False
+        if section.kind == 'table':
+            new = self._add_table(self._soup_table(source), section.title, key=section.key, width=section.width)
+        else:
+            new = self._add_image(source, section.number - 1, key=section.key)
+            self.progress.add_images()
+        drop_unused_relationships(self.doc, replace_range(old, new))
+        return True
+
+    def _table_style_id(self) -> str:
+        """
+        Return the style id of the 'Table Grid' style used for all converted tables.
+        """
+        if self._table_style is None:
+            self._table_style = self.doc.styles['Table Grid'].style_id
+        return self._table_style
+
+    def _delete_last_page_in_template(self):
+        remove_trailing_section(self.doc)
 
-    def save(self, filename: str):
+    def save(self, filename: str, options: Optional[SaveOptions] = None):
         """
         Save the Word document to a file.
         
         Args:
             filename (str): The name of the file to save the document to.
+            options (Optional[SaveOptions]): How the file is compressed; SaveOptions.intermediate()
+                                             for a file that is read back soon after.
         """
-        self.doc.save(filename)
+        save_document(self.doc, filename, options)
 
     def process_html_file(self, table_info_list: Optional[List[TableInfo]] = None):
         """
@@ -299,16 +537,37 @@ class HTMLToWordConverter:
         Args:
             table_info_list (Optional[List[TableInfo]]): A list of TableInfo objects specifying the tables to extract.
                                                          If None, all tables will be extracted.
+                                                         All entries are resolved in one pass over
+                                                         the heading index; see TableInfo.match for
+                                                         wildcard and regex selections. In streaming
+                                                         mode the selected tables are written in
+                                                         document order.
         """
-        if table_info_list:
-            for table_info in table_info_list:
-                table_html = self.extract_table_after_heading(self.soup, table_info.main_title, table_info.heading_text)
-                if table_html:
-                    self.create_word_table_from_html(table_html, table_info.title)
-                else:
-                    print(f"No table found for heading: {table_info.heading_text}")
-        else:
-            self.extract_all_tables()
+        with self.profile.timer('tables'):
+            if self.streaming:
+                self._stream_html_file(table_info_list=table_info_list)
+            elif table_info_list:
+                for title, table in self._selected_tables(table_info_list):
+                    self._create_word_table(table, title, self._table_source(table))
+            else:
+                self.extract_all_tables()
+
+    def _selected_tables(self, table_info_list: Optional[List[TableInfo]] = None) -> List[Tuple[str, object]]:
+        """
+        The title and the parsed element of every table to write, in order.
+
+        Args:
+            table_info_list (Optional[List[TableInfo]]): The tables to select, or None for all tables.
+        """
+        if not table_info_list:
+            return [(indexed_table.title, indexed_table.element) for indexed_table in self.index.tables]
+        selected = []
+        for table_info, indexed_tables in self.index.select_tables(table_info_list):
+            if not indexed_tables:
+                print(f"No table found for heading: {table_info.heading_text}")
+            selected.extend((table_info.title or indexed_table.title, indexed_table.element)
+                            for indexed_table in indexed_tables)
+        return selected
 
     
 
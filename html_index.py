@@ -0,0 +1,260 @@
+from dataclasses import dataclass, field
+from operator import attrgetter
+from typing import Callable, Dict, List, Optional, Tuple
+from bs4 import BeautifulSoup, Tag
+import fnmatch
+import heapq
+import os
+import re
+from info import TableInfo
+
+HEADING_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+# The values of TableInfo.match
+MATCH_MODES = ('contains', 'wildcard', 'regex')
+
+
+@dataclass
+class IndexedHeading:
+    """
+    A heading found while indexing the printout.
+
+    Attributes:
+        position (int): Document-order position of the heading in the index.
+        level (int): Heading level (1 for h1, 2 for h2, ...).
+        text (str): The stripped heading text.
+    """
+    position: int
+    level: int
+    text: str
+
+
+@dataclass
+class IndexedTable:
+    """
+    A table found while indexing the printout.
+
+    Attributes:
+        position (int): Document-order position of the table in the index.
+        element (Tag): The parsed <table> element.
+        title (str): Text of the nearest preceding heading of any level, without numbering.
+        h1 (Optional[str]): Text of the enclosing h1, if any.
+        h2 (Optional[str]): Text of the enclosing h2, if any.
+        h2_position (Optional[int]): Position of the enclosing h2, if any.
+    """
+    position: int
+    element: Tag
+    title: str
+    h1: Optional[str] = None
+    h2: Optional[str] = None
+    h2_position: Optional[int] = None
+
+
+@dataclass
+class IndexedImage:
+    """
+    An <img> found while indexing the printout.
+
+    Attributes:
+        position (int): Document-order position of the image in the index.
+        filename (str): Base name of the image source.
+        caption (Optional[str]): Caption derived from the enclosing h2, if any.
+        h1 (Optional[str]): Text of the enclosing h1, if any.
+        h2 (Optional[str]): Text of the enclosing h2, if any.
+    """
+    position: int
+    filename: str
+    caption: Optional[str] = None
+    h1: Optional[str] = None
+    h2: Optional[str] = None
+
+
+def strip_numbering(text: str) -> str:
+    """Remove leading section numbers such as '2.1.3 ' from a heading."""
+    return re.sub(r'^\d+(\.\d+)*\s*', '', text)
+
+
+def image_caption(h2_text: str) -> str:
+    """Build an image caption from the text of its enclosing h2."""
+    # Remove the leading numbers and dots
+    caption = re.sub(r'^[\d.]+ ', '', h2_text)
+    # Remove "Statische Analyse" from the end of the caption
+    return re.sub(r'\s*Statische Analyse\s*$', '', caption)
+
+
+def heading_matcher(pattern: str, match: str = 'contains') -> Callable[[Optional[str]], bool]:
+    """
+    Build a test for heading texts.
+
+    Args:
+        pattern (str): The text or pattern to look for.
+        match (str): 'contains', 'wildcard' or 'regex', see TableInfo.match.
+
+    Returns:
+        Callable[[Optional[str]], bool]: True for a matching heading text, False for None.
+
+    Raises:
+        ValueError: If match is unknown or the regular expression is invalid.
+    """
+    if match == 'contains':
+        return lambda text: text is not None and pattern in text
+    if match == 'wildcard':
+        regex = re.compile(fnmatch.translate(pattern))
+        return lambda text: text is not None and regex.match(text) is not None
+    if match == 'regex':
+        try:
+            regex = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"Invalid heading pattern {pattern!r}: {e}") from e
+        return lambda text: text is not None and regex.search(text) is not None
+    raise ValueError(f"Unknown heading match {match!r}, expected one of {', '.join(MATCH_MODES)}")
+
+
+@dataclass
+class TableQuery:
+    """
+    A TableInfo with its heading tests compiled, as used to select tables.
+
+    Attributes:
+        info (TableInfo): The table selection.
+        main (Callable[[Optional[str]], bool]): Tests the h1 text.
+        heading (Callable[[Optional[str]], bool]): Tests the h2 text.
+    """
+    info: TableInfo
+    main: Callable[[Optional[str]], bool]
+    heading: Callable[[Optional[str]], bool]
+
+    @classmethod
+    def compile(cls, info: TableInfo) -> 'TableQuery':
+        return cls(info, heading_matcher(info.main_title, info.match), heading_matcher(info.heading_text, info.match))
+
+    @property
+    def all_matches(self) -> bool:
+        """True if every matching table is selected, not only the first one."""
+        return self.info.match != 'contains'
+
+    def matches(self, h1: Optional[str], h2: Optional[str]) -> bool:
+        """Whether a table below the given h1 and h2 is selected."""
+        return self.main(h1) and self.heading(h2)
+
+    def title(self, table_title: str) -> str:
+        """The title of a selected table, given the heading above it."""
+        return self.info.title or table_title
+
+
+@dataclass
+class HTMLDocumentIndex:
+    """
+    A single-pass index of the headings, tables and images of a printout.
+
+    The index is built with one document-order walk over the parsed HTML, so
+    lookups never have to walk back through the tree again.
+
+    Attributes:
+        headings (List[IndexedHeading]): All h1-h6 headings in document order.
+        tables (List[IndexedTable]): All tables in document order.
+        images (List[IndexedImage]): All images with a src attribute in document order.
+    """
+    headings: List[IndexedHeading] = field(default_factory=list)
+    tables: List[IndexedTable] = field(default_factory=list)
+    images: List[IndexedImage] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, soup: BeautifulSoup) -> 'HTMLDocumentIndex':
+        """
+        Build the index from a parsed printout.
+
+        Args:
+            soup (BeautifulSoup): The parsed HTML printout.
+
+        Returns:
+            HTMLDocumentIndex: The populated index.
+        """
+        index = cls()
+        h1 = h2 = h2_caption = last_heading = None
+        h2_position = None
+        for position, element in enumerate(soup.find_all(HEADING_TAGS + ['table', 'img'])):
+            name = element.name
+            if name == 'table':
+                title = strip_numbering(last_heading) if last_heading else ''
+                index.tables.append(IndexedTable(position, element, title, h1, h2, h2_position))
+            elif name == 'img':
+                src = element.get('src')
+                if src:
+                    caption = image_caption(h2_caption) if h2_caption is not None else None
+                    index.images.append(IndexedImage(position, os.path.basename(src), caption, h1, h2))
+            else:
+                text = element.get_text(strip=True)
+                level = int(name[1])
+                index.headings.append(IndexedHeading(position, level, text))
+                last_heading = text
+                if level == 1:
+                    h1 = text
+                    h2 = h2_position = None
+                elif level == 2:
+                    h2 = text
+                    h2_caption = element.get_text().strip()
+                    h2_position = position
+        return index
+
+    def find_table(self, main_title: str, heading_text: str) -> Optional[IndexedTable]:
+        """
+        Find the first table below the h2 containing heading_text that follows the h1 containing main_title.
+
+        Args:
+            main_title (str): Text contained in the main (h1) heading.
+            heading_text (str): Text contained in the h2 heading below the main heading.
+
+        Returns:
+            Optional[IndexedTable]: The matching table, or None if there is none.
+        """
+        main_heading = next((h for h in self.headings if h.level == 1 and main_title in h.text), None)
+        if main_heading is None:
+            return None
+        heading = next((h for h in self.headings
+                        if h.level == 2 and h.position > main_heading.position and heading_text in h.text), None)
+        if heading is None:
+            return None
+        return next((t for t in self.tables if t.h2_position == heading.position), None)
+
+    def select_tables(self, table_info_list: List[TableInfo]) -> List[Tuple[TableInfo, List[IndexedTable]]]:
+        """
+        Resolve several table selections in one walk over the index.
+
+        A 'contains' selection finds the same table as find_table; a wildcard or regex
+        selection finds every table whose h1 and h2 match.
+
+        Args:
+            table_info_list (List[TableInfo]): The table selections.
+
+        Returns:
+            List[Tuple[TableInfo, List[IndexedTable]]]: Each selection with the tables it
+            selects in document order, in the order of table_info_list.
+        """
+        queries = [TableQuery.compile(info) for info in table_info_list]
+        selected: List[List[IndexedTable]] = [[] for _ in queries]
+        patterns = [number for number, query in enumerate(queries) if query.all_matches]
+        # 'contains' selections wait for their h1, then for an h2 after it, then for a table below
+        # that h2. They are grouped by the text they wait for, so each text is tested once per heading.
+        waiting_h1: Dict[str, List[int]] = {}
+        for number, info in enumerate(table_info_list):
+            if number not in patterns:
+                waiting_h1.setdefault(info.main_title, []).append(number)
+        waiting_h2: Dict[str, List[int]] = {}
+        waiting_table: Dict[int, List[int]] = {}
+        for item in heapq.merge(self.headings, self.tables, key=attrgetter('position')):
+            if isinstance(item, IndexedHeading):
+                if item.level == 1:
+                    for main_title in [main_title for main_title in waiting_h1 if main_title in item.text]:
+                        for number in waiting_h1.pop(main_title):
+                            waiting_h2.setdefault(table_info_list[number].heading_text, []).append(number)
+                elif item.level == 2:
+                    for heading_text in [heading_text for heading_text in waiting_h2 if heading_text in item.text]:
+                        waiting_table.setdefault(item.position, []).extend(waiting_h2.pop(heading_text))
+                continue
+            for number in waiting_table.pop(item.h2_position, ()):
+                selected[number].append(item)
+            for number in patterns:
+                if queries[number].matches(item.h1, item.h2):
+                    selected[number].append(item)
+        return list(zip(table_info_list, selected))
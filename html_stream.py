@@ -0,0 +1,115 @@
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Union
+from lxml import etree
+import mmap
+import os
+from html_index import HEADING_TAGS, strip_numbering, image_caption
+from html_table import HTMLCell, rows_from_lxml
+
+
+@dataclass
+class StreamedTable:
+    """
+    A table read from the printout by the streaming reader.
+
+    The element is only complete until the reader moves on to the next section,
+    so its rows must be read before then.
+
+    Attributes:
+        element: The lxml <table> element.
+        title (str): Text of the nearest preceding heading of any level, without numbering.
+        h1 (Optional[str]): Text of the enclosing h1, if any.
+        h2 (Optional[str]): Text of the enclosing h2, if any.
+    """
+    element: object
+    title: str
+    h1: Optional[str] = None
+    h2: Optional[str] = None
+
+    @property
+    def rows(self) -> List[List[HTMLCell]]:
+        """The table rows."""
+        return rows_from_lxml(self.element)
+
+
+@dataclass
+class StreamedImage:
+    """
+    An image read from the printout by the streaming reader.
+
+    Attributes:
+        filename (str): Base name of the image source.
+        caption (Optional[str]): Caption derived from the preceding h2, if any.
+    """
+    filename: str
+    caption: Optional[str] = None
+
+
+class StreamingPrintoutReader:
+    """
+    Read a printout one table or image at a time without keeping the whole tree.
+
+    The file is memory-mapped and fed to lxml's incremental HTML parser. Every
+    element is cleared as soon as it has been handled and its processed
+    siblings are dropped, so the memory of the reader is bounded by the largest
+    single table rather than by the size of the printout. The report the tables
+    are written to grows with the printout unless they are spilled from it, as
+    HTMLToWordConverter does in streaming mode.
+    """
+
+    def __init__(self, html_path: str):
+        """
+        Initialize the reader.
+
+        Args:
+            html_path (str): The path to the HTML printout.
+        """
+        self.html_path = html_path
+
+    def __iter__(self) -> Iterator[Union[StreamedTable, StreamedImage]]:
+        if os.path.getsize(self.html_path) == 0:
+            return
+        with open(self.html_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield from self._iter_sections(mapped)
+
+    def _iter_sections(self, source) -> Iterator[Union[StreamedTable, StreamedImage]]:
+        h1 = h2 = h2_caption = last_heading = None
+        table_depth = 0
+        heading_depth = 0
+        for event, element in etree.iterparse(source, events=('start', 'end'), html=True, encoding='utf-8'):
+            tag = element.tag if isinstance(element.tag, str) else ''
+            if event == 'start':
+                if tag == 'table':
+                    table_depth += 1
+                elif tag in HEADING_TAGS:
+                    heading_depth += 1
+                continue
+
+            if tag == 'table':
+                table_depth -= 1
+                if table_depth == 0:
+                    title = strip_numbering(last_heading) if last_heading else ''
+                    yield StreamedTable(element, title, h1, h2)
+            elif tag in HEADING_TAGS:
+                heading_depth -= 1
+                text = ''.join(piece.strip() for piece in element.itertext())
+                last_heading = text
+                if tag == 'h1':
+                    h1 = text
+                    h2 = None
+                elif tag == 'h2':
+                    h2 = text
+                    h2_caption = ''.join(element.itertext()).strip()
+            elif tag == 'img' and element.get('src'):
+                caption = image_caption(h2_caption) if h2_caption is not None else None
+                yield StreamedImage(os.path.basename(element.get('src')), caption)
+
+            # Discard everything that has been handled, unless an enclosing
+            # table or heading still needs it.
+            if table_depth == 0 and heading_depth == 0:
+                element.clear(keep_tail=True)
+                parent = element.getparent()
+                if parent is not None:
+                    while element.getprevious() is not None:
+                        del parent[0]
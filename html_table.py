@@ -0,0 +1,246 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+from shading import style_fill
+
+
+@dataclass
+class HTMLCell:
+    """
+    Parser-independent content of one HTML table cell.
+
+    Attributes:
+        text (str): The stripped text of the cell.
+        colspan (int): Number of grid columns the cell spans.
+        color (Optional[str]): Normalized background fill, e.g. 'FFCC00', if any.
+    """
+    text: str
+    colspan: int = 1
+    color: Optional[str] = None
+
+
+def _colspan(value) -> int:
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def cells_from_soup(row) -> List[HTMLCell]:
+    """
+    Read the cells of a BeautifulSoup <tr> element.
+
+    Args:
+        row: The parsed <tr> element.
+
+    Returns:
+        List[HTMLCell]: The cells of the row.
+    """
+    return [HTMLCell(cell.get_text(strip=True), _colspan(cell.get('colspan', 1)), style_fill(cell.get('style', '')))
+            for cell in row.find_all(['th', 'td'])]
+
+
+def cells_from_lxml(row) -> List[HTMLCell]:
+    """
+    Read the cells of an lxml <tr> element.
+
+    Args:
+        row: The lxml <tr> element.
+
+    Returns:
+        List[HTMLCell]: The cells of the row.
+    """
+    return [HTMLCell(''.join(text.strip() for text in cell.itertext()), _colspan(cell.get('colspan', 1)),
+                     style_fill(cell.get('style', '')))
+            for cell in row.iter('th', 'td')]
+
+
+def rows_from_lxml(table) -> List[List[HTMLCell]]:
+    """
+    Read the rows of an lxml <table> element.
+
+    Args:
+        table: The lxml <table> element.
+
+    Returns:
+        List[List[HTMLCell]]: One list of cells per <tr>.
+    """
+    return [cells_from_lxml(row) for row in table.iter('tr')]
+
+
+def _header_row_count(rows_tags: Iterable[List[str]]) -> int:
+    count = 0
+    for tags in rows_tags:
+        if not tags or any(tag != 'th' for tag in tags):
+            break
+        count += 1
+    return count
+
+
+def header_rows_from_soup(table) -> int:
+    """
+    Number of leading rows of a BeautifulSoup <table> element that consist of <th> cells only.
+    """
+    return _header_row_count([cell.name for cell in row.find_all(['th', 'td'])] for row in table.find_all('tr'))
+
+
+def header_rows_from_lxml(table) -> int:
+    """
+    Number of leading rows of an lxml <table> element that consist of <th> cells only.
+    """
+    return _header_row_count([cell.tag for cell in row.iter('th', 'td')] for row in table.iter('tr'))
+
+
+def column_count(rows: List[List[HTMLCell]]) -> int:
+    """
+    Number of grid columns of a table, taken from the spans of its first row.
+
+    Args:
+        rows (List[List[HTMLCell]]): The table rows.
+
+    Returns:
+        int: The number of grid columns.
+    """
+    return sum(cell.colspan for cell in rows[0]) if rows else 0
+
+
+def _place_row(row: List[HTMLCell], max_columns: int, filled: List[bool]) -> Optional[list]:
+    """
+    Place the cells of a row on the grid, marking the columns in which a cell with text starts.
+
+    Returns:
+        Optional[list]: (column, span, cell) of every cell, padded to max_columns, or None
+        if the row has no text.
+    """
+    placed = []
+    col_idx = 0
+    for cell in row:
+        if col_idx >= max_columns:
+            break
+        span = min(cell.colspan, max_columns - col_idx)
+        placed.append((col_idx, span, cell))
+        if cell.text:
+            filled[col_idx] = True
+        col_idx += span
+    if not any(cell.text for _, _, cell in placed):
+        return None
+    placed.extend((idx, 1, HTMLCell('')) for idx in range(col_idx, max_columns))
+    return placed
+
+
+def _kept_before(filled: List[bool]) -> List[int]:
+    """Number of kept columns before each grid column, so spans can be narrowed by subtraction."""
+    kept_before = [0] * (len(filled) + 1)
+    for col_idx, column_filled in enumerate(filled):
+        kept_before[col_idx + 1] = kept_before[col_idx] + column_filled
+    return kept_before
+
+
+def _narrow_row(placed: list, kept_before: List[int]) -> List[HTMLCell]:
+    row = []
+    for col_idx, span, cell in placed:
+        kept = kept_before[col_idx + span] - kept_before[col_idx]
+        if kept == span:
+            row.append(cell if cell.colspan == span else HTMLCell(cell.text, span, cell.color))
+        elif kept:
+            row.append(HTMLCell(cell.text, kept, cell.color))
+    return row
+
+
+def normalize_rows(rows: List[List[HTMLCell]], max_columns: int) -> Tuple[List[List[HTMLCell]], int]:
+    """
+    Lay the rows out on the table grid and drop empty rows and columns.
+
+    Cells are placed left to right with their colspans expanded, clipped to
+    max_columns and padded with empty cells, as in a python-docx grid. A grid
+    column is empty if no cell starting in it has any text; cells spanning an
+    empty column are narrowed, and cells lying only in empty columns are
+    dropped. Rows without any text are dropped.
+
+    Args:
+        rows (List[List[HTMLCell]]): The rows of the HTML table.
+        max_columns (int): The number of grid columns of the table.
+
+    Returns:
+        Tuple[List[List[HTMLCell]], int]: The normalized rows, whose spans add up to the
+                                          returned number of columns in every row.
+    """
+    filled = [False] * max_columns
+    placed_rows = [placed for placed in (_place_row(row, max_columns, filled) for row in rows) if placed is not None]
+    kept_before = _kept_before(filled)
+    return [_narrow_row(placed, kept_before) for placed in placed_rows], kept_before[max_columns]
+
+
+@dataclass
+class NormalizedTable:
+    """
+    The normalized rows of an HTML table, ready to be written.
+
+    Attributes:
+        rows (Iterable[List[HTMLCell]]): The normalized rows. A streamed table produces them
+                                         one at a time and can only be iterated once.
+        columns (int): The number of grid columns left.
+        row_count (int): The number of normalized rows.
+        header_rows (int): How many of the first normalized rows are header rows.
+        source_rows (int): The number of rows of the HTML table, 0 if it had none at all.
+    """
+    rows: Iterable[List[HTMLCell]]
+    columns: int
+    row_count: int
+    header_rows: int
+    source_rows: int
+
+
+def _kept_header_rows(kept: int, row_count: int) -> int:
+    # A table of header rows only has no header to repeat
+    return kept if kept < row_count else 0
+
+
+def normalize_table(rows: List[List[HTMLCell]], header_rows: int = 0) -> NormalizedTable:
+    """
+    Normalize the rows of a table held in memory.
+
+    Args:
+        rows (List[List[HTMLCell]]): The rows of the HTML table.
+        header_rows (int): The number of leading header rows of the HTML table.
+    """
+    normalized, columns = normalize_rows(rows, column_count(rows))
+    kept = sum(1 for row in rows[:header_rows] if any(cell.text for cell in row))
+    return NormalizedTable(normalized, columns, len(normalized), _kept_header_rows(kept, len(normalized)),
+                           len(rows))
+
+
+def stream_normalized_table(rows: Callable[[], Iterator[List[HTMLCell]]], header_rows: int = 0) -> NormalizedTable:
+    """
+    Normalize the rows of a table without holding them all in memory.
+
+    The rows are read twice: the first pass finds the empty rows and columns, the
+    second produces the normalized rows one at a time while they are written. The
+    result is the same as that of normalize_table.
+
+    Args:
+        rows (Callable[[], Iterator[List[HTMLCell]]]): Returns a new iterator over the rows of
+                                                       the HTML table on every call.
+        header_rows (int): The number of leading header rows of the HTML table.
+    """
+    max_columns = None
+    filled: List[bool] = []
+    source_rows = row_count = kept = 0
+    for row in rows():
+        if max_columns is None:
+            max_columns = sum(cell.colspan for cell in row)
+            filled = [False] * max_columns
+        if _place_row(row, max_columns, filled) is not None:
+            row_count += 1
+            kept += source_rows < header_rows
+        source_rows += 1
+    kept_before = _kept_before(filled)
+
+    def normalized() -> Iterator[List[HTMLCell]]:
+        scratch = [False] * len(filled)
+        for row in rows():
+            placed = _place_row(row, len(filled), scratch)
+            if placed is not None:
+                yield _narrow_row(placed, kept_before)
+
+    return NormalizedTable(normalized(), kept_before[-1], row_count, _kept_header_rows(kept, row_count),
+                           source_rows)
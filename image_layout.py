@@ -0,0 +1,160 @@
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from docx.document import Document as DocxDocument
+from docx.enum.section import WD_ORIENTATION
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.image.image import Image
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PackURI
+from docx.oxml.ns import qn
+from docx.oxml.shape import CT_Inline
+from docx.parts.image import ImagePart
+from docx.section import Section
+from docx.shared import Inches, Length
+from body_spill import BodySpill
+
+# Height kept free below every image for its caption
+_CAPTION_HEIGHT = Inches(0.4)
+
+
+@dataclass
+class ImageLayoutOptions:
+    """
+    How the images of a printout are laid out in the report.
+
+    Attributes:
+        images_per_page (int): Images stacked on each landscape page. Each image is scaled
+                               down to fit its share of the page height.
+        captions (bool): Write the caption below each image.
+        max_width (float): Width in inches an image is placed at if it fits.
+    """
+    images_per_page: int = 1
+    captions: bool = True
+    max_width: float = 9.0
+
+    def layout(self) -> Dict:
+        """The settings that differ from the defaults, part of the image fingerprints."""
+        defaults = ImageLayoutOptions()
+        return {name: value for name, value in vars(self).items() if value != getattr(defaults, name)}
+
+
+def _set_page(section: Section, orientation: WD_ORIENTATION, width: Length, height: Length):
+    section.orientation = orientation
+    section.page_width = width
+    section.page_height = height
+    section.left_margin = Inches(1)
+    section.right_margin = Inches(1)
+
+
+def next_shape_id(doc: DocxDocument) -> int:
+    """
+    Return a drawing id not used in the main document part yet, spilled content included.
+
+    Only the wp:docPr ids of the drawings are considered, found with a filtered walk
+    over the tree. python-docx's part.next_id collects every id attribute with one
+    XPath query instead, which fails on reports with tens of millions of nodes.
+    """
+    ids = (doc_pr.get('id', '') for doc_pr in doc.element.iter(qn('wp:docPr')))
+    used = max((int(value) for value in ids if value.isdigit()), default=0)
+    spill = BodySpill.of(doc)
+    return max(used, spill.max_shape_id if spill else 0) + 1
+
+
+class ImageLayout:
+    """
+    Lay the images of a printout out in one landscape section.
+
+    begin starts the landscape section, place adds one image after the other and end
+    returns to portrait. Every page starts with a page break before its first image,
+    so each image is written as a self-contained pair of paragraphs (picture and caption)
+    that can be rewritten in place.
+
+    Pictures are inserted without the lookups python-docx repeats for every picture,
+    which make adding hundreds of them quadratic: the paragraph list is never rebuilt,
+    and the image parts and the next picture id are looked up once and then tracked.
+    """
+
+    def __init__(self, doc: DocxDocument, options: Optional[ImageLayoutOptions] = None):
+        """
+        Initialize the layout.
+
+        Args:
+            doc (DocxDocument): The report.
+            options (Optional[ImageLayoutOptions]): The layout settings, defaults if None.
+        """
+        self.doc = doc
+        self.options = options or ImageLayoutOptions()
+        self._box: Optional[Tuple[int, int]] = None
+        self._image_parts: Optional[Dict[str, ImagePart]] = None
+        self._next_image = 1
+        self._next_shape_id = 1
+
+    def begin(self):
+        """Start the landscape section the images are placed in."""
+        _set_page(self.doc.add_section(), WD_ORIENTATION.LANDSCAPE, Inches(11), Inches(8.5))
+
+    def end(self):
+        """Start the portrait section that follows the images."""
+        _set_page(self.doc.add_section(), WD_ORIENTATION.PORTRAIT, Inches(8.5), Inches(11))
+
+    def box(self) -> Tuple[int, int]:
+        """
+        The width and height in EMU available to one image on a landscape page.
+
+        The top and bottom margins are those of the last section, which the image section
+        copies, or Word's default of one inch if it does not set them.
+        """
+        if self._box is None:
+            section = Section(self.doc.element.body.get_or_add_sectPr(), self.doc.part)
+            per_page = max(1, self.options.images_per_page)
+            top, bottom = section.top_margin, section.bottom_margin
+            height = Inches(8.5) - (Inches(1) if top is None else top) - (Inches(1) if bottom is None else bottom)
+            height = height // per_page - (_CAPTION_HEIGHT if self.options.captions else 0)
+            self._box = (min(Inches(self.options.max_width), Inches(9)), max(int(height), Inches(1)))
+        return self._box
+
+    def place(self, img_path: str, caption: str, position: int) -> None:
+        """
+        Append an image, and its caption if enabled, at the end of the document.
+
+        Args:
+            img_path (str): The image file to embed.
+            caption (str): The caption placed below the image.
+            position (int): The position of the image in the section, from 0, which decides
+                            whether it starts a new page.
+        """
+        image = Image.from_file(img_path)
+        box_width, box_height = self.box()
+        width = min(box_width, box_height * image.px_width // image.px_height) if image.px_height else box_width
+
+        picture = self.doc.add_paragraph()
+        picture.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        if position and position % max(1, self.options.images_per_page) == 0:
+            picture.paragraph_format.page_break_before = True
+        picture.add_run()._r.add_drawing(self._inline(image, *image.scaled_dimensions(Length(width), None)))
+        if self.options.captions:
+            picture.paragraph_format.keep_with_next = True
+            paragraph = self.doc.add_paragraph()
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            paragraph.add_run(caption).italic = True
+
+    def _inline(self, image: Image, cx: int, cy: int) -> CT_Inline:
+        """
+        Build the w:inline element of a picture, adding the image to the package unless
+        the same image is already there.
+        """
+        part = self.doc.part
+        if self._image_parts is None:
+            image_parts = part.package.image_parts
+            self._image_parts = {image_part.sha1: image_part for image_part in image_parts}
+            self._next_image = 1 + max((image_part.partname.idx or 0 for image_part in image_parts), default=0)
+            self._next_shape_id = next_shape_id(self.doc)
+        image_part = self._image_parts.get(image.sha1)
+        if image_part is None:
+            image_part = ImagePart.from_image(image, PackURI(f'/word/media/image{self._next_image}.{image.ext}'))
+            self._next_image += 1
+            part.package.image_parts.append(image_part)
+            self._image_parts[image.sha1] = image_part
+        shape_id = self._next_shape_id
+        self._next_shape_id += 1
+        return CT_Inline.new_pic_inline(shape_id, part.relate_to(image_part, RT.IMAGE), image.filename, cx, cy)
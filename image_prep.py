@@ -0,0 +1,156 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from PIL import Image
+import os
+import time
+
+
+@dataclass
+class ImagePrepOptions:
+    """
+    Settings for preparing printout images before they are embedded.
+
+    Attributes:
+        target_dpi (int): Resolution of the image at its displayed width.
+        display_width (float): Width in inches at which the image is shown in the report.
+        optimize (bool): Let Pillow search for the smallest PNG encoding.
+        quantize_colors (Optional[int]): Reduce PNGs to a palette of this many colors, or None to keep them.
+        jpeg_for_photos (bool): Store photographic images (many distinct colors) as JPEG.
+        jpeg_quality (int): JPEG quality used for photographic images.
+        photo_color_threshold (int): Images with more distinct colors than this count as photographic.
+        workers (Optional[int]): Number of worker processes, None for one per CPU, 1 to run in-process.
+    """
+    target_dpi: int = 200
+    display_width: float = 9.0
+    optimize: bool = True
+    quantize_colors: Optional[int] = None
+    jpeg_for_photos: bool = False
+    jpeg_quality: int = 85
+    photo_color_threshold: int = 4096
+    workers: Optional[int] = None
+
+
+@dataclass
+class PreparedImage:
+    """
+    Result of preparing one image.
+
+    Attributes:
+        source (str): Path of the original image.
+        path (str): Path of the image to embed; the original path if preparing did not help.
+        original_bytes (int): Size of the original image.
+        prepared_bytes (int): Size of the image to embed.
+        seconds (float): Time spent on the image.
+    """
+    source: str
+    path: str
+    original_bytes: int
+    prepared_bytes: int
+    seconds: float
+
+
+@dataclass
+class ImagePrepReport:
+    """
+    Summary of one image preparation run.
+
+    Attributes:
+        images (List[PreparedImage]): The prepared images, in input order.
+        seconds (float): Wall-clock time of the run.
+    """
+    images: List[PreparedImage] = field(default_factory=list)
+    seconds: float = 0.0
+
+    @property
+    def original_bytes(self) -> int:
+        return sum(image.original_bytes for image in self.images)
+
+    @property
+    def prepared_bytes(self) -> int:
+        return sum(image.prepared_bytes for image in self.images)
+
+    def paths(self) -> Dict[str, str]:
+        """Map the base name of every source image to the path that should be embedded."""
+        return {os.path.basename(image.source): image.path for image in self.images}
+
+    def summary(self) -> str:
+        saved = self.original_bytes - self.prepared_bytes
+        percent = 100 * saved / self.original_bytes if self.original_bytes else 0
+        return (f"Prepared {len(self.images)} images in {self.seconds:.1f} s: "
+                f"{self.original_bytes / 1e6:.1f} MB -> {self.prepared_bytes / 1e6:.1f} MB "
+                f"({saved / 1e6:.1f} MB, {percent:.0f}% saved)")
+
+
+def _is_photographic(image: Image.Image, threshold: int) -> bool:
+    return image.getcolors(maxcolors=threshold) is None
+
+
+def prepare_image(source: str, output_folder: str, options: ImagePrepOptions) -> PreparedImage:
+    """
+    Downsample and re-encode one image for embedding.
+
+    The image is resampled so that it has target_dpi pixels per inch at the displayed
+    width, then stored as an optimized (optionally quantized) PNG, or as a JPEG if it is
+    photographic and jpeg_for_photos is set. If the result is not smaller than the
+    original, the original is used.
+
+    Args:
+        source (str): Path of the original image.
+        output_folder (str): Folder to write the prepared image to.
+        options (ImagePrepOptions): The preparation settings.
+
+    Returns:
+        PreparedImage: The outcome for this image.
+    """
+    start = time.perf_counter()
+    original_bytes = os.path.getsize(source)
+    with Image.open(source) as image:
+        image.load()
+    max_width = int(options.display_width * options.target_dpi)
+    if image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image = image.resize((max_width, height), Image.LANCZOS)
+
+    name = os.path.splitext(os.path.basename(source))[0]
+    dpi = (options.target_dpi, options.target_dpi)
+    if options.jpeg_for_photos and _is_photographic(image, options.photo_color_threshold):
+        path = os.path.join(output_folder, f"{name}.jpg")
+        image.convert('RGB').save(path, 'JPEG', quality=options.jpeg_quality, optimize=options.optimize, dpi=dpi)
+    else:
+        if options.quantize_colors:
+            method = Image.FASTOCTREE if image.mode == 'RGBA' else Image.MEDIANCUT
+            image = image.quantize(colors=options.quantize_colors, method=method)
+        path = os.path.join(output_folder, f"{name}.png")
+        image.save(path, 'PNG', optimize=options.optimize, dpi=dpi)
+
+    prepared_bytes = os.path.getsize(path)
+    if prepared_bytes >= original_bytes:
+        os.remove(path)
+        path, prepared_bytes = source, original_bytes
+    return PreparedImage(source, path, original_bytes, prepared_bytes, time.perf_counter() - start)
+
+
+def prepare_images(sources: List[str], output_folder: str,
+                   options: Optional[ImagePrepOptions] = None) -> ImagePrepReport:
+    """
+    Prepare all images of a printout, in a process pool unless options.workers is 1.
+
+    Args:
+        sources (List[str]): Paths of the original images.
+        output_folder (str): Folder to write the prepared images to.
+        options (Optional[ImagePrepOptions]): The preparation settings, defaults if None.
+
+    Returns:
+        ImagePrepReport: The per-image results and the total time.
+    """
+    options = options or ImagePrepOptions()
+    os.makedirs(output_folder, exist_ok=True)
+    start = time.perf_counter()
+    if options.workers == 1 or len(sources) < 2:
+        images = [prepare_image(source, output_folder, options) for source in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=options.workers) as pool:
+            images = list(pool.map(prepare_image, sources,
+                                   [output_folder] * len(sources), [options] * len(sources)))
+    return ImagePrepReport(images, time.perf_counter() - start)
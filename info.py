@@ -8,11 +8,17 @@ class TableInfo:
     Attributes:
         main_title (str): The main title to search for in the HTML.
         heading_text (str): The text of the heading to search for in the HTML.
-        title (str): The title to be used for the table in the Word document.
+        title (str): The title to be used for the table in the Word document. With a wildcard
+                     or regex match, leave it empty to use the heading above each table found.
+        match (str): How the headings are matched. 'contains' selects the first table below
+                     the first h2 containing heading_text after the first h1 containing
+                     main_title. 'wildcard' (* and ? over the whole heading text) and 'regex'
+                     (re.search) select every table whose h1 and h2 match, in document order.
     """
     main_title: str
     heading_text: str
-    title: str
+    title: str = ''
+    match: str = 'contains'
 
 
 @dataclass
@@ -0,0 +1,208 @@
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Comma separated list of optional captures, e.g. FSRG_PROFILE=memory,cprofile
+PROFILE_ENVIRONMENT = 'FSRG_PROFILE'
+
+
+def profile_path(report_path: str) -> str:
+    """The run profile written next to a report."""
+    return os.path.splitext(report_path)[0] + '.profile.json'
+
+
+class _Frame:
+    __slots__ = ('path', 'start', 'peak')
+
+    def __init__(self, path: Tuple[str, ...], start: float):
+        self.path = path
+        self.start = start
+        self.peak = 0
+
+
+class RunProfile:
+    """
+    Nested timers and counters of a report run, written as a JSON run profile.
+
+    Timers nest per thread: a timer started inside another one is recorded as its
+    child, and repeated timers with the same path are summed. Timers of other threads,
+    such as the RFEM export worker, start at the top level. Counters are plain
+    totals. Optionally, the peak traced memory of every timer (tracemalloc) and a
+    cProfile are captured as well, on the thread that started the profile; both slow
+    the run down and are off by default.
+    """
+
+    def __init__(self, memory: bool = False, cprofile: bool = False):
+        """
+        Initialize the profile.
+
+        Args:
+            memory (bool): Record the peak memory of every timer with tracemalloc.
+            cprofile (bool): Profile the functions called between start() and stop().
+        """
+        self.memory = memory
+        self.cprofile = cprofile
+        self.timers: Dict[Tuple[str, ...], List[float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.values: Dict[str, object] = {}
+        self.started_at: Optional[str] = None
+        self._start: Optional[float] = None
+        self._seconds: Optional[float] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        self._profile_thread: Optional[int] = None
+        self._started_tracemalloc = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls) -> 'RunProfile':
+        """Create a profile with the captures listed in the FSRG_PROFILE environment variable."""
+        options = {option.strip().lower() for option in os.environ.get(PROFILE_ENVIRONMENT, '').split(',')}
+        return cls(memory='memory' in options or 'tracemalloc' in options, cprofile='cprofile' in options)
+
+    def start(self):
+        """Start the run, and the optional captures, on the calling thread. Earlier results are discarded."""
+        with self._lock:
+            self.timers.clear()
+            self.counters.clear()
+            self.values.clear()
+        self.started_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self._start = time.perf_counter()
+        # Memory peaks and the cProfile are taken on this thread, the one running the report
+        self._profile_thread = threading.get_ident()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if self.cprofile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        """Stop the run and the optional captures."""
+        if self._start is not None:
+            self._seconds = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self.memory and tracemalloc.is_tracing():
+            self.values['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+
+    def _stack(self) -> List[_Frame]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        Time the enclosed block as a child of the enclosing timer of this thread.
+
+        Args:
+            name (str): The name of the timer.
+        """
+        stack = self._stack()
+        parent = stack[-1] if stack else None
+        frame = _Frame((parent.path if parent else ()) + (name,), time.perf_counter())
+        tracing = self.memory and tracemalloc.is_tracing() and threading.get_ident() == self._profile_thread_or_main()
+        if tracing:
+            # The peak is reset for every timer, so carry the peak seen so far up to the parent
+            if parent is not None:
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        with self._lock:
+            # Registered on entry, so the profile lists timers in the order they first started
+            self.timers.setdefault(frame.path, [0.0, 0, 0])
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            seconds = time.perf_counter() - frame.start
+            peak = 0
+            if tracing:
+                peak = max(frame.peak, tracemalloc.get_traced_memory()[1])
+                if parent is not None:
+                    parent.peak = max(parent.peak, peak)
+            with self._lock:
+                entry = self.timers[frame.path]
+                entry[0] += seconds
+                entry[1] += 1
+                entry[2] = max(entry[2], peak)
+
+    def _profile_thread_or_main(self) -> int:
+        return self._profile_thread or threading.main_thread().ident
+
+    def count(self, name: str, amount: float = 1):
+        """Add to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set(self, name: str, value):
+        """Record a value, e.g. a setting or a result of the run."""
+        with self._lock:
+            self.values[name] = value
+
+    def _timer_tree(self) -> dict:
+        tree = {}
+        for path, (seconds, calls, peak) in self.timers.items():
+            node = tree
+            for name in path[:-1]:
+                node = node.setdefault(name, {}).setdefault('children', {})
+            entry = node.setdefault(path[-1], {})
+            entry.update({'seconds': round(seconds, 6), 'calls': calls})
+            if peak:
+                entry['peak_mb'] = round(peak / (1024 * 1024), 3)
+        return tree
+
+    def _top_functions(self, limit: int = 40) -> List[dict]:
+        stats = pstats.Stats(self._profiler, stream=io.StringIO())
+        rows = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+            rows.append({'function': f"{os.path.basename(filename)}:{line}({function})", 'calls': calls,
+                         'total_seconds': round(total, 6), 'cumulative_seconds': round(cumulative, 6)})
+        rows.sort(key=lambda row: row['cumulative_seconds'], reverse=True)
+        return rows[:limit]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            profile = {
+                'started_at': self.started_at,
+                'seconds': round(self._seconds, 6) if self._seconds is not None else None,
+                'timers': self._timer_tree(),
+                'counters': dict(self.counters),
+                'values': dict(self.values),
+            }
+        if self._profiler is not None:
+            profile['cprofile'] = self._top_functions()
+        return profile
+
+    def write(self, path: str):
+        """
+        Write the run profile as JSON, and the raw cProfile data next to it if captured.
+
+        Args:
+            path (str): The path of the JSON file.
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2, default=str)
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.splitext(path)[0] + '.prof')
+
+    def summary(self) -> str:
+        """The top level timers, one per line."""
+        lines = []
+        for path, (seconds, calls, _) in self.timers.items():
+            if len(path) <= 2:
+                lines.append(f"{'  ' * (len(path) - 1)}{path[-1]}: {seconds:.2f} s ({calls}x)")
+        return '\n'.join(lines)
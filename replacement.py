@@ -1,10 +1,198 @@
 import os
-from docx import Document
+from docx.document import Document
+from docx.opc.part import XmlPart
+from docx.oxml.ns import qn
+from lxml import etree
 import zipfile
 import re
-import tempfile
-from typing import List, Dict
+from typing import List, Dict, Optional, Pattern, Tuple
+from xml.sax.saxutils import escape
 from dataclasses import dataclass, field
+from docx_package import PackageRewriter
+from instrumentation import RunProfile
+
+_W_P = qn('w:p')
+_W_T = qn('w:t')
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+_W_BODY = qn('w:body')
+# The text of an element as lxml stores it; python-docx element classes such as CT_R
+# override the text property with the text of their runs
+_ELEMENT_TEXT = etree._Element.text
+
+def compile_placeholders(mapping: Dict[str, str]) -> Optional[Pattern]:
+    """
+    Compile the placeholders of a replacement mapping into one pattern.
+
+    The alternation tries longer placeholders first, so a placeholder that contains
+    another one wins.
+
+    Returns:
+        Optional[Pattern]: The pattern, or None if there is nothing to replace.
+    """
+    if not mapping:
+        return None
+    return re.compile('|'.join(re.escape(old) for old in sorted(mapping, key=len, reverse=True)))
+
+
+@dataclass
+class PlaceholderBytes:
+    """
+    The placeholders as they occur in serialized XML, to skip XML that cannot contain
+    one without parsing it.
+
+    A placeholder split across runs ends the text of its first run with a leading part
+    of the placeholder, directly followed by the end tag of the w:t. So a placeholder
+    can only be in XML that contains it whole or such a leading part followed by '<'.
+
+    Attributes:
+        needles (List[bytes]): The escaped, UTF-8 encoded placeholders.
+        split (Optional[Pattern]): Matches a leading part of a placeholder followed by '<',
+                                   None if no placeholder can be split.
+    """
+    needles: List[bytes]
+    split: Optional[Pattern]
+
+    @classmethod
+    def of(cls, placeholders) -> 'PlaceholderBytes':
+        """The byte patterns of the placeholder strings."""
+        needles = [escape(old).encode('utf-8') for old in placeholders]
+        splits = [_leading_parts(needle) + b'<' for needle in needles if len(needle) > 1]
+        return cls(needles, re.compile(b'|'.join(splits)) if splits else None)
+
+    def found_in(self, xml: bytes) -> bool:
+        """True if a placeholder may occur in the serialized XML."""
+        if any(needle in xml for needle in self.needles):
+            return True
+        return self.split is not None and self.split.search(xml) is not None
+
+
+def _leading_parts(needle: bytes) -> bytes:
+    """A pattern matching the leading parts of a needle, from its first byte up to all but its last."""
+    pattern = b''
+    for index in range(len(needle) - 2, 0, -1):
+        pattern = re.escape(needle[index:index + 1]) + (b'(?:' + pattern + b')?' if pattern else b'')
+    return re.escape(needle[:1]) + (b'(?:' + pattern + b')?' if pattern else b'')
+
+
+def _blocks(root) -> list:
+    """The children of the body and the other children of a document part's root, or else the root itself."""
+    body = root.find(_W_BODY)
+    if body is None:
+        return [root]
+    return [child for child in root if child is not body] + list(body)
+
+
+def find_placeholders(root, pattern: Pattern) -> Tuple[list, list, list]:
+    """
+    Locate the nodes of an XML element tree that contain a placeholder.
+
+    The tree is walked once, and every text and attribute value is matched with the
+    pattern of all placeholders (see compile_placeholders).
+
+    Args:
+        root: The root element of an XML part.
+        pattern (Pattern): The compiled placeholders.
+
+    Returns:
+        Tuple[list, list, list]: The paragraphs whose w:t text contains a placeholder
+        (possibly split across runs), the other texts as (element, is_tail) pairs (see
+        substitute_text) and the attributes as (element, name) pairs (see
+        substitute_attribute) that contain one.
+    """
+    paragraphs, texts, attributes = [], [], []
+    for element in root.iter():
+        if isinstance(element.tag, str):
+            if element.tag == _W_P and pattern.search(''.join(t.text or '' for t in paragraph_texts(element))):
+                paragraphs.append(element)
+            # w:t text is handled per paragraph
+            text = _ELEMENT_TEXT.__get__(element)
+            if element.tag != _W_T and text and pattern.search(text):
+                texts.append((element, False))
+            for name, value in element.items():
+                if pattern.search(value):
+                    attributes.append((element, name))
+        if element.tail and pattern.search(element.tail):
+            texts.append((element, True))
+    return paragraphs, texts, attributes
+
+
+def paragraph_texts(paragraph) -> list:
+    """The w:t elements of a paragraph, without those of paragraphs nested in it (e.g. in text boxes)."""
+    texts = []
+    for t in paragraph.iter(_W_T):
+        ancestor = t.getparent()
+        while ancestor is not None and ancestor.tag != _W_P:
+            ancestor = ancestor.getparent()
+        if ancestor is paragraph:
+            texts.append(t)
+    return texts
+
+
+def replace_in_paragraph(paragraph, pattern: Pattern, mapping: Dict[str, str]) -> bool:
+    """
+    Replace placeholders in the w:t texts of one paragraph, also across run boundaries.
+
+    The replacement goes into the run in which the placeholder starts; the rest of
+    the placeholder is removed from the following runs, so their formatting is kept.
+
+    Returns:
+        bool: True if anything was replaced.
+    """
+    texts = paragraph_texts(paragraph)
+    values = [t.text or '' for t in texts]
+    full = ''.join(values)
+    matches = list(pattern.finditer(full))
+    if not matches:
+        return False
+
+    starts = []
+    offset = 0
+    for value in values:
+        starts.append(offset)
+        offset += len(value)
+
+    def locate(position):
+        index = 0
+        while index + 1 < len(starts) and starts[index + 1] <= position:
+            index += 1
+        return index
+
+    # Later matches first, so the offsets of earlier ones stay valid
+    for match in reversed(matches):
+        first, last = locate(match.start()), locate(match.end() - 1)
+        head = values[first][:match.start() - starts[first]]
+        tail = values[last][match.end() - starts[last]:]
+        new = mapping[match.group(0)]
+        if first == last:
+            values[first] = head + new + tail
+        else:
+            values[first] = head + new
+            for index in range(first + 1, last):
+                values[index] = ''
+            values[last] = tail
+
+    for t, value in zip(texts, values):
+        if value != (t.text or ''):
+            t.text = value
+            if value != value.strip():
+                t.set(_XML_SPACE, 'preserve')
+    return True
+
+
+def substitute_text(element, is_tail: bool, pattern: Pattern, mapping: Dict[str, str]):
+    """Replace placeholders in the text (or the tail) of an element."""
+    def substitute(match):
+        return mapping[match.group(0)]
+    if is_tail:
+        element.tail = pattern.sub(substitute, element.tail or '')
+    else:
+        _ELEMENT_TEXT.__set__(element, pattern.sub(substitute, _ELEMENT_TEXT.__get__(element) or ''))
+
+
+def substitute_attribute(element, name: str, pattern: Pattern, mapping: Dict[str, str]):
+    """Replace placeholders in an attribute value of an element."""
+    element.set(name, pattern.sub(lambda match: mapping[match.group(0)], element.get(name, '')))
+
 
 @dataclass
 class WordReplacement:
@@ -24,14 +212,21 @@ class DocumentWordReplacer:
     A class for replacing multiple words in a Microsoft Word document.
 
     This class provides functionality to replace specified words throughout a Word document,
-    including in paragraphs, tables, headers, footers, and XML content.
+    including in paragraphs, tables, headers, footers, and XML content. Every part of the
+    package is visited once, so headers and footers shared by several sections are only
+    processed once, and placeholders split across several runs are replaced as well.
 
     Attributes:
-        file_path (str): The path to the Word document to be modified.
+        file_path (Optional[str]): The path to the Word document to be modified, if it is on disk.
         replacements (List[WordReplacement]): A list of WordReplacement objects.
+        compresslevel (int): zlib level for the rewritten XML parts, 0 stores them uncompressed.
+        profile (RunProfile): Receives the time spent replacing and the number of parts
+                              searched and changed.
     """
-    file_path: str
+    file_path: Optional[str] = None
     replacements: List[WordReplacement] = field(default_factory=list)
+    compresslevel: int = 6
+    profile: RunProfile = field(default_factory=RunProfile)
 
     def add_replacement(self, old_word: str, new_word: str):
         """
@@ -43,72 +238,134 @@ class DocumentWordReplacer:
         """
         self.replacements.append(WordReplacement(old_word, new_word))
 
-    def _replace_in_docx(self, doc: Document):
+    def _compile(self) -> Tuple[Optional[Pattern], Dict[str, str]]:
+        """
+        Compile all replacements into one pattern.
+
+        If a placeholder was added twice, the first replacement counts.
+
+        Returns:
+            Tuple[Optional[Pattern], Dict[str, str]]: The pattern (None if there is nothing
+            to replace) and the replacement of every placeholder.
+        """
+        mapping = {}
+        for replacement in self.replacements:
+            if replacement.old_word:
+                mapping.setdefault(replacement.old_word, replacement.new_word)
+        return compile_placeholders(mapping), mapping
+
+    @staticmethod
+    def _replace_in_tree(root, pattern: Pattern, mapping: Dict[str, str],
+                         search: Optional[PlaceholderBytes] = None) -> bool:
+        """
+        Replace placeholders in an XML element tree.
+
+        If search is given, the blocks of a document body (and every other tree as a
+        whole) are serialized first, and only those that may contain a placeholder
+        are walked. Serializing runs in C and is much faster than walking a body full
+        of large tables.
+
+        Returns:
+            bool: True if anything was replaced.
         """
-        Replace words in the Document object using python-docx.
+        roots = [root]
+        if search is not None:
+            roots = [block for block in _blocks(root)
+                     if search.found_in(etree.tostring(block, encoding='UTF-8', xml_declaration=False))]
+        changed = False
+        for block in roots:
+            paragraphs, texts, attributes = find_placeholders(block, pattern)
+            for paragraph in paragraphs:
+                changed |= replace_in_paragraph(paragraph, pattern, mapping)
+            for element, is_tail in texts:
+                substitute_text(element, is_tail, pattern, mapping)
+                changed = True
+            for element, name in attributes:
+                substitute_attribute(element, name, pattern, mapping)
+                changed = True
+        return changed
+
+    def _replace_in_xml_bytes(self, buffer: bytes, pattern: Pattern, mapping: Dict[str, str],
+                              search: PlaceholderBytes) -> Optional[bytes]:
+        """
+        Replace placeholders in a serialized XML part.
+
+        A part is only parsed if its raw bytes may contain a placeholder, whole or
+        split across runs (see PlaceholderBytes); all other parts are skipped on the
+        byte search alone.
 
-        This method replaces words in paragraphs, tables, headers, and footers.
+        Returns:
+            Optional[bytes]: The new part, or None if nothing was replaced.
+        """
+        if not search.found_in(buffer):
+            return None
+        root = etree.fromstring(buffer)
+        if not self._replace_in_tree(root, pattern, mapping):
+            return None
+        return etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+
+    def replace_in_document(self, doc: Document):
+        """
+        Replace words in an open python-docx Document, without writing it.
+
+        Every XML part of the package is visited exactly once.
 
         Args:
             doc (Document): A python-docx Document object.
         """
-        for paragraph in doc.paragraphs:
-            for replacement in self.replacements:
-                if replacement.old_word in paragraph.text:
-                    for run in paragraph.runs:
-                        if replacement.old_word in run.text:
-                            run.text = run.text.replace(replacement.old_word, replacement.new_word)
-
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for replacement in self.replacements:
-                        if replacement.old_word in cell.text:
-                            cell.text = cell.text.replace(replacement.old_word, replacement.new_word)
-
-        for section in doc.sections:
-            for header in section.header.paragraphs:
-                for replacement in self.replacements:
-                    if replacement.old_word in header.text:
-                        for run in header.runs:
-                            if replacement.old_word in run.text:
-                                run.text = run.text.replace(replacement.old_word, replacement.new_word)
-            
-            for footer in section.footer.paragraphs:
-                for replacement in self.replacements:
-                    if replacement.old_word in footer.text:
-                        for run in footer.runs:
-                            if replacement.old_word in run.text:
-                                run.text = run.text.replace(replacement.old_word, replacement.new_word)
-
-    def _replace_in_xml(self, temp_path: str, modified_path: str):
+        pattern, mapping = self._compile()
+        if not pattern:
+            return
+        search = PlaceholderBytes.of(mapping)
+        with self.profile.timer('replace'):
+            for part in doc.part.package.iter_parts():
+                if isinstance(part, XmlPart):
+                    changed = self._replace_in_tree(part._element, pattern, mapping, search)
+                elif part.partname.ext == 'xml':
+                    new_blob = self._replace_in_xml_bytes(part.blob, pattern, mapping, search)
+                    changed = new_blob is not None
+                    if changed:
+                        part._blob = new_blob
+                else:
+                    continue
+                self.profile.count('parts searched')
+                self.profile.count('parts replaced', changed)
+
+    def _replace_in_package(self, source_path: str, modified_path: str):
         """
-        Replace words in the XML content of the document.
+        Replace words in the XML parts of a .docx file and write the result once.
 
-        This method accesses and modifies the raw XML content of the document.
+        Only parts containing a placeholder are parsed and compressed again; all other
+        members, including the media, are copied as they are.
 
         Args:
-            temp_path (str): Path to the temporary file.
+            source_path (str): Path to the document to read.
             modified_path (str): Path where the modified document will be saved.
         """
-        with zipfile.ZipFile(temp_path, 'r') as zin:
-            with zipfile.ZipFile(modified_path, 'w') as zout:
-                for item in zin.infolist():
-                    buffer = zin.read(item.filename)
-                    if item.filename.endswith('.xml'):
-                        content = buffer.decode('utf-8')
-                        for replacement in self.replacements:
-                            content = re.sub(re.escape(replacement.old_word), replacement.new_word, content)
-                        buffer = content.encode('utf-8')
-                    zout.writestr(item, buffer)
+        pattern, mapping = self._compile()
+        replaced = {}
+        with self.profile.timer('replace'):
+            if pattern:
+                search = PlaceholderBytes.of(mapping)
+                with zipfile.ZipFile(source_path, 'r') as zin:
+                    for item in zin.infolist():
+                        if item.filename.endswith('.xml'):
+                            new_buffer = self._replace_in_xml_bytes(zin.read(item.filename), pattern, mapping,
+                                                                    search)
+                            self.profile.count('parts searched')
+                            if new_buffer is not None:
+                                replaced[item.filename] = new_buffer
+                self.profile.count('parts replaced', len(replaced))
+        with self.profile.timer('save'):
+            PackageRewriter(source_path, self.compresslevel).write(modified_path, replaced)
+        self.profile.count('bytes written', os.path.getsize(modified_path))
 
     def replace_words(self, folder_path) -> str:
         """
         Perform the word replacement process on the document.
 
-        This method orchestrates the entire replacement process, including
-        creating temporary files, calling other methods to perform replacements,
-        and cleaning up temporary files.
+        The document is read once, the replacements are made in memory and the
+        result is written once.
 
         Args:
             folder_path (str): The path to the folder where the modified document will be saved.
@@ -119,25 +376,18 @@ class DocumentWordReplacer:
         Raises:
             FileNotFoundError: If the specified Word document does not exist.
         """
-        if not os.path.exists(self.file_path):
+        if not self.file_path or not os.path.exists(self.file_path):
             raise FileNotFoundError(f"The file {self.file_path} does not exist.")
 
-        doc = Document(self.file_path)
-        self._replace_in_docx(doc)
-
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.docx') as tmp_file:
-            temp_path = tmp_file.name
-
-        doc.save(temp_path)
-
-        filename = os.path.basename(self.file_path)
         modified_filename = 'Report_output.docx'
         modified_path = os.path.join(folder_path, modified_filename)
-
-        self._replace_in_xml(temp_path, modified_path)
-
-        os.remove(temp_path)
-
+        if os.path.abspath(modified_path) == os.path.abspath(self.file_path):
+            # The package is read while the output is written, so never write over it directly
+            temp_path = modified_path + '.tmp'
+            self._replace_in_package(self.file_path, temp_path)
+            os.replace(temp_path, modified_path)
+        else:
+            self._replace_in_package(self.file_path, modified_path)
         return modified_path
 
 # Usage example
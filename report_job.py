@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+import threading
+import time
+
+# Stages of a report run, in the order they are first entered
+STAGES = ('export', 'replace', 'parse', 'tables', 'images', 'save')
+
+
+class ReportCancelled(Exception):
+    """Raised inside a report run once cancellation has been requested."""
+
+
+@dataclass
+class ProgressEvent:
+    """
+    A progress update of a report run.
+
+    Attributes:
+        stage (str): One of STAGES.
+        printout (Optional[int]): The printout number the stage works on, if any.
+        rows (int): Table rows written so far.
+        images (int): Images embedded so far.
+        rows_per_second (float): Rows written per second spent in the tables stage.
+        images_per_second (float): Images embedded per second spent in the images stage.
+        elapsed (float): Seconds since the run started.
+    """
+    stage: str
+    printout: Optional[int]
+    rows: int
+    images: int
+    rows_per_second: float
+    images_per_second: float
+    elapsed: float
+
+
+class ProgressTracker:
+    """
+    Collects the progress of a report run and carries its cancellation flag.
+
+    The converting code reports stages, rows and images; every change is passed
+    to the callback as a ProgressEvent. Updates from row and image counts are
+    throttled to the given interval. All methods are thread-safe.
+    """
+
+    def __init__(self, callback: Optional[Callable[[ProgressEvent], None]] = None, interval: float = 0.25):
+        """
+        Initialize the tracker.
+
+        Args:
+            callback (Optional[Callable[[ProgressEvent], None]]): Receives every progress update.
+            interval (float): Minimum seconds between throttled updates.
+        """
+        self.callback = callback
+        self.interval = interval
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._last_emit = 0.0
+        self._stage = None
+        self._stage_start = self._start
+        self._printout = None
+        self._stage_seconds: Dict[str, float] = {stage: 0.0 for stage in STAGES}
+        self.rows = 0
+        self.images = 0
+
+    def _stage_time(self, stage: str, now: float) -> float:
+        seconds = self._stage_seconds[stage]
+        if self._stage == stage:
+            seconds += now - self._stage_start
+        return seconds
+
+    def _event(self, stage: str, printout: Optional[int], now: float) -> ProgressEvent:
+        table_seconds = self._stage_time('tables', now)
+        image_seconds = self._stage_time('images', now)
+        return ProgressEvent(
+            stage, printout, self.rows, self.images,
+            self.rows / table_seconds if table_seconds else 0.0,
+            self.images / image_seconds if image_seconds else 0.0,
+            now - self._start)
+
+    def _emit(self, event: ProgressEvent):
+        if self.callback:
+            self.callback(event)
+
+    def stage(self, stage: str, printout: Optional[int] = None):
+        """
+        Report that the run has entered a stage.
+
+        The export stage runs on its own worker thread next to the conversion, so it
+        is reported but not timed.
+
+        Args:
+            stage (str): One of STAGES.
+            printout (Optional[int]): The printout number the stage works on, if any.
+
+        Raises:
+            ReportCancelled: If cancellation has been requested.
+        """
+        self.check_cancelled()
+        now = time.perf_counter()
+        with self._lock:
+            if stage != 'export':
+                if self._stage is not None:
+                    self._stage_seconds[self._stage] += now - self._stage_start
+                self._stage, self._stage_start, self._printout = stage, now, printout
+            self._last_emit = now
+            event = self._event(stage, printout, now)
+        self._emit(event)
+
+    def add_rows(self, count: int):
+        """Count written table rows. Raises ReportCancelled if cancellation has been requested."""
+        self._add(count, 0)
+
+    def add_images(self, count: int = 1):
+        """Count embedded images. Raises ReportCancelled if cancellation has been requested."""
+        self._add(0, count)
+
+    def _add(self, rows: int, images: int):
+        self.check_cancelled()
+        now = time.perf_counter()
+        with self._lock:
+            self.rows += rows
+            self.images += images
+            if now - self._last_emit < self.interval or self._stage is None:
+                return
+            self._last_emit = now
+            event = self._event(self._stage, self._printout, now)
+        self._emit(event)
+
+    def cancel(self):
+        """Request cancellation; the run stops at its next progress report."""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        """
+        Raises:
+            ReportCancelled: If cancellation has been requested.
+        """
+        if self.cancel_event.is_set():
+            raise ReportCancelled()
+
+
+class ReportJob:
+    """
+    Runs RepGen.generate_rfem_report_as_html, or RepGen.update_rfem_report, on a
+    background thread without any GUI.
+
+    The GUI wraps the same job in a QThread (see gui.report_worker); scripts and
+    tests can use start(), wait() and cancel() directly.
+    """
+
+    def __init__(self, rep_gen, on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+                 update: bool = False):
+        """
+        Initialize the job.
+
+        Args:
+            rep_gen (RepGen): The configured report generator.
+            on_progress (Optional[Callable[[ProgressEvent], None]]): Receives progress updates,
+                                                                     on the job's thread.
+            update (bool): If True, the existing report is updated instead of generated anew.
+        """
+        self.rep_gen = rep_gen
+        self.update = update
+        self.progress = ProgressTracker(on_progress)
+        rep_gen.progress = self.progress
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def run(self) -> Optional[str]:
+        """
+        Run the report generation on the calling thread.
+
+        Returns:
+            Optional[str]: The path to the finished report, or None if the job was cancelled.
+        """
+        try:
+            if self.update:
+                self.result = self.rep_gen.update_rfem_report()
+            else:
+                self.result = self.rep_gen.generate_rfem_report_as_html()
+        except ReportCancelled:
+            self.result = None
+        except Exception as e:
+            self.error = e
+            raise
+        return self.result
+
+    def start(self):
+        """Start the job on a background thread."""
+        def target():
+            try:
+                self.run()
+            except Exception:
+                pass  # kept in self.error and re-raised by wait()
+
+        self._thread = threading.Thread(target=target, name="report-job", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """Request cancellation of the running job."""
+        self.progress.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.progress.cancelled
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Wait for a started job to finish.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait, or None to wait until it finishes.
+
+        Returns:
+            Optional[str]: The path to the finished report, or None if the job was cancelled.
+
+        Raises:
+            Exception: The error the job failed with, if any.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
@@ -0,0 +1,258 @@
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional
+from docx.document import Document
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+import hashlib
+import json
+import os
+from html_table import HTMLCell
+from body_spill import BodySpill
+
+# Sidecar file written next to a report, holding the fingerprints of its sections
+SIDECAR_SUFFIX = '.fsrg.json'
+
+# Bump when fingerprints or bookmarks change, so older reports are regenerated in full
+_FORMAT = 2
+
+# The attributes through which pictures refer to their image relationship. Reports are
+# searched with tag-filtered iter() walks: XPath queries over the whole document fail once
+# it has tens of millions of nodes.
+_IMAGE_REFERENCES = {
+    qn('a:blip'): (qn('r:embed'), qn('r:link')),
+    '{urn:schemas-microsoft-com:vml}imagedata': (qn('r:id'),),
+}
+
+
+@dataclass
+class ReportSection:
+    """
+    A table or image section of a report, with the fingerprint of its content.
+
+    Attributes:
+        key (str): '<printout>.t<n>' for the n-th table or '<printout>.i<n>' for the
+                   n-th image of a printout.
+        kind (str): 'table' or 'image'.
+        title (str): The table heading or the image caption.
+        digest (str): Hash of the normalized table rows or of the PNG bytes and caption.
+        width (Optional[int]): For a table, the width in EMU it was laid out for, so that
+                               a rewritten table gets the same column widths.
+    """
+    key: str
+    kind: str
+    title: str
+    digest: str
+    width: Optional[int] = None
+
+    @property
+    def number(self) -> int:
+        """The n of the key: the position of the section among those of its kind, from 1."""
+        return int(self.key.rsplit('.', 1)[1][1:])
+
+    @property
+    def bookmark(self) -> str:
+        """The name of the hidden bookmark enclosing the section in the report."""
+        return '_fsrg_' + self.key.replace('.', '_')
+
+
+class TableDigest:
+    """
+    Fingerprint a table section row by row, while its rows are written.
+
+    The digest covers the heading placed above the table, the normalized rows as
+    written to the report and the settings the table was split or shortened with.
+    """
+
+    def __init__(self, title: str):
+        self._hash = hashlib.sha256(f'[{json.dumps(title, ensure_ascii=False)}, '.encode('utf-8'))
+        self._rows = 0
+
+    def update(self, row: List[HTMLCell]):
+        """Add the next normalized row."""
+        cells = json.dumps([[cell.text, cell.colspan, cell.color] for cell in row], ensure_ascii=False)
+        self._hash.update(((', ' if self._rows else '[') + cells).encode('utf-8'))
+        self._rows += 1
+
+    def rows(self, rows: Iterable[List[HTMLCell]]) -> Iterator[List[HTMLCell]]:
+        """Pass the rows through, adding each one as it is read."""
+        for row in rows:
+            self.update(row)
+            yield row
+
+    def hexdigest(self, layout: Optional[Dict] = None, has_rows: bool = True) -> str:
+        """
+        Args:
+            layout (Optional[Dict]): The settings the table was split or shortened with,
+                                     see table_builder.TableLayoutOptions.layout.
+            has_rows (bool): False for a table without any rows.
+
+        Returns:
+            str: The hex digest.
+        """
+        digest = self._hash.copy()
+        tail = 'null' if not has_rows else ']' if self._rows else '[]'
+        if layout:
+            tail += ', ' + json.dumps(layout, sort_keys=True)
+        digest.update((tail + ']').encode('utf-8'))
+        return digest.hexdigest()
+
+
+def image_digest(path: str, caption: str, layout: Optional[Dict] = None) -> str:
+    """
+    Fingerprint an image section by the bytes of the exported PNG and its caption.
+
+    Args:
+        path (str): The exported (not the prepared) image.
+        caption (str): The caption placed below the image.
+        layout (Optional[Dict]): The image layout settings that differ from the defaults,
+                                 see image_layout.ImageLayoutOptions.layout.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256(caption.encode('utf-8'))
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    if layout:
+        digest.update(json.dumps(layout, sort_keys=True).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def sidecar_path(report_path: str) -> str:
+    return os.path.splitext(report_path)[0] + SIDECAR_SUFFIX
+
+
+@dataclass
+class ReportManifest:
+    """
+    What a report was generated from, saved next to it for incremental updates.
+
+    Attributes:
+        template (str): The digest of the template (see template_cache.template_digest).
+        metadata (Dict[str, str]): The value of every metadata placeholder.
+        sections (List[ReportSection]): The sections of the report, in order.
+    """
+    template: str
+    metadata: Dict[str, str]
+    sections: List[ReportSection] = field(default_factory=list)
+
+    def same_layout(self, other: 'ReportManifest') -> bool:
+        """
+        Whether other has the same template, metadata and sequence of sections, so
+        that a report can be updated by rewriting only the sections whose digest differs.
+        """
+        return (self.template == other.template and self.metadata == other.metadata
+                and [(s.key, s.kind, s.title) for s in self.sections]
+                == [(s.key, s.kind, s.title) for s in other.sections])
+
+    def save(self, path: str):
+        """Write the manifest, replacing any previous one only once it is complete."""
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({'format': _FORMAT, 'template': self.template, 'metadata': self.metadata,
+                       'sections': [asdict(section) for section in self.sections]},
+                      file, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ReportManifest']:
+        """
+        Read a manifest.
+
+        Returns:
+            Optional[ReportManifest]: The manifest, or None if it is missing, unreadable
+            or was written by an incompatible version.
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != _FORMAT:
+            return None
+        return cls(data['template'], data['metadata'], [ReportSection(**section) for section in data['sections']])
+
+
+def next_bookmark_id(doc: Document) -> int:
+    """Return a bookmark id not used in the main document part yet, spilled content included."""
+    ids = (start.get(qn('w:id'), '') for start in doc.element.iter(qn('w:bookmarkStart')))
+    used = max((int(value) for value in ids if value.lstrip('-').isdigit()), default=0)
+    spill = BodySpill.of(doc)
+    return max(used, spill.max_bookmark_id if spill else 0) + 1
+
+
+def add_bookmark_start(doc: Document, name: str, bookmark_id: int):
+    """Append a body-level bookmark start to the end of the document."""
+    start = OxmlElement('w:bookmarkStart', {qn('w:id'): str(bookmark_id), qn('w:name'): name})
+    doc.element.body.insert_element_before(start, 'w:sectPr')
+    return start
+
+
+def add_bookmark_end(doc: Document, bookmark_id: int):
+    """Append the body-level end of a bookmark to the end of the document."""
+    end = OxmlElement('w:bookmarkEnd', {qn('w:id'): str(bookmark_id)})
+    doc.element.body.insert_element_before(end, 'w:sectPr')
+    return end
+
+
+def bookmark_range(doc: Document, name: str) -> Optional[list]:
+    """
+    Return the body elements of a section, from its bookmark start to its bookmark end.
+
+    Returns:
+        Optional[list]: The elements, both bookmark elements included, or None if the
+        bookmark is missing (e.g. removed while editing the report in Word).
+    """
+    body = doc.element.body
+    for start in body.iterchildren(qn('w:bookmarkStart')):
+        if start.get(qn('w:name')) == name:
+            break
+    else:
+        return None
+    bookmark_id = start.get(qn('w:id'))
+    elements = [start]
+    for element in start.itersiblings():
+        elements.append(element)
+        if element.tag == qn('w:bookmarkEnd') and element.get(qn('w:id')) == bookmark_id:
+            return elements
+    return None
+
+
+def replace_range(old: list, new: list):
+    """
+    Move the elements of new to the position of old and remove old.
+
+    Returns:
+        set: The image relationship ids referenced by the removed elements.
+    """
+    anchor = old[0]
+    for element in new:
+        anchor.addprevious(element)
+    rel_ids = set()
+    for element in old:
+        rel_ids.update(_image_references(element))
+        element.getparent().remove(element)
+    return rel_ids
+
+
+def _image_references(element) -> Iterator[str]:
+    """The image relationship ids referenced by element and its descendants."""
+    for node in element.iter(*_IMAGE_REFERENCES):
+        for name in _IMAGE_REFERENCES[node.tag]:
+            value = node.get(name)
+            if value:
+                yield value
+
+
+def drop_unused_relationships(doc: Document, rel_ids):
+    """
+    Drop image relationships of the main document part that are no longer referenced,
+    so replaced images are not written to the report again.
+    """
+    if not rel_ids:
+        return
+    used = set(_image_references(doc.element))
+    for rel_id in rel_ids:
+        if rel_id not in used and rel_id in doc.part.rels:
+            del doc.part.rels[rel_id]
@@ -0,0 +1,33 @@
+"""
+Access to the RFEM API, or to the local fake service when FSRG_FAKE_RFEM is set.
+
+RFEM is only imported when it is first needed, so the rest of the generator runs
+on machines without it.
+"""
+from fake_rfem import FakeRFEM
+
+
+def init_model():
+    """
+    The RFEM.initModel module, with Client, Model and openFile.
+
+    Returns the fake RFEM service instead if FSRG_FAKE_RFEM is set.
+    """
+    fake = FakeRFEM.from_environment()
+    if fake is not None:
+        return fake
+    from RFEM import initModel
+    return initModel
+
+
+def printout_report():
+    """
+    The RFEM PrintoutReport class, with exportToHTML.
+
+    Returns the one of the fake RFEM service instead if FSRG_FAKE_RFEM is set.
+    """
+    fake = FakeRFEM.from_environment()
+    if fake is not None:
+        return fake.PrintoutReport
+    from RFEM.Reports.printoutReport import PrintoutReport
+    return PrintoutReport
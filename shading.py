@@ -0,0 +1,106 @@
+from functools import lru_cache
+from typing import List, Optional
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+import re
+
+_HEX_COLOR = re.compile(r'^#([0-9a-fA-F]{6}|[0-9a-fA-F]{3})$')
+_BACKGROUND = re.compile(r'background-color\s*:\s*([^;]+)', re.IGNORECASE)
+
+# Elements that follow w:shd inside w:tcPr, in schema order
+_TCPR_AFTER_SHD = ('w:noWrap', 'w:tcMar', 'w:textDirection', 'w:tcFitText', 'w:vAlign',
+                   'w:hideMark', 'w:headers', 'w:cellIns', 'w:cellDel', 'w:cellMerge', 'w:tcPrChange')
+
+
+@lru_cache(maxsize=256)
+def normalize_fill(color: Optional[str]) -> Optional[str]:
+    """
+    Normalize a CSS color to the upper-case six digit hex form used by w:shd.
+
+    Only '#RRGGBB' and '#RGB' are accepted, as by the original converter; cells
+    coloured in other notations, such as 'rgb(r, g, b)', are not shaded.
+
+    Args:
+        color (Optional[str]): The CSS color.
+
+    Returns:
+        Optional[str]: The fill, e.g. 'FFCC00', or None if the color is not understood.
+    """
+    if not color:
+        return None
+    color = color.strip()
+    match = _HEX_COLOR.match(color)
+    if match:
+        digits = match.group(1)
+        if len(digits) == 3:
+            digits = ''.join(digit * 2 for digit in digits)
+        return digits.upper()
+    return None
+
+
+def style_fill(style: str) -> Optional[str]:
+    """
+    Extract the background-color fill from an inline style attribute.
+
+    Args:
+        style (str): The value of the element's style attribute.
+
+    Returns:
+        Optional[str]: The normalized fill, or None.
+    """
+    if 'background-color' not in style.lower():
+        return None
+    match = _BACKGROUND.search(style)
+    return normalize_fill(match.group(1)) if match else None
+
+
+def row_fills(row: list) -> List[Optional[str]]:
+    """
+    Decide the fill of every cell of a normalized row.
+
+    A row takes its colour from the cell starting in the second grid column:
+    if that cell is filled, every cell starting after it gets the same fill.
+    All other cells keep their own fill.
+
+    Args:
+        row (list): The cells of the row, each with colspan and color attributes.
+
+    Returns:
+        List[Optional[str]]: One fill per cell.
+    """
+    fills = [cell.color for cell in row]
+    if len(row) > 1 and row[0].colspan == 1 and row[1].color:
+        row_color = row[1].color
+        fills[2:] = [row_color] * (len(row) - 2)
+    return fills
+
+
+@lru_cache(maxsize=256)
+def shading_xml(fill: str) -> str:
+    """
+    The w:shd element for a fill, built once per distinct fill.
+
+    Args:
+        fill (str): The normalized fill.
+
+    Returns:
+        str: The w:shd element as a string.
+    """
+    return f'<w:shd w:val="clear" w:fill="{fill}"/>'
+
+
+def set_cell_fill(tc, fill: str):
+    """
+    Set the background fill of a table cell, replacing any fill it already has.
+
+    Args:
+        tc: The w:tc element.
+        fill (str): The fill as a hex string without '#'.
+    """
+    tcPr = tc.get_or_add_tcPr()
+    shading = tcPr.find(qn('w:shd'))
+    if shading is None:
+        shading = OxmlElement('w:shd')
+        tcPr.insert_element_before(shading, *_TCPR_AFTER_SHD)
+    shading.set(qn('w:val'), 'clear')
+    shading.set(qn('w:fill'), fill)
@@ -0,0 +1,251 @@
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, List, Optional
+from xml.sax.saxutils import escape
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.shared import Length
+import re
+from html_table import HTMLCell
+from shading import row_fills, shading_xml
+
+# Characters that are not allowed in XML 1.0 and that python-docx would reject
+_INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Bump when the generated table XML changes, including changes to how html_table and
+# shading read the HTML, so that tables cached by table_cache are converted again
+FRAGMENT_VERSION = 4
+
+_TBL_LOOK = ('<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+             'w:noHBand="0" w:noVBand="1" w:val="04A0"/>')
+
+
+@dataclass
+class TableLayoutOptions:
+    """
+    How large tables are written.
+
+    Attributes:
+        chunk_rows (int): Rows parsed into the document at a time. Tables with more rows
+                          are streamed from the HTML instead of being read as a whole.
+        split_rows (int): Rows per Word table, not counting the repeated header rows. Longer
+                          tables continue in a new table below a "(continued)" line. 0 never
+                          splits. The default keeps ordinary result tables whole and splits
+                          the tens of thousands of rows Word would take minutes to lay out
+                          as one table.
+        row_budget (int): Rows written per HTML table, not counting its header rows. The
+                          remaining rows are left out and summarised in one line. 0 writes
+                          every row.
+        repeat_header (bool): Repeat the header rows (rows of <th> cells) at the top of every
+                              page and of every continuation table. If False, they are only
+                              written once, at the top of the first table.
+    """
+    chunk_rows: int = 1000
+    split_rows: int = 2000
+    row_budget: int = 0
+    repeat_header: bool = True
+
+    def layout(self, header_rows: int, row_count: int) -> dict:
+        """
+        The settings that change how a table with the given numbers of header and normalized
+        rows is written, empty if it is written as one plain table.
+        """
+        layout = {}
+        if self.repeat_header and header_rows:
+            layout['header_rows'] = header_rows
+        if self.split_rows and row_count - header_rows > self.split_rows:
+            layout['split_rows'] = self.split_rows
+        if self.row_budget and row_count - header_rows > self.row_budget:
+            layout['row_budget'] = self.row_budget
+            layout['row_count'] = row_count
+        return layout
+
+
+@dataclass
+class TableWriteResult:
+    """
+    What write_table wrote.
+
+    Attributes:
+        rows (int): Table rows written, repeated header rows included.
+        omitted (int): Rows left out because of the row budget.
+        tables (int): Word tables written, continuation tables included.
+        cells (int): Table cells written.
+    """
+    rows: int = 0
+    omitted: int = 0
+    tables: int = 0
+    cells: int = 0
+
+
+def _run_xml(text: str) -> str:
+    """
+    Build the runs of a cell paragraph the way python-docx's cell.text setter does,
+    turning line breaks and tabs into w:br and w:tab.
+    """
+    if not text:
+        return ''
+    text = _INVALID_XML_CHARS.sub('', text)
+    parts = []
+    for line_idx, line in enumerate(text.split('\n')):
+        if line_idx:
+            parts.append('<w:br/>')
+        for tab_idx, chunk in enumerate(line.split('\t')):
+            if tab_idx:
+                parts.append('<w:tab/>')
+            if chunk:
+                space = ' xml:space="preserve"' if chunk != chunk.strip() else ''
+                parts.append(f'<w:t{space}>{escape(chunk)}</w:t>')
+    return f"<w:r>{''.join(parts)}</w:r>"
+
+
+def cell_xml(text: str, col_width: int, span: int = 1, fill: Optional[str] = None) -> str:
+    """
+    Build the XML of one table cell.
+
+    Args:
+        text (str): The cell text.
+        col_width (int): Width of one grid column in twips.
+        span (int): Number of grid columns the cell spans.
+        fill (Optional[str]): Background color as a hex string without '#', if any.
+
+    Returns:
+        str: The w:tc element as a string.
+    """
+    props = f'<w:tcW w:type="dxa" w:w="{col_width * span}"/>'
+    if span > 1:
+        props += f'<w:gridSpan w:val="{span}"/>'
+    if fill:
+        props += shading_xml(fill)
+    return f'<w:tc><w:tcPr>{props}</w:tcPr><w:p>{_run_xml(text)}</w:p></w:tc>'
+
+
+def row_xml(row_cells: List[HTMLCell], col_width: int, header: bool = False) -> str:
+    """
+    Build the XML of one table row, with the row colour applied as decided by shading.row_fills.
+
+    Args:
+        row_cells (List[HTMLCell]): The cells of a normalized row.
+        col_width (int): Width of one grid column in twips.
+        header (bool): Repeat the row at the top of every page the table continues on.
+
+    Returns:
+        str: The w:tr element as a string.
+    """
+    fills = row_fills(row_cells)
+    tcs = ''.join(cell_xml(cell.text, col_width, cell.colspan, fill) for cell, fill in zip(row_cells, fills))
+    props = '<w:trPr><w:tblHeader/></w:trPr>' if header else ''
+    return f'<w:tr>{props}{tcs}</w:tr>'
+
+
+def _column_width(max_columns: int, width: Length) -> int:
+    return Length(width // max_columns).twips if max_columns else 0
+
+
+def _table_xml(max_columns: int, col_width: int, style_id: Optional[str], trs: str = '') -> str:
+    style = f'<w:tblStyle w:val="{escape(style_id)}"/>' if style_id else ''
+    grid = f'<w:gridCol w:w="{col_width}"/>' * max_columns
+    return (f'<w:tbl {nsdecls("w")}>'
+            f'<w:tblPr>{style}<w:tblW w:type="auto" w:w="0"/>{_TBL_LOOK}</w:tblPr>'
+            f'<w:tblGrid>{grid}</w:tblGrid>'
+            f'{trs}'
+            f'</w:tbl>')
+
+
+def note_xml(text: str) -> str:
+    """
+    Build the XML of an italic paragraph, as used for continuation and summary lines.
+
+    Args:
+        text (str): The paragraph text.
+
+    Returns:
+        str: The w:p element as a string.
+    """
+    return f'<w:p {nsdecls("w")}>{_run_xml(text).replace("<w:r>", "<w:r><w:rPr><w:i/></w:rPr>", 1)}</w:p>'
+
+
+def write_table(body, rows: Iterable[List[HTMLCell]], max_columns: int, style_id: Optional[str], width: Length,
+                header_rows: int = 0, row_count: Optional[int] = None, options: Optional[TableLayoutOptions] = None,
+                title: str = '', on_rows: Optional[Callable[[int], None]] = None) -> TableWriteResult:
+    """
+    Append a table to the document body a chunk of rows at a time.
+
+    Only one chunk of row XML is held at a time, so the rows can be produced lazily
+    while the table is written. A table with more rows than options.split_rows continues
+    in new tables, each below an italic "<title> (continued)" line and, if
+    options.repeat_header is set, starting with copies of the header rows. Rows beyond
+    options.row_budget are not read; an italic line below the last table says how many
+    were left out.
+
+    Args:
+        body (CT_Body): The document body; elements are added before its final w:sectPr.
+        rows (Iterable[List[HTMLCell]]): The normalized rows, header rows first.
+        max_columns (int): The number of grid columns of the table.
+        style_id (Optional[str]): The id of the table style, e.g. 'TableGrid'.
+        width (Length): The available width for the table.
+        header_rows (int): How many of the first rows are header rows.
+        row_count (Optional[int]): The number of rows, to count the rows left out without
+                                   reading them. If None, they are read and counted.
+        options (Optional[TableLayoutOptions]): The chunk, split and budget settings, defaults if None.
+        title (str): The table heading, repeated in the continuation lines.
+        on_rows (Optional[Callable[[int], None]]): Called with the number of rows of every chunk written.
+
+    Returns:
+        TableWriteResult: The numbers of rows, tables and cells written and of rows left out.
+    """
+    options = options or TableLayoutOptions()
+    chunk_rows = max(1, options.chunk_rows)
+    col_width = _column_width(max_columns, width)
+    result = TableWriteResult()
+    rows = iter(rows)
+    header = list(islice(rows, header_rows))
+    header_trs = ''.join(row_xml(row, col_width, options.repeat_header) for row in header)
+    header_cells = sum(len(row) for row in header)
+
+    def add(element: str):
+        return body.insert_element_before(parse_xml(element), 'w:sectPr')
+
+    def new_table(continued: bool):
+        if continued:
+            add(note_xml(f"{title} (continued)"))
+        result.tables += 1
+        if continued and not options.repeat_header:
+            return add(_table_xml(max_columns, col_width, style_id))
+        result.rows += len(header)
+        result.cells += header_cells
+        return add(_table_xml(max_columns, col_width, style_id, header_trs))
+
+    def append_rows(tbl, trs: List[str]):
+        tbl.extend(parse_xml(f'<w:tbl {nsdecls("w")}>{"".join(trs)}</w:tbl>').tr_lst)
+        result.rows += len(trs)
+        if on_rows:
+            on_rows(len(trs))
+
+    tbl = new_table(False)
+    if on_rows and header:
+        on_rows(len(header))
+    trs: List[str] = []
+    in_table = written = 0
+    for row in islice(rows, options.row_budget or None):
+        if options.split_rows and in_table >= options.split_rows:
+            append_rows(tbl, trs)
+            trs = []
+            tbl = new_table(True)
+            in_table = 0
+        trs.append(row_xml(row, col_width))
+        result.cells += len(row)
+        in_table += 1
+        written += 1
+        if len(trs) >= chunk_rows:
+            append_rows(tbl, trs)
+            trs = []
+    if trs:
+        append_rows(tbl, trs)
+    if options.row_budget:
+        result.omitted = (row_count - header_rows - written if row_count is not None
+                          else sum(1 for _ in rows))
+    if result.omitted:
+        add(note_xml(f"{result.omitted} of {written + result.omitted} rows of {title or 'the table'} "
+                     f"are not shown."))
+    return result
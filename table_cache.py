@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from typing import List, Optional
+from bs4 import Tag
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from table_builder import FRAGMENT_VERSION, TableLayoutOptions
+
+_ENTRY_SUFFIX = '.tbl'
+
+
+@dataclass
+class CachedTable:
+    """
+    A converted table, as stored in the cache.
+
+    Attributes:
+        digest (str): The fingerprint of the report section (see report_sections.TableDigest).
+        rows (int): The number of table rows written.
+        heading (bool): Whether the heading was written, False if the HTML table had no rows.
+        xml (Optional[bytes]): The elements written below the heading, the Word tables with their
+                               continuation and summary lines, serialized inside a w:body
+                               element. None if all cells were empty.
+    """
+    digest: str
+    rows: int
+    heading: bool
+    xml: Optional[bytes]
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({'digest': self.digest, 'rows': self.rows, 'heading': self.heading,
+                             'table': self.xml is not None})
+        return header.encode('utf-8') + b'\n' + (self.xml or b'')
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CachedTable':
+        header, _, xml = data.partition(b'\n')
+        fields = json.loads(header)
+        return cls(fields['digest'], fields['rows'], fields['heading'], xml if fields['table'] else None)
+
+
+class TableSourceLocator:
+    """
+    Find the source text of parsed tables in the HTML they were parsed from.
+
+    html.parser records the line and column at which every tag starts. A table's
+    source runs from its own start to the start of the next tag after it, so the
+    text is sliced out without serializing the parsed tree again.
+    """
+
+    def __init__(self, html_text: str):
+        self.html_text = html_text
+        self._line_starts: Optional[List[int]] = None
+
+    def _offset(self, element: Tag) -> Optional[int]:
+        if element.sourceline is None or element.sourcepos is None:
+            return None
+        if self._line_starts is None:
+            self._line_starts = [0] + [match.end() for match in re.finditer('\n', self.html_text)]
+        return self._line_starts[element.sourceline - 1] + element.sourcepos
+
+    def source(self, element: Tag) -> Optional[str]:
+        """
+        Return the source text of a parsed element, or None if the parser did not record
+        its position.
+        """
+        start = self._offset(element)
+        if start is None:
+            return None
+        node = element
+        while node is not None and node.next_sibling is None:
+            node = node.parent
+        following = None
+        if node is not None:
+            following = node.next_sibling
+            if not isinstance(following, Tag):
+                following = following.find_next()
+        end = self._offset(following) if following is not None else len(self.html_text)
+        if end is None or end <= start:
+            return None
+        return self.html_text[start:end]
+
+
+class TableFragmentCache:
+    """
+    A persistent, content-addressed cache of converted Word tables.
+
+    Entries are keyed by a hash of the table source and every setting that affects the
+    generated XML (title, table style, width, layout options and the builder version),
+    so a hit can be inserted into the document as it is. The least recently used entries
+    are removed once the cache grows beyond max_bytes. Several processes may share the folder;
+    entries are written atomically, but the size limit is then only approximate.
+
+    Attributes:
+        folder (str): The cache folder.
+        max_bytes (int): The size limit, 0 disables the cache.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to convert the table.
+        evictions (int): Entries removed to stay below the size limit.
+    """
+
+    def __init__(self, folder: Optional[str] = None, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the cache.
+
+        Args:
+            folder (Optional[str]): The cache folder, a folder in the temporary directory if None.
+            max_bytes (int): The size limit, 0 disables the cache.
+        """
+        self.folder = folder or os.path.join(tempfile.gettempdir(), 'fsrg_table_cache')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source: str, title: str, style_id: Optional[str], width: int,
+            options: Optional[TableLayoutOptions] = None) -> str:
+        """
+        The cache key of a table.
+
+        Args:
+            source (str): The HTML source of the table.
+            title (str): The heading placed above the table.
+            style_id (Optional[str]): The table style.
+            width (int): The table width in EMU.
+            options (Optional[TableLayoutOptions]): How large tables are split and shortened.
+        """
+        options = options or TableLayoutOptions()
+        layout = [options.split_rows, options.row_budget, options.repeat_header]
+        digest = hashlib.sha256(json.dumps([FRAGMENT_VERSION, title, style_id, width, layout]).encode('utf-8'))
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key + _ENTRY_SUFFIX)
+
+    def get(self, key: str) -> Optional[CachedTable]:
+        """
+        Look up a table, marking it as recently used.
+
+        Returns:
+            Optional[CachedTable]: The cached table, or None on a miss.
+        """
+        if not self.max_bytes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = CachedTable.from_bytes(file.read())
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, entry: CachedTable):
+        """Store a converted table, evicting old entries if the cache grows too large."""
+        if not self.max_bytes:
+            return
+        data = entry.to_bytes()
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Could not cache a converted table: {e}")
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> list:
+        entries = []
+        try:
+            with os.scandir(self.folder) as scan:
+                for item in scan:
+                    if item.name.endswith(_ENTRY_SUFFIX):
+                        try:
+                            stat = item.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, item.path))
+        except OSError:
+            pass
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache is at 90% of its limit."""
+        entries = sorted(self._entries())
+        size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, entry_size, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except OSError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            for _, _, path in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0.0
+        return f"Table cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), {self.evictions} evicted"
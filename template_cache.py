@@ -0,0 +1,269 @@
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+from docx import Document
+from docx.document import Document as DocxDocument
+from docx.opc.part import XmlPart
+from docx.oxml.ns import qn
+from lxml import etree
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from docx_package import SaveOptions, save_document
+from replacement import (compile_placeholders, find_placeholders, replace_in_paragraph,
+                         substitute_attribute, substitute_text)
+
+# The metadata placeholders of the report template
+TEMPLATE_PLACEHOLDERS = ('Projekttitel', 'Berichttitel', 'XXXX-BHE-XX-XX-XX-X-XXXX', 'Projektnummer', '[Author]')
+
+# Bump when the compiled artifact changes, so stale cache entries are not used
+_FORMAT = 1
+
+_compiled: Dict[str, 'CompiledTemplate'] = {}
+_compiled_lock = threading.Lock()
+
+
+def remove_trailing_section(doc: DocxDocument):
+    """
+    Remove the final section properties of the document body, so that the content
+    appended to the template continues its last page.
+
+    Args:
+        doc (DocxDocument): The document to change.
+    """
+    for element in reversed(doc.element.body):
+        if element.tag == qn('w:sectPr'):
+            doc.element.body.remove(element)
+            break
+
+
+@dataclass
+class PlaceholderLocation:
+    """
+    Where a placeholder occurs in the compiled template.
+
+    Attributes:
+        part (str): The part name, e.g. '/word/header1.xml'.
+        kind (str): 'paragraph' for w:t text of a paragraph, 'text' or 'tail' for other
+                    element text, 'attribute' for an attribute value.
+        path (List[int]): Child indexes leading from the part root to the element.
+        attribute (Optional[str]): The attribute name, for kind 'attribute'.
+    """
+    part: str
+    kind: str
+    path: List[int]
+    attribute: Optional[str] = None
+
+
+def _path_of(element) -> List[int]:
+    path = []
+    parent = element.getparent()
+    while parent is not None:
+        path.append(parent.index(element))
+        element, parent = parent, parent.getparent()
+    return path[::-1]
+
+
+def _element_at(root, path: List[int]):
+    element = root
+    for index in path:
+        element = element[index]
+    return element
+
+
+def _xml_parts(doc: DocxDocument) -> Iterable[Tuple[str, object, object]]:
+    """Yield the name, the part and the root element of every XML part of the document."""
+    for part in doc.part.package.iter_parts():
+        if isinstance(part, XmlPart):
+            yield str(part.partname), part, part._element
+        elif part.partname.ext == 'xml':
+            yield str(part.partname), part, etree.fromstring(part.blob)
+
+
+class CompiledTemplate:
+    """
+    A report template prepared once for many reports.
+
+    The trailing section of the template is already removed and the location of
+    every placeholder is known, so a new report is a copy of the template in memory
+    with the metadata substituted at those locations, without searching the document.
+    """
+
+    def __init__(self, blob: bytes, placeholders: Tuple[str, ...], locations: List[PlaceholderLocation]):
+        """
+        Initialize the compiled template.
+
+        Args:
+            blob (bytes): The .docx package with the trailing section removed.
+            placeholders (Tuple[str, ...]): The placeholders that were located.
+            locations (List[PlaceholderLocation]): Where they occur.
+        """
+        self.blob = blob
+        self.placeholders = placeholders
+        self.locations = locations
+        # The cache key, set by load_template
+        self.digest: Optional[str] = None
+
+    @classmethod
+    def compile(cls, template_path: str, placeholders: Tuple[str, ...] = TEMPLATE_PLACEHOLDERS) -> 'CompiledTemplate':
+        """
+        Remove the trailing section of a template and locate its placeholders.
+
+        Args:
+            template_path (str): The path to the .docx template.
+            placeholders (Tuple[str, ...]): The placeholders to locate.
+
+        Returns:
+            CompiledTemplate: The compiled template.
+        """
+        doc = Document(template_path)
+        remove_trailing_section(doc)
+        buffer = io.BytesIO()
+        # Opened for every report and never shown to the user, so it is not compressed
+        save_document(doc, buffer, SaveOptions.intermediate())
+        blob = buffer.getvalue()
+
+        # Locate on a fresh load, so the paths match the documents created from the blob
+        locations = []
+        pattern = compile_placeholders(placeholders)
+        for name, _, root in _xml_parts(Document(io.BytesIO(blob))):
+            if not pattern:
+                break
+            paragraphs, texts, attributes = find_placeholders(root, pattern)
+            locations.extend(PlaceholderLocation(name, 'paragraph', _path_of(p)) for p in paragraphs)
+            locations.extend(PlaceholderLocation(name, 'tail' if is_tail else 'text', _path_of(element))
+                             for element, is_tail in texts)
+            locations.extend(PlaceholderLocation(name, 'attribute', _path_of(element), attribute)
+                             for element, attribute in attributes)
+        return cls(blob, tuple(placeholders), locations)
+
+    def new_document(self, replacements: Optional[Dict[str, str]] = None) -> DocxDocument:
+        """
+        Create a new report from the template with the placeholders substituted.
+
+        Args:
+            replacements (Optional[Dict[str, str]]): The value of every placeholder.
+
+        Returns:
+            DocxDocument: The new, still unsaved report.
+
+        Raises:
+            ValueError: If a replacement is given for a placeholder that was not compiled.
+        """
+        doc = Document(io.BytesIO(self.blob))
+        unknown = set(replacements or ()) - set(self.placeholders)
+        if unknown:
+            raise ValueError(f"Placeholders not compiled into the template: {', '.join(sorted(unknown))}")
+        pattern = compile_placeholders(replacements)
+        if not pattern or not self.locations:
+            return doc
+
+        by_part: Dict[str, List[PlaceholderLocation]] = {}
+        for location in self.locations:
+            by_part.setdefault(location.part, []).append(location)
+        for name, part, root in _xml_parts(doc):
+            for location in by_part.get(name, ()):
+                element = _element_at(root, location.path)
+                if location.kind == 'paragraph':
+                    replace_in_paragraph(element, pattern, replacements)
+                elif location.kind == 'attribute':
+                    substitute_attribute(element, location.attribute, pattern, replacements)
+                else:
+                    substitute_text(element, location.kind == 'tail', pattern, replacements)
+            if name in by_part and not isinstance(part, XmlPart):
+                part._blob = etree.tostring(root, xml_declaration=True, encoding='UTF-8', standalone=True)
+        return doc
+
+    def save(self, folder: str, digest: str):
+        """
+        Store the compiled template in a cache folder.
+
+        Both files are written under temporary names and then renamed, so concurrent
+        processes never read a partially written entry.
+
+        Args:
+            folder (str): The cache folder.
+            digest (str): The cache key, see template_digest.
+        """
+        os.makedirs(folder, exist_ok=True)
+        base = os.path.join(folder, digest)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(base + '.docx' + suffix, 'wb') as file:
+            file.write(self.blob)
+        with open(base + '.json' + suffix, 'w', encoding='utf-8') as file:
+            json.dump({'placeholders': list(self.placeholders),
+                       'locations': [asdict(location) for location in self.locations]}, file)
+        os.replace(base + '.docx' + suffix, base + '.docx')
+        os.replace(base + '.json' + suffix, base + '.json')
+
+    @classmethod
+    def load(cls, folder: str, digest: str) -> Optional['CompiledTemplate']:
+        """
+        Read a compiled template from a cache folder.
+
+        Returns:
+            Optional[CompiledTemplate]: The compiled template, or None if it is not cached.
+        """
+        base = os.path.join(folder, digest)
+        try:
+            with open(base + '.json', 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            with open(base + '.docx', 'rb') as file:
+                blob = file.read()
+        except (OSError, ValueError):
+            return None
+        locations = [PlaceholderLocation(**location) for location in data['locations']]
+        return cls(blob, tuple(data['placeholders']), locations)
+
+
+def template_digest(template_bytes: bytes, placeholders: Tuple[str, ...]) -> str:
+    """
+    The cache key of a template: a hash of its content and of the located placeholders.
+    """
+    digest = hashlib.sha256(template_bytes)
+    digest.update(json.dumps([_FORMAT, list(placeholders)]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def default_cache_folder() -> str:
+    return os.path.join(tempfile.gettempdir(), 'fsrg_template_cache')
+
+
+def load_template(template_path: str, placeholders: Tuple[str, ...] = TEMPLATE_PLACEHOLDERS,
+                  cache_folder: Optional[str] = None) -> CompiledTemplate:
+    """
+    Return the compiled form of a template, compiling it only if it has changed.
+
+    Compiled templates are kept in memory for the process and on disk, keyed by the
+    hash of the template, so an edited template is compiled again automatically.
+
+    Args:
+        template_path (str): The path to the .docx template.
+        placeholders (Tuple[str, ...]): The placeholders to locate.
+        cache_folder (Optional[str]): Where compiled templates are stored, a folder
+                                      in the temporary directory if None.
+
+    Returns:
+        CompiledTemplate: The compiled template.
+    """
+    with open(template_path, 'rb') as file:
+        digest = template_digest(file.read(), placeholders)
+    with _compiled_lock:
+        compiled = _compiled.get(digest)
+    if compiled is not None:
+        return compiled
+
+    cache_folder = cache_folder or default_cache_folder()
+    compiled = CompiledTemplate.load(cache_folder, digest)
+    if compiled is None:
+        compiled = CompiledTemplate.compile(template_path, placeholders)
+        try:
+            compiled.save(cache_folder, digest)
+        except OSError as e:
+            print(f"Could not cache the compiled template: {e}")
+    compiled.digest = digest
+    with _compiled_lock:
+        _compiled[digest] = compiled
+    return compiled
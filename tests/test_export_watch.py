@@ -0,0 +1,33 @@
+import threading
+import time
+from export_watch import ExportCompletionWatcher, ExportWatchOptions
+
+
+def test_paused_export_is_not_accepted_before_the_closing_tag(tmp_path):
+    html_path = str(tmp_path / 'pr1.html')
+    with open(html_path, 'w', encoding='utf-8') as file:
+        file.write('<html><body><table><tr><td>1</td></tr></table>')
+
+    def finish():
+        # A pause between pages that is longer than the settle time
+        time.sleep(0.4)
+        with open(html_path, 'a', encoding='utf-8') as file:
+            file.write('</body></html>\n')
+
+    writer = threading.Thread(target=finish)
+    writer.start()
+    watcher = ExportCompletionWatcher(ExportWatchOptions(timeout=10.0, settle=0.1, unterminated_settle=5.0))
+    watcher.wait(html_path)
+    writer.join()
+
+    with open(html_path, encoding='utf-8') as file:
+        assert file.read().rstrip().endswith('</html>')
+
+
+def test_unterminated_printout_is_accepted_after_the_longer_settle_time(tmp_path):
+    html_path = str(tmp_path / 'pr1.html')
+    with open(html_path, 'w', encoding='utf-8') as file:
+        file.write('<html><body><p>No closing tag</p>')
+
+    watcher = ExportCompletionWatcher(ExportWatchOptions(timeout=10.0, settle=0.1, unterminated_settle=0.5))
+    assert 0.5 <= watcher.wait(html_path) < 5.0
@@ -0,0 +1,12 @@
+from bs4 import BeautifulSoup
+from html2word import HTMLToWordConverter
+
+_PRINTOUT = ('<h1>Model A</h1><h2>Nodes</h2><p>Coordinates</p><table><tr><td>1</td></tr></table>'
+             '<h2>Members</h2><table><tr><td>2</td></tr></table>')
+
+
+def test_extract_table_after_heading_keeps_its_static_signature():
+    soup = BeautifulSoup(_PRINTOUT, 'html.parser')
+    assert HTMLToWordConverter.extract_table_after_heading(soup, 'Model', 'Members') == \
+        '<table><tr><td>2</td></tr></table>'
+    assert HTMLToWordConverter.extract_table_after_heading(soup, 'Model', 'Loads') is None
@@ -0,0 +1,21 @@
+import os
+from docx import Document
+from benchmarks.synthetic_printout import PrintoutSpec, write_printout
+from conftest import ROOT
+from gui.rep_gen import RepGen
+from table_cache import TableFragmentCache
+
+
+def test_report_from_printouts_creates_the_output_folder(tmp_path):
+    html_path = str(tmp_path / 'printouts' / 'pr1.html')
+    os.makedirs(os.path.dirname(html_path))
+    write_printout(html_path, PrintoutSpec(chapters=1, sections=1, tables=1, rows=5, columns=4, images=0))
+    folder_path = str(tmp_path / 'reports' / 'slab_a')
+
+    rep_gen = RepGen('Project', 'Report', 'D-1', 'P-1', 'Author', 1, None,
+                     table_cache=TableFragmentCache(max_bytes=0))
+    report_path = rep_gen.generate_report_from_printouts([html_path], folder_path,
+                                                         os.path.join(ROOT, 'Template.docx'))
+
+    assert report_path == os.path.join(folder_path, 'Report_output.docx')
+    assert len(Document(report_path).tables) >= 1
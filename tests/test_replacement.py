@@ -0,0 +1,51 @@
+import pytest
+from docx import Document
+from replacement import DocumentWordReplacer, PlaceholderBytes
+
+_DOCUMENT = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+             '<w:body><w:p>{runs}</w:p></w:body></w:document>')
+
+
+def _replace(xml: str, old: str, new: str):
+    replacer = DocumentWordReplacer()
+    replacer.add_replacement(old, new)
+    pattern, mapping = replacer._compile()
+    return replacer._replace_in_xml_bytes(xml.encode('utf-8'), pattern, mapping, PlaceholderBytes.of(mapping))
+
+
+def _runs(*texts: str) -> str:
+    return ''.join(f'<w:r><w:t>{text}</w:t></w:r>' for text in texts)
+
+
+@pytest.mark.parametrize('split', [1, 2, 3, 5])
+def test_placeholder_split_across_runs_is_replaced(split):
+    placeholder = '[Author]'
+    xml = _DOCUMENT.format(runs=_runs(placeholder[:split], placeholder[split:]))
+    result = _replace(xml, placeholder, 'Jane Doe')
+    assert result is not None
+    assert b'Jane Doe' in result
+    assert b'Author' not in result
+
+
+def test_part_without_placeholder_is_skipped():
+    xml = _DOCUMENT.format(runs=_runs('Nothing', ' to replace'))
+    assert _replace(xml, '[Author]', 'Jane Doe') is None
+
+
+def test_replace_in_document_finds_placeholders_in_one_walk():
+    doc = Document()
+    doc.add_paragraph('Unrelated text')
+    paragraph = doc.add_paragraph()
+    paragraph.add_run('Report by [Au')
+    paragraph.add_run('thor] and ')
+    paragraph.add_run('[Project]')
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 1).text = '[Project]'
+    replacer = DocumentWordReplacer()
+    replacer.add_replacement('[Author]', 'Jane Doe')
+    replacer.add_replacement('[Project]', 'Bridge')
+    replacer.replace_in_document(doc)
+    assert paragraph.text == 'Report by Jane Doe and Bridge'
+    assert table.cell(0, 1).text == 'Bridge'
+    assert doc.paragraphs[0].text == 'Unrelated text'
@@ -0,0 +1,14 @@
+from shading import normalize_fill, style_fill
+
+
+def test_hex_colours_are_normalized():
+    assert normalize_fill('#ffcc00') == 'FFCC00'
+    assert normalize_fill(' #fc0 ') == 'FFCC00'
+    assert style_fill('color: black; background-color: #F2F2F2;') == 'F2F2F2'
+
+
+def test_other_colour_notations_are_not_shaded():
+    assert normalize_fill('rgb(242, 242, 242)') is None
+    assert normalize_fill('F2F2F2') is None
+    assert style_fill('background-color: rgb(242, 242, 242)') is None
+    assert style_fill('background: #F2F2F2') is None
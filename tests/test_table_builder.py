@@ -0,0 +1,31 @@
+from docx import Document
+from docx.shared import Inches
+from html_table import HTMLCell
+from table_builder import TableLayoutOptions, write_table
+
+
+def _write(rows: int, options: TableLayoutOptions):
+    doc = Document()
+    table_rows = [[HTMLCell('Node'), HTMLCell('X')]] + [[HTMLCell(str(row)), HTMLCell('0.0')] for row in range(rows)]
+    result = write_table(doc.element.body, table_rows, 2, None, Inches(6), header_rows=1, options=options,
+                         title='Nodes')
+    return result, [[row.cells[0].text for row in table.rows] for table in doc.tables]
+
+
+def test_continuation_tables_repeat_the_header_rows():
+    result, tables = _write(7, TableLayoutOptions(split_rows=3))
+    assert tables == [['Node', '0', '1', '2'], ['Node', '3', '4', '5'], ['Node', '6']]
+    assert (result.tables, result.rows) == (3, 10)
+
+
+def test_continuation_tables_lack_the_header_without_repeat_header():
+    result, tables = _write(7, TableLayoutOptions(split_rows=3, repeat_header=False))
+    assert tables == [['Node', '0', '1', '2'], ['3', '4', '5'], ['6']]
+    assert (result.tables, result.rows) == (3, 8)
+
+
+def test_oversized_tables_are_split_by_default():
+    options = TableLayoutOptions()
+    result, tables = _write(options.split_rows + 1, options)
+    assert result.tables == 2
+    assert tables[1] == ['Node', str(options.split_rows)]